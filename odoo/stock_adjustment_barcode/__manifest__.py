@@ -20,7 +20,12 @@
         'report/inv_cost_analysis_report_views.xml',
         'report/stock_variation_report.xml',
         'views/stock_adjustment_barcode_line_info_views.xml',
+        'views/stock_adjustment_barcode_line_views.xml',
         'views/stock_adjustment_barcode_lot_line.xml',
+        'views/stock_adjustment_barcode_plan_views.xml',
+        'views/stock_adjustment_barcode_scan_batch_views.xml',
+        'views/stock_adjustment_barcode_scan_views.xml',
+        'views/stock_adjustment_barcode_timing_views.xml',
         'views/stock_adjustment_barcode_views.xml',
     ],
 
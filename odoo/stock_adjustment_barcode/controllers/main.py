@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from werkzeug.exceptions import NotFound
+
+from odoo import http
+from odoo.http import content_disposition, request
+
+
+class StockAdjustmentBarcodeController(http.Controller):
+
+    @http.route('/stock_adjustment_barcode/<int:adjustment_id>/ingest_scans', type='json', auth='user')
+    def ingest_scans(self, adjustment_id, scans):
+        """
+        Ingests a batch of buffered scans into the stock adjustment.
+        See stock.adjustment.barcode.ingest_scans for the format of the scans.
+        """
+        adjustment = request.env['stock.adjustment.barcode'].browse(adjustment_id).exists()
+        if not adjustment:
+            raise NotFound()
+        return adjustment.ingest_scans(scans)
+
+    @http.route('/stock_adjustment_barcode/<int:adjustment_id>/sync_scan_batches', type='json', auth='user')
+    def sync_scan_batches(self, adjustment_id, batches):
+        """
+        Synchronizes the scan batches buffered offline by a device. Batches sent again are ignored.
+        See stock.adjustment.barcode.scan.batch.submit_batches for the format of the batches.
+        """
+        adjustment = request.env['stock.adjustment.barcode'].browse(adjustment_id).exists()
+        if not adjustment:
+            raise NotFound()
+        return adjustment.sync_scan_batches(batches)
+
+    @http.route('/stock_adjustment_barcode/<int:adjustment_id>/variation_report.<any(csv,xlsx):file_format>',
+                type='http', auth='user')
+    def variation_report(self, adjustment_id, file_format):
+        """
+        Downloads the stock variation of the adjustment, the rows of the variation reports, as CSV or XLSX.
+        The file is built before the response is returned: a streamed body would be read after the cursor
+        of the request is closed.
+        """
+        adjustment = request.env['stock.adjustment.barcode'].browse(adjustment_id).exists()
+        if not adjustment:
+            raise NotFound()
+        filename = '%s.%s' % (adjustment.name.replace('/', '_'), file_format)
+        if file_format == 'csv':
+            content = adjustment._get_variation_report_csv()
+            content_type = 'text/csv;charset=utf-8'
+        else:
+            content = adjustment._get_variation_report_xlsx()
+            content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return request.make_response(content, headers=[
+            ('Content-Type', content_type),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
+
+    @http.route('/stock_adjustment_barcode/<int:adjustment_id>/timings.json', type='http', auth='user')
+    def timings(self, adjustment_id):
+        """
+        Downloads the timings recorded for the phases of the adjustment as JSON.
+        """
+        adjustment = request.env['stock.adjustment.barcode'].browse(adjustment_id).exists()
+        if not adjustment:
+            raise NotFound()
+        filename = '%s-timings.json' % adjustment.name.replace('/', '_')
+        return request.make_response(json.dumps(adjustment._get_timings_export(), indent=2), headers=[
+            ('Content-Type', 'application/json'),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
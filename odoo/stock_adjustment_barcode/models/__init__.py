@@ -1,8 +1,17 @@
 # -*- coding: utf-8 -*-
 
+from . import mrp_bom
+from . import product_product
 from . import stock_adjustment_barcode
 from . import stock_adjustment_barcode_line
 from . import stock_adjustment_barcode_line_info
+from . import stock_adjustment_barcode_line_scan
 from . import stock_adjustment_barcode_lot_line
+from . import stock_adjustment_barcode_plan
+from . import stock_adjustment_barcode_quant_snapshot
+from . import stock_adjustment_barcode_scan_batch
+from . import stock_adjustment_barcode_timing
 from . import stock_move
+from . import stock_move_line
+from . import stock_quant
 from . import stock_valuation_layer
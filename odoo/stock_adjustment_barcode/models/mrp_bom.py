@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+from odoo import api, models, tools
+
+# Conversion of a child product into its parent product through a transfer BOM.
+# ratio is the quantity of parent produced by one unit of child: parent bom line qty / bom qty
+TransferBom = namedtuple('TransferBom', ['bom_id', 'parent_product_id', 'ratio', 'bom_uom_id', 'parent_uom_id'])
+
+
+class MrpBom(models.Model):
+    _inherit = 'mrp.bom'
+
+    @api.model
+    @tools.ormcache('warehouse_id')
+    def _get_transfer_bom_index(self, warehouse_id):
+        """
+        Loads the BOMs of type 'transfer' applicable to the warehouse, all of them without warehouse, and returns
+        a read-only mapping child product template id -> TransferBom.
+        The index is cached per worker and invalidated when a transfer BOM or one of its lines changes.
+
+        BOM Transfer Structure:
+        - product_tmpl_id: Child Product
+        - bom_line_ids[0].product_id: Parent Product
+
+        When several BOMs exist for a template, the first one by sequence wins.
+        """
+        domain = [('type', '=', 'transfer')]
+        if warehouse_id:
+            domain = ['|', ('warehouse_ids', '=', False), ('warehouse_ids', 'in', [warehouse_id])] + domain
+
+        index = {}
+        for bom in self.sudo().search(domain):
+            if not bom.bom_line_ids or bom.product_tmpl_id.id in index:
+                continue
+            parent_bom_line = bom.bom_line_ids[0]
+            index[bom.product_tmpl_id.id] = TransferBom(
+                bom_id=bom.id,
+                parent_product_id=parent_bom_line.product_id.id,
+                ratio=(parent_bom_line.product_qty or 1.0) / (bom.product_qty or 1.0),
+                bom_uom_id=bom.product_uom_id.id,
+                parent_uom_id=parent_bom_line.product_uom_id.id,
+            )
+        return tools.frozendict(index)
+
+    @api.model
+    def _get_transfer_bom_index_fields(self):
+        """
+        Fields of the BOMs read by _get_transfer_bom_index, the sequence picking the BOM of a template among several.
+        """
+        return {'product_tmpl_id', 'product_id', 'type', 'active', 'picking_type_id', 'warehouse_ids',
+                'product_qty', 'product_uom_id', 'sequence', 'bom_line_ids'}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        boms = super().create(vals_list)
+        if any(bom.type == 'transfer' for bom in boms):
+            self.clear_caches()
+        return boms
+
+    def write(self, vals):
+        if not self._get_transfer_bom_index_fields() & set(vals):
+            return super().write(vals)
+        is_transfer = any(bom.type == 'transfer' for bom in self)
+        res = super().write(vals)
+        if is_transfer or any(bom.type == 'transfer' for bom in self):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        is_transfer = any(bom.type == 'transfer' for bom in self)
+        res = super().unlink()
+        if is_transfer:
+            self.clear_caches()
+        return res
+
+
+class MrpBomLine(models.Model):
+    _inherit = 'mrp.bom.line'
+
+    @api.model
+    def _get_transfer_bom_index_fields(self):
+        """
+        Fields of the BOM lines read by _get_transfer_bom_index, the sequence picking the first line of a BOM.
+        """
+        return {'bom_id', 'product_id', 'product_qty', 'product_uom_id', 'sequence'}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        if any(line.bom_id.type == 'transfer' for line in lines):
+            self.clear_caches()
+        return lines
+
+    def write(self, vals):
+        if not self._get_transfer_bom_index_fields() & set(vals):
+            return super().write(vals)
+        is_transfer = any(line.bom_id.type == 'transfer' for line in self)
+        res = super().write(vals)
+        if is_transfer or any(line.bom_id.type == 'transfer' for line in self):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        is_transfer = any(line.bom_id.type == 'transfer' for line in self)
+        res = super().unlink()
+        if is_transfer:
+            self.clear_caches()
+        return res
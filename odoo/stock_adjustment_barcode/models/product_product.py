@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, models, tools
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    def write(self, vals):
+        """
+        Invalidates the adjustment barcode index when the company of a template with barcodes changes.
+        """
+        changed = 'company_id' in vals and self.filtered(
+            lambda t: t.company_id.id != (vals['company_id'] or False) and any(t.product_variant_ids.mapped('barcode')))
+        res = super().write(vals)
+        if changed:
+            self.env['product.product'].clear_caches()
+        return res
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_adjustment_barcode_index(self, company_id):
+        """
+        Returns a read-only barcode -> product id mapping of the active products available for the company.
+        The mapping is cached per worker and invalidated only when the barcode, the archiving or the company
+        of a product actually changes, clearing the cache of every worker.
+        """
+        self.flush_model(['barcode', 'active', 'product_tmpl_id'])
+        self.env['product.template'].flush_model(['company_id'])
+        self.env.cr.execute("""
+            SELECT
+                pp.barcode,
+                pp.id
+            FROM
+                product_product AS pp
+                    INNER JOIN product_template AS pt
+                        ON pt.id = pp.product_tmpl_id
+            WHERE
+                pp.barcode IS NOT NULL
+                AND pp.active = TRUE
+                AND (pt.company_id IS NULL OR pt.company_id = %s)
+            ORDER BY
+                pp.id DESC
+        """, [company_id])
+        return tools.frozendict(self.env.cr.fetchall())
+
+    def _get_adjustment_barcode_keys(self):
+        """
+        Returns what the barcode index reads of the products, to tell whether a write changes it.
+        """
+        return {product.id: (product.barcode, product.active, product.product_tmpl_id.id) for product in self}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super().create(vals_list)
+        if any(product.barcode and product.active for product in products):
+            self.clear_caches()
+        return products
+
+    def write(self, vals):
+        if not {'barcode', 'active', 'product_tmpl_id'} & set(vals):
+            return super().write(vals)
+        keys_before = self.with_context(active_test=False)._get_adjustment_barcode_keys()
+        res = super().write(vals)
+        if keys_before != self.with_context(active_test=False)._get_adjustment_barcode_keys():
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        has_barcode = any(product.barcode and product.active for product in self)
+        res = super().unlink()
+        if has_barcode:
+            self.clear_caches()
+        return res
@@ -1,11 +1,37 @@
 # -*- coding: utf-8 -*-
 
+import csv
+import functools
+import io
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import xlsxwriter
+
 from odoo import api, fields, models, _, SUPERUSER_ID
 from odoo.tools.misc import groupby
 from lxml import etree
 from odoo.exceptions import UserError, ValidationError
 from odoo.tools import float_compare
 
+_logger = logging.getLogger(__name__)
+
+
+def profiled(phase):
+    """
+    Records the wall time, query count and rows of the decorated method of stock.adjustment.barcode
+    as a timing of the phase, see StockAdjustmentBarcode._profile_phase.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._profile_phase(phase):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
 
 class StockAdjustmentBarcode(models.Model):
     _name = 'stock.adjustment.barcode'
@@ -37,6 +63,14 @@ class StockAdjustmentBarcode(models.Model):
         copy=False
     )
 
+    stock_at_date = fields.Boolean(
+        string='Stock at Inventory Date',
+        tracking=True,
+        copy=False,
+        help='Compare the counted quantities with the stock of the location at the inventory date instead of '
+             'the current stock, the moves done since then are rolled back'
+    )
+
     posted_date = fields.Datetime(
         tracking=True,
         copy=False
@@ -46,6 +80,8 @@ class StockAdjustmentBarcode(models.Model):
         ('draft', 'Draft'),
         ('to_approve', 'To Approve'),
         ('approved', 'Approved'),
+        ('posting', 'Posting'),
+        ('posting_failed', 'Posting Failed'),
         ('done', 'Done'),
         ('cancel', 'Cancel')
     ], default='draft', tracking=True)
@@ -57,6 +93,33 @@ class StockAdjustmentBarcode(models.Model):
         check_company=True,
     )
 
+    posting_progress = fields.Float(
+        compute='_compute_posting_progress',
+        help='Percentage of the adjustment lines already posted by the background posting'
+    )
+
+    posting_batch_log = fields.Json(
+        string='Posting Batches',
+        help='Lines, moves and duration of each batch of the background posting',
+        default=list,
+        copy=False
+    )
+
+    posting_error = fields.Text(
+        copy=False
+    )
+
+    posting_lots_checked = fields.Boolean(
+        help='Set once the first batch of the background posting has recomputed and checked the lots',
+        copy=False
+    )
+
+    posting_user_id = fields.Many2one(
+        comodel_name='res.users',
+        help='User who queued the background posting, notified when it is finished',
+        copy=False
+    )
+
     approved_by = fields.Many2one(
         comodel_name='res.users',
         copy=False
@@ -76,6 +139,44 @@ class StockAdjustmentBarcode(models.Model):
         default=list
     )
 
+    plan_id = fields.Many2one(
+        comodel_name='stock.adjustment.barcode.plan',
+        string='Cycle Count Plan',
+        index=True,
+        copy=False,
+        readonly=True,
+        ondelete='restrict'
+    )
+
+    scope_categ_ids = fields.Many2many(
+        comodel_name='product.category',
+        string='Counted Categories',
+        copy=False,
+        help='When set with the counted products, only the products of these categories can be counted'
+    )
+
+    scope_product_ids = fields.Many2many(
+        comodel_name='product.product',
+        string='Counted Products',
+        copy=False,
+        help='When set with the counted categories, only these products can be counted'
+    )
+
+    timing_ids = fields.One2many(
+        comodel_name='stock.adjustment.barcode.timing',
+        inverse_name='inv_adjustment_id',
+        copy=False
+    )
+
+    timing_count = fields.Integer(
+        compute='_compute_timing_count'
+    )
+
+    variation_report_snapshot = fields.Json(
+        copy=False,
+        help='Rows and totals of the variation reports, kept once the adjustment is done'
+    )
+
     inv_adjustment_line_ids = fields.One2many(
         comodel_name='stock.adjustment.barcode.line',
         inverse_name='inv_adjustment_id',
@@ -89,6 +190,69 @@ class StockAdjustmentBarcode(models.Model):
         domain=lambda self: [('create_uid', '=', self.env.user.id)]
     )
 
+    inv_adjustment_line_count = fields.Integer(
+        compute='_compute_inv_adjustment_line_count'
+    )
+
+    scan_batch_ids = fields.One2many(
+        comodel_name='stock.adjustment.barcode.scan.batch',
+        inverse_name='inv_adjustment_id',
+        copy=False
+    )
+
+    scan_batch_count = fields.Integer(
+        compute='_compute_scan_batch_count'
+    )
+
+    def _compute_inv_adjustment_line_count(self):
+        counts = {}
+        if self.ids:
+            groups = self.env['stock.adjustment.barcode.line'].read_group(
+                [('inv_adjustment_id', 'in', self.ids)], ['inv_adjustment_id'], ['inv_adjustment_id'])
+            counts = {group['inv_adjustment_id'][0]: group['inv_adjustment_id_count'] for group in groups}
+        for record in self:
+            record.inv_adjustment_line_count = counts.get(record.id, 0)
+
+    def _compute_timing_count(self):
+        counts = {}
+        if self.ids:
+            groups = self.env['stock.adjustment.barcode.timing'].read_group(
+                [('inv_adjustment_id', 'in', self.ids)], ['inv_adjustment_id'], ['inv_adjustment_id'])
+            counts = {group['inv_adjustment_id'][0]: group['inv_adjustment_id_count'] for group in groups}
+        for record in self:
+            record.timing_count = counts.get(record.id, 0)
+
+    def _compute_scan_batch_count(self):
+        counts = {}
+        if self.ids:
+            groups = self.env['stock.adjustment.barcode.scan.batch'].read_group(
+                [('inv_adjustment_id', 'in', self.ids)], ['inv_adjustment_id'], ['inv_adjustment_id'])
+            counts = {group['inv_adjustment_id'][0]: group['inv_adjustment_id_count'] for group in groups}
+        for record in self:
+            record.scan_batch_count = counts.get(record.id, 0)
+
+    def _compute_posting_progress(self):
+        """
+        Computes the share of lines posted, counted with one grouped read for all the adjustments.
+        """
+        posting_records = self.filtered(lambda s: s.state == 'posting' and s.id)
+        counts = {}
+        if posting_records:
+            groups = self.env['stock.adjustment.barcode.line'].read_group(
+                [('inv_adjustment_id', 'in', posting_records.ids), ('is_child_line', '=', False)],
+                ['inv_adjustment_id'], ['inv_adjustment_id', 'is_posted'], lazy=False)
+            for group in groups:
+                total, posted = counts.get(group['inv_adjustment_id'][0], (0, 0))
+                counts[group['inv_adjustment_id'][0]] = (
+                    total + group['__count'], posted + (group['is_posted'] and group['__count'] or 0))
+
+        for record in self:
+            if record.state == 'done':
+                record.posting_progress = 100.0
+                continue
+            total, posted = counts.get(record.id, (0, 0))
+            record.posting_progress = total and 100.0 * posted / total or 0.0
+
     def on_barcode_scanned(self, barcode):
         """
         Handles barcode scan and updates adjustment line based on scanned product or lot.
@@ -101,37 +265,210 @@ class StockAdjustmentBarcode(models.Model):
         lot = self.env['stock.lot']
         inv_adjustment_id = self.id or self._origin.id
 
-        product = self.env['product.product'].search([('barcode', '=', barcode)])
-        # if not product:
-        #     lot = self.env['stock.lot'].search([('name', '=', barcode)])
-        #     product = lot.product_id
-        if not product:
+        company = self.company_id or self.env.company
+        product_id = self.env['product.product']._get_adjustment_barcode_index(company.id).get(barcode)
+        if not product_id:
             # msg = f"You scanned the wrong barcode: {barcode}. The product or Lot/Serial Number is not available in the system."
             raise UserError(_(f"The product is not available in the system with this barcode {barcode}."))
+        product = self.env['product.product'].browse(product_id)
 
-        # Auto-initialize disallowed products if not already done
-        # if not self.disallowed_products_json:
-        #     self._auto_initialize_disallowed_products()
-        #
         # Check if the product is in the disallowed products list
-        disallowed_products = self.disallowed_products_json or []
-        if product.id in disallowed_products:
+        if product.id in self._get_disallowed_product_ids():
             raise UserError(_(f"Product '{product.name}' is not allowed to be scanned directly. It should appear as a parent product when scanning its child products."))
+        if self._get_out_of_scope_products(product):
+            raise UserError(_("Product '%s' is not counted in %s.", product.name, self.name))
 
         current_user = self.env.user
-        last_scanned_line = self.inv_adjustment_line_info_ids and self.inv_adjustment_line_info_ids[-1] or self.inv_adjustment_line_info_ids
+        # Only the last scanned row matters, avoid prefetching the whole one2many
+        last_scanned_line = self.inv_adjustment_line_info_ids[-1:].with_prefetch()
+
+        line_info_vals = {
+            'lot_id': lot.id,
+            'product_id': product.id,
+            'scanned_user_id': current_user.id,
+            'inv_adjustment_id': inv_adjustment_id,
+        }
 
         # if last_scanned_line.product_id == product and last_scanned_line.lot_id == lot and last_scanned_line.scanned_user_id == current_user:
-        if last_scanned_line.product_id == product and last_scanned_line.scanned_user_id == current_user:
-            last_scanned_line.scanned_qty += 1
+        is_same_scan = last_scanned_line.product_id == product and last_scanned_line.scanned_user_id == current_user
+        # Scans of the scan screen arrive through an onchange, where self is a new record of the saved adjustment
+        if not self._origin.id or (is_same_scan and not last_scanned_line._origin.id):
+            # Unsaved adjustment or row, the scanned rows are saved with the form
+            if is_same_scan:
+                last_scanned_line.scanned_qty += 1
+            else:
+                self.inv_adjustment_line_info_ids += self.env['stock.adjustment.barcode.line.info'].new(line_info_vals)
+        elif is_same_scan:
+            # Increment on the stored value, a concurrent scan of the same row is not lost
+            stored_line = last_scanned_line._origin
+            stored_line._increment_scanned_qty({stored_line.id: 1})
+            if last_scanned_line != stored_line:
+                # Show the stored value in the form, it is then left out of the values saved with the form
+                last_scanned_line.scanned_qty = stored_line.scanned_qty
         else:
-            self.inv_adjustment_line_info_ids += self.env['stock.adjustment.barcode.line.info'].new({
-                'lot_id': lot.id,
-                'product_id': product.id,
-                'scanned_user_id': current_user.id,
-                'inv_adjustment_id': inv_adjustment_id,
-            })
+            line_info_obj = self.env['stock.adjustment.barcode.line.info']
+            new_line = line_info_obj.create(line_info_vals)
+            if self.id:
+                self.invalidate_recordset(['inv_adjustment_line_info_ids'])
+            else:
+                self.inv_adjustment_line_info_ids += line_info_obj.new(origin=new_line)
 
+    def ingest_scans(self, scans):
+        """
+        Ingests a batch of scans buffered by a handheld device.
+        Each scan is a dict with the keys barcode, qty (default 1), user (res.users id, default current user,
+        only stock managers can count on behalf of another user), lot (stock.lot id or name, optional)
+        and ts (ISO datetime or epoch, optional, kept by the device but not used: the counted quantities are sums
+        and do not depend on the order of the scans).
+        Scans are aggregated per product/lot/user and written with a single create and a single update,
+        giving the same counted quantities as scanning them one by one.
+        """
+        self.ensure_one()
+        if self.state != 'draft':
+            raise ValidationError(_("You can only scan lines in the 'draft' state."))
+        if not scans:
+            return {'scans': 0, 'created': 0, 'updated': 0}
+
+        company = self.company_id or self.env.company
+        product_index = self.env['product.product']._get_adjustment_barcode_index(company.id)
+        disallowed_product_ids = self._get_disallowed_product_ids()
+
+        unknown_barcodes = sorted({scan.get('barcode') or '' for scan in scans if scan.get('barcode') not in product_index})
+        if unknown_barcodes:
+            raise UserError(_(f"The product is not available in the system with these barcodes {', '.join(unknown_barcodes)}."))
+
+        disallowed_products = self.env['product.product'].browse(sorted({
+            product_index[scan['barcode']] for scan in scans
+            if product_index[scan['barcode']] in disallowed_product_ids}))
+        if disallowed_products:
+            raise UserError(_(f"Products '{', '.join(disallowed_products.mapped('name'))}' are not allowed to be scanned directly. They should appear as parent products when scanning their child products."))
+
+        out_of_scope_products = self._get_out_of_scope_products(
+            self.env['product.product'].browse({product_index[scan['barcode']] for scan in scans}))
+        if out_of_scope_products:
+            raise UserError(_("Products '%s' are not counted in %s.", ', '.join(out_of_scope_products.mapped('name')), self.name))
+
+        other_user_ids = {scan['user'] for scan in scans if scan.get('user') and scan['user'] != self.env.user.id}
+        if other_user_ids:
+            if not self.env.su and not self.user_has_groups('stock.group_stock_manager'):
+                raise UserError(_("Only stock managers can record scans on behalf of other users."))
+            if any(not isinstance(user_id, int) for user_id in other_user_ids) or \
+                    len(self.env['res.users'].browse(list(other_user_ids)).exists()) != len(other_user_ids):
+                raise UserError(_("The scans refer to unknown users."))
+
+        # Resolve lot names in one query and check the lot ids against the product and the company
+        lot_names = {scan['lot'] for scan in scans if scan.get('lot') and isinstance(scan['lot'], str)}
+        lot_ids = {scan['lot'] for scan in scans if scan.get('lot') and not isinstance(scan['lot'], str)}
+        lot_by_name = {}
+        lot_keys = set()
+        if lot_names or lot_ids:
+            lots = self.env['stock.lot'].search([
+                '|', ('name', 'in', list(lot_names)), ('id', 'in', [lot_id for lot_id in lot_ids if isinstance(lot_id, int)]),
+                ('product_id', 'in', list(set(product_index[scan['barcode']] for scan in scans))),
+                ('company_id', '=', company.id),
+            ])
+            lot_by_name = {(lot.product_id.id, lot.name): lot.id for lot in lots}
+            lot_keys = {(lot.product_id.id, lot.id) for lot in lots}
+
+        qty_by_key = {}
+        for scan in scans:
+            product_id = product_index[scan['barcode']]
+            lot = scan.get('lot') or False
+            if isinstance(lot, str):
+                if (product_id, lot) not in lot_by_name:
+                    raise UserError(_(f"The Lot/Serial Number {lot} is not available for the barcode {scan['barcode']}."))
+                lot = lot_by_name[(product_id, lot)]
+            elif lot and (product_id, lot) not in lot_keys:
+                raise UserError(_(f"The Lot/Serial Number {lot} is not available for the barcode {scan['barcode']}."))
+            qty = scan.get('qty', 1)
+            if isinstance(qty, bool) or not isinstance(qty, (int, float)):
+                raise UserError(_(f"The counted quantity {qty!r} of the barcode {scan['barcode']} is not a number."))
+            if qty < 0:
+                raise ValidationError(_("The counted quantity should be 0 or greater."))
+            key = (product_id, lot, scan.get('user') or self.env.user.id)
+            qty_by_key[key] = qty_by_key.get(key, 0.0) + qty
+
+        line_info_obj = self.env['stock.adjustment.barcode.line.info']
+        line_obj = self.env['stock.adjustment.barcode.line']
+        product_ids = list({key[0] for key in qty_by_key})
+
+        # Increment the latest existing row of each product/lot/user
+        existing_info_ids = {}
+        for info in line_info_obj.search_read([
+            ('inv_adjustment_id', '=', self.id),
+            ('inv_adjustment_line_id', '!=', False),
+            ('product_id', 'in', product_ids),
+            ('scanned_user_id', 'in', list({key[2] for key in qty_by_key})),
+        ], ['product_id', 'lot_id', 'scanned_user_id', 'inv_adjustment_line_id'], order='id'):
+            key = (info['product_id'][0], info['lot_id'] and info['lot_id'][0], info['scanned_user_id'][0])
+            existing_info_ids[key] = info['id']
+
+        increments = {existing_info_ids[key]: qty for key, qty in qty_by_key.items() if key in existing_info_ids}
+        line_info_obj._increment_scanned_qty(increments)
+
+        # Create the missing adjustment lines, then the new rows already linked to them
+        new_keys = [key for key in qty_by_key if key not in existing_info_ids]
+        line_by_key = line_obj._get_or_create_line_ids(self, [(key[0], key[1]) for key in new_keys])
+
+        line_info_obj.create([{
+            'inv_adjustment_id': self.id,
+            'inv_adjustment_line_id': line_by_key[(product_id, lot_id)],
+            'product_id': product_id,
+            'lot_id': lot_id,
+            'scanned_qty': qty_by_key[(product_id, lot_id, user_id)],
+            'scanned_user_id': user_id,
+        } for product_id, lot_id, user_id in new_keys])
+
+        return {'scans': len(scans), 'created': len(new_keys), 'updated': len(increments)}
+
+    def sync_scan_batches(self, batches):
+        """
+        Synchronizes the scan batches buffered offline by a device, see
+        stock.adjustment.barcode.scan.batch.submit_batches.
+        """
+        self.ensure_one()
+        return self.env['stock.adjustment.barcode.scan.batch'].submit_batches(self, batches)
+
+    def action_view_lines(self):
+        """
+        Opens the adjustment lines in a paginated list that can be searched by product, errors and parent/child lines.
+        """
+        action = self.open_action_view(action_xml_id='stock_adjustment_barcode.stock_adjustment_barcode_line_action',
+                                       field_name='inv_adjustment_id', record_ids=self.ids)
+        action['name'] = _("Lines of %s", self.name)
+        action['context'] = {'search_default_error_lines': self.state == 'approved'}
+        return action
+
+    def action_view_scan_batches(self):
+        """
+        Opens the scan batches synchronized by the devices.
+        """
+        return self.open_action_view(action_xml_id='stock_adjustment_barcode.stock_adjustment_barcode_scan_batch_action',
+                                     field_name='inv_adjustment_id', record_ids=self.ids)
+
+    def _get_disallowed_product_ids(self):
+        """
+        Returns the disallowed products of the adjustment as a set.
+        """
+        self.ensure_one()
+        return frozenset(self.disallowed_products_json or [])
+
+    def _get_out_of_scope_products(self, products):
+        """
+        Returns the products that cannot be counted in the adjustment, a sub-count of a cycle count plan
+        only counting the products or categories of its shard.
+        """
+        if not (self.scope_product_ids or self.scope_categ_ids):
+            return products.browse()
+        return products.filtered(
+            lambda p: p not in self.scope_product_ids and p.categ_id not in self.scope_categ_ids)
+
+    def write(self, vals):
+        if 'state' in vals and 'variation_report_snapshot' not in vals:
+            vals = dict(vals, variation_report_snapshot=False)
+        return super().write(vals)
+
+    @profiled('confirm')
     def action_confirm(self):
         """
         Confirms the stock adjustment and prepares lines for approval.
@@ -141,13 +478,15 @@ class StockAdjustmentBarcode(models.Model):
         if not self.env.context.get('avoid_zero_lines', False) and not self.inv_adjustment_line_ids:
             raise ValidationError(_("No Lines are created yet."))
 
+        # Stock and scanned totals are only refreshed explicitly, scans do not recompute them
+        self.action_refresh_stock()
+
         # Handle BOM transfer consolidation before creating zero stock lines
         self._handle_bom_transfer_consolidation()
 
         self.prepare_and_create_zero_stock_lines()
 
-        for line in self.inv_adjustment_line_ids:
-            line.set_lot_on_adjustment_line_ids()
+        self.inv_adjustment_line_ids.set_lot_on_adjustment_line_ids()
 
         self.write({'state': 'to_approve'})
 
@@ -156,120 +495,88 @@ class StockAdjustmentBarcode(models.Model):
         Handle BOM transfer consolidation logic.
         For products that have BOM transfer type, consolidate their scanned quantities
         to their parent products and create parent lines. Keep child lines visible for reference.
-        Also copies child scanned line info records to parent for full audit trail.
+        The child scans are not copied to the parent line, it reads them through its child lines.
+
+        The transfer BOMs of the warehouse are loaded once, parent/child relations and
+        sequences are computed in memory and persisted with one bulk update per field.
         """
-        # Get all lines that need BOM transfer consolidation
-        parent_products = {}
-        
-        for line in self.inv_adjustment_line_ids:
-            parent_product = line._find_parent_product_from_bom_transfer()
-            if parent_product:
-                if parent_product not in parent_products:
-                    parent_products[parent_product] = {'child_lines': [], 'total_qty': 0}
-                parent_products[parent_product]['child_lines'].append(line)
-                parent_products[parent_product]['total_qty'] += line.total_scanned_qty
-        
-        # Create/update parent lines and mark child lines
-        for parent_product, data in parent_products.items():
-            # Check if parent line already exists
-            existing_parent_line = self.inv_adjustment_line_ids.filtered(
-                lambda l: l.product_id == parent_product and not l.parent_product_id
-            )
-            
-            if not existing_parent_line:
-                # Create parent line with explicit low sequence
-                parent_line_vals = {
-                    'product_id': parent_product.id,
-                    'inv_adjustment_id': self.id,
-                    'parent_product_id': False,  # This is the parent line
-                    'display_sequence': 1000 + (parent_product.id * 10),  # Set explicit sequence
-                }
-                parent_line = self.env['stock.adjustment.barcode.line'].create(parent_line_vals)
-                
-                # Add to disallowed products so it can't be scanned directly
-                disallowed_products = self.disallowed_products_json or []
-                if parent_product.id not in disallowed_products:
-                    disallowed_products.append(parent_product.id)
-                    self.disallowed_products_json = disallowed_products
-            else:
-                parent_line = existing_parent_line[0]
-                # Update sequence for existing parent line
-                parent_line.write({
-                    'display_sequence': 1000 + (parent_product.id * 10)
-                })
-            
-            # Convert child_lines list to recordset
-            child_lines_recordset = self.env['stock.adjustment.barcode.line'].browse(
-                [line.id for line in data['child_lines']]
-            )
-            
-            # Copy child scanned line info records to parent line
-            # This allows viewing all related scans from the parent
-            self._copy_child_line_info_to_parent(parent_line, child_lines_recordset)
-            
-            # Calculate child sequences and mark with parent reference
-            for idx, child_line in enumerate(child_lines_recordset, start=1):
-                child_line.write({
-                    'parent_product_id': parent_product.id,
-                    'display_sequence': 1000 + (parent_product.id * 10) + idx,  # Parent seq + offset
-                })
-            
-            # Keep child line info with children for tracking
-            # Parent now has copies of all child line info records for consolidated view
-        
-        # Recalculate computed fields for all lines after consolidation
-        self.inv_adjustment_line_ids._compute_is_parent_line()
-        self.inv_adjustment_line_ids._compute_is_child_line()
-        self.inv_adjustment_line_ids._compute_display_sequence()
+        line_obj = self.env['stock.adjustment.barcode.line']
+
+        for adjustment in self:
+            bom_index = adjustment._get_transfer_bom_index()
+            lines = adjustment.inv_adjustment_line_ids
+
+            # Group lines by the parent product of their transfer BOM
+            child_lines_by_parent = {}
+            parent_line_by_product = {}
+            for line in lines:
+                if not line.parent_product_id:
+                    parent_line_by_product.setdefault(line.product_id.id, line)
+                transfer_bom = bom_index.get(line.product_id.product_tmpl_id.id)
+                if transfer_bom:
+                    child_lines_by_parent.setdefault(transfer_bom.parent_product_id, []).append(line)
+
+            if not child_lines_by_parent:
+                continue
+
+            # Create the missing parent lines at once
+            missing_parent_ids = [
+                parent_product_id for parent_product_id in child_lines_by_parent
+                if parent_product_id not in parent_line_by_product
+            ]
+            new_parent_lines = line_obj.create([{
+                'product_id': parent_product_id,
+                'inv_adjustment_id': adjustment.id,
+                'parent_product_id': False,  # This is the parent line
+                'display_sequence': 1000 + (parent_product_id * 10),
+            } for parent_product_id in missing_parent_ids])
+            parent_line_by_product.update(zip(missing_parent_ids, new_parent_lines))
+
+            # Add new parent products to disallowed products so they can't be scanned directly
+            disallowed_products = list(adjustment.disallowed_products_json or [])
+            new_disallowed_products = [pid for pid in missing_parent_ids if pid not in disallowed_products]
+            if new_disallowed_products:
+                adjustment.disallowed_products_json = disallowed_products + new_disallowed_products
+
+            # Compute sequences and parent references in memory
+            parent_product_by_line = {}
+            sequence_by_line = {}
+            parent_lines = line_obj
+            for parent_product_id, child_lines in child_lines_by_parent.items():
+                parent_line = parent_line_by_product[parent_product_id]
+                parent_lines |= parent_line
+                parent_sequence = 1000 + (parent_product_id * 10)
+                sequence_by_line[parent_line.id] = parent_sequence
+                for idx, child_line in enumerate(child_lines, start=1):
+                    parent_product_by_line[child_line.id] = parent_product_id
+                    sequence_by_line[child_line.id] = parent_sequence + idx  # Parent seq + offset
+
+            # Regular standalone lines appear after all parent-child groups
+            for line in lines:
+                if line.id not in sequence_by_line and line.display_sequence >= 1000000:
+                    sequence_by_line[line.id] = 1000000 + (line.product_id.id * 10)
+
+            lines_by_id = {line.id: line for line in lines | parent_lines}
+            line_obj._bulk_update_column('parent_product_id', {
+                line_id: parent_product_id for line_id, parent_product_id in parent_product_by_line.items()
+                if lines_by_id[line_id].parent_product_id.id != parent_product_id
+            })
+            line_obj._bulk_update_column('display_sequence', {
+                line_id: sequence for line_id, sequence in sequence_by_line.items()
+                if lines_by_id[line_id].display_sequence != sequence
+            })
+
+            # Parent flags and differences are recomputed in one batch
+            self.env.add_to_compute(line_obj._fields['is_parent_line'], lines | parent_lines)
+            parent_lines._refresh_difference_qty()
 
-    def _copy_child_line_info_to_parent(self, parent_line, child_lines):
+    def _get_transfer_bom_index(self):
         """
-        Copy child scanned line info records to parent line.
-        This creates duplicate info records on the parent so all related scans
-        can be viewed from the parent line itself.
-        
-        Args:
-            parent_line: The parent adjustment line (stock.adjustment.barcode.line)
-            child_lines: Recordset of child adjustment lines
+        Returns the transfer BOM index (child template id -> TransferBom) of the adjustment warehouse.
         """
-        line_info_obj = self.env['stock.adjustment.barcode.line.info']
-        
-        # Debug logging
-        import logging
-        _logger = logging.getLogger(__name__)
-        _logger.info(f"Copying child line info to parent line ID: {parent_line.id}, Product: {parent_line.product_id.name}")
-        
-        # Collect all child line info records
-        all_child_line_info = self.env['stock.adjustment.barcode.line.info']
-        for child_line in child_lines:
-            all_child_line_info |= child_line.adjustment_line_info_ids
-            _logger.info(f"  - Child line ID: {child_line.id}, Product: {child_line.product_id.name}, Info count: {len(child_line.adjustment_line_info_ids)}")
-        
-        # Create copies of each child line info record for the parent
-        for child_info in all_child_line_info:
-            # Check if this exact info record already exists on parent
-            # (to avoid duplicates if consolidation runs multiple times)
-            existing_parent_info = parent_line.adjustment_line_info_ids.filtered(
-                lambda i: i.product_id == child_info.product_id and 
-                         i.scanned_qty == child_info.scanned_qty and 
-                         i.scanned_user_id == child_info.scanned_user_id and
-                         i.lot_id == child_info.lot_id
-            )
-            
-            if not existing_parent_info:
-                # Create a copy of the child info record for the parent
-                new_info_vals = {
-                    'product_id': child_info.product_id.id,
-                    'lot_id': child_info.lot_id.id if child_info.lot_id else False,
-                    'product_uom_id': child_info.product_uom_id.id,
-                    'scanned_qty': child_info.scanned_qty,
-                    'scanned_user_id': child_info.scanned_user_id.id,
-                    'inv_adjustment_id': self.id,
-                    'inv_adjustment_line_id': parent_line.id,  # Link to parent line
-                }
-                _logger.info(f"  Creating line info copy with inv_adjustment_line_id={parent_line.id} for product {child_info.product_id.name}")
-                new_info = line_info_obj.create(new_info_vals)
-                _logger.info(f"  Created line info ID {new_info.id} linked to line ID {new_info.inv_adjustment_line_id.id}")
+        self.ensure_one()
+        warehouse = self.location_id.warehouse_id or self.location_id.get_warehouse()
+        return self.env['mrp.bom']._get_transfer_bom_index(warehouse.id)
 
     def action_set_zero_values(self):
         self.with_context(avoid_zero_lines=True).action_confirm()
@@ -277,48 +584,66 @@ class StockAdjustmentBarcode(models.Model):
     def prepare_and_create_zero_stock_lines(self):
         """
         Prepares and creates zero stock lines for products not yet scanned.
+        The products are selected with one grouped query, then the lines and their scanned rows are created
+        in bulk, one line per product whatever its lots.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
-        quants = self.get_quant_ids()
-        adjustment_line_info_lst = list()
-
-        for quant in quants:
-            adjustment_line_info_lst.append({
-                'scanned_qty': 0,
-                'inv_adjustment_id': self.id,
-                'product_id': quant.product_id.id,
-            })
-
-        if adjustment_line_info_lst:
-            self.env['stock.adjustment.barcode.line.info'].with_user(SUPERUSER_ID).create(adjustment_line_info_lst)
-
-    def get_quant_ids(self):
-        if self.env.context.get('avoid_zero_lines'):
-            cursor = self.env.cr
-            cursor.execute(f"""
-                SELECT
-                    array_agg(sq.id) AS ids
-                FROM
-                    stock_quant AS sq
-                        INNER JOIN product_product AS pp
-                            ON sq.product_id = pp.id AND pp.active = TRUE
-                WHERE
-                    sq.location_id = {self.location_id.id}
-                    AND sq.company_id = {self.company_id.id}
-                GROUP BY
-                    sq.product_id
-                HAVING
-                    SUM(sq.quantity) = 0
-            """)
-            result = cursor.dictfetchall()
-            quant_ids = [ids for sublist in result for ids in sublist['ids']] if result else list()
-            return self.env['stock.quant'].sudo().browse(quant_ids)
-
-        return self.env['stock.quant'].sudo().search([
-            ('product_id.active', '=', True),
-            ('company_id', '=', self.company_id.id),
-            ('location_id', '=', self.location_id.id),
-            ('product_id', 'not in', self.inv_adjustment_line_ids.product_id.ids)])
+        product_ids = self._get_zero_stock_product_ids()
+        if not product_ids:
+            return
+
+        line_obj = self.env['stock.adjustment.barcode.line'].with_user(SUPERUSER_ID)
+        new_lines = line_obj.create([{
+            'product_id': product_id,
+            'inv_adjustment_id': self.id,
+        } for product_id in product_ids])
+
+        self.env['stock.adjustment.barcode.line.info'].with_user(SUPERUSER_ID).create([{
+            'scanned_qty': 0,
+            'inv_adjustment_id': self.id,
+            'inv_adjustment_line_id': line.id,
+            'product_id': line.product_id.id,
+            'scanned_user_id': SUPERUSER_ID,
+        } for line in new_lines])
+
+    def _get_zero_stock_product_ids(self):
+        """
+        Returns the active products of the location that have no adjustment line yet: all of them, or only the
+        ones whose quants sum up to zero with the context key 'avoid_zero_lines'.
+        The quants are summed per product in the same grouped query. The lots are not part of the grouping:
+        a zero line is created per product and its lot lines are distributed over all the quants of the product
+        when the adjustment is confirmed, one line per lot would count the same quants several times.
+        """
+        self.ensure_one()
+        self.env['stock.quant'].flush_model(['product_id', 'location_id', 'company_id', 'quantity'])
+        self.env['stock.adjustment.barcode.line'].flush_model(['product_id', 'inv_adjustment_id'])
+        self.env['product.product'].flush_model(['active'])
+        company_condition = "AND sq.company_id = %(company_id)s" if self.company_id else ""
+        having = "HAVING SUM(sq.quantity) = 0" if self.env.context.get('avoid_zero_lines') else ""
+        self.env.cr.execute(f"""
+            SELECT
+                sq.product_id
+            FROM
+                stock_quant AS sq
+                    INNER JOIN product_product AS pp
+                        ON pp.id = sq.product_id
+            WHERE
+                sq.location_id = %(location_id)s
+                {company_condition}
+                AND pp.active = TRUE
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM stock_adjustment_barcode_line AS sal
+                    WHERE sal.inv_adjustment_id = %(adjustment_id)s AND sal.product_id = sq.product_id
+                )
+            GROUP BY
+                sq.product_id
+            {having}
+            ORDER BY
+                sq.product_id
+        """, {'location_id': self.location_id.id, 'company_id': self.company_id.id, 'adjustment_id': self.id})
+        products = self.env['product.product'].browse([product_id for product_id, in self.env.cr.fetchall()])
+        return (products - self._get_out_of_scope_products(products)).ids
 
     def action_approved(self):
         """
@@ -329,11 +654,43 @@ class StockAdjustmentBarcode(models.Model):
             raise ValidationError(_("There are no lines for approval"))
         self.write({'state': 'approved', 'approved_by': self.env.user.id})
 
+    @profiled('done')
     def action_done(self):
         """
         Completes the stock adjustment by creating stock moves.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
+        if self._check_lots_before_posting():
+            self.create_stock_move()
+            self.write({'state': 'done'})
+
+    def action_post_in_background(self):
+        """
+        Queues the posting of the stock adjustment. The lots are checked and the lines are posted by batches
+        by a cron job, so that large adjustments do not hit the time limit of the worker.
+        A failed posting is queued again from its first unposted line.
+        """
+        if self.filtered(lambda s: s.state not in ('approved', 'posting_failed')):
+            raise ValidationError(_("Only approved adjustments can be posted."))
+        if self.filtered(lambda s: not s.inv_adjustment_line_ids):
+            raise ValidationError(_("There is no Adjustment Lines."))
+
+        self.write({
+            'state': 'posting',
+            'posting_error': False,
+            'posting_lots_checked': False,
+            'posting_user_id': self.env.user.id,
+        })
+        for record in self.filtered(lambda s: not s.inv_adjustment_line_ids.filtered('is_posted')):
+            record.posting_batch_log = []
+        self.message_post(body=_("Posting has been queued, you will be notified when it is finished."))
+        self.env.ref('stock_adjustment_barcode.ir_cron_post_stock_adjustment_barcode')._trigger()
+
+    def _check_lots_before_posting(self):
+        """
+        Recomputes the lots of the lines and returns whether the adjustment can be posted.
+        The products with a stock mismatch are reported in the chatter otherwise.
+        """
         if not self.inv_adjustment_line_ids:
             raise ValidationError(_("There is no Adjustment Lines."))
 
@@ -343,43 +700,188 @@ class StockAdjustmentBarcode(models.Model):
         if error_lines:
             product_names = error_lines.product_id.mapped('name')
             self.message_post(body=f"Please resolve the stock mismatch for the following products <br/> {', '.join(product_names)}")
-        else:
-            self.create_stock_move()
-            self.write({'state': 'done'})
+            return False
+        return True
+
+    @api.model
+    def _cron_post_stock_adjustment(self):
+        """
+        Posts the adjustments in 'posting' state by batches of lines. Each batch is committed with the flag
+        of its lines, so that the posting resumes from the first unposted line after a crash.
+        When the time budget of the run is spent, the cron is triggered again to continue.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        time_limit = int(self.env['ir.config_parameter'].sudo().get_param(
+            'stock_adjustment_barcode.posting_time_limit', 240))
+        start = time.monotonic()
+
+        for adjustment in self.search([('state', '=', 'posting')]):
+            while adjustment.state == 'posting':
+                if time.monotonic() - start > time_limit:
+                    self.env.ref('stock_adjustment_barcode.ir_cron_post_stock_adjustment_barcode')._trigger()
+                    return
+                try:
+                    adjustment._process_posting_batch()
+                except Exception as e:
+                    if not auto_commit:
+                        raise
+                    self.env.cr.rollback()
+                    _logger.exception("Posting of stock adjustment %s failed", adjustment.name)
+                    adjustment._fail_posting(str(e))
+                if auto_commit:
+                    self.env.cr.commit()
+
+    @profiled('posting_batch')
+    def _process_posting_batch(self):
+        """
+        Posts the next batch of unposted lines of the adjustment and records its timing.
+        The first batch recomputes and checks the lots of the unposted lines instead.
+        Finishes the posting when no line is left.
+        """
+        self.ensure_one()
+        if not self.posting_lots_checked:
+            if self._check_lots_before_posting():
+                self.posting_lots_checked = True
+            else:
+                self._fail_posting(_("Please resolve the stock mismatch of the lines in error."))
+            return
+
+        start = time.monotonic()
+        lines = self.env['stock.adjustment.barcode.line'].search([
+            ('inv_adjustment_id', '=', self.id),
+            ('is_child_line', '=', False),
+            ('is_posted', '=', False),
+        ], order='id', limit=self._get_posting_chunk_size())
+        if not lines:
+            self._finish_posting()
+            return
+
+        stock_moves = self._post_stock_moves(self._prepare_line_stock_move_vals(lines))
+        lines.write({'is_posted': True})
+
+        self.posting_batch_log = self.posting_batch_log + [{
+            'batch': len(self.posting_batch_log) + 1,
+            'lines': len(lines),
+            'moves': len(stock_moves),
+            'duration': round(time.monotonic() - start, 3),
+            'date': fields.Datetime.to_string(fields.Datetime.now()),
+        }]
+
+    def _fail_posting(self, error):
+        """
+        Stops a background posting. The adjustment goes back to approved when no line is posted yet,
+        to posting failed otherwise, the lines already posted being kept.
+        """
+        for record in self:
+            has_posted_lines = bool(record.inv_adjustment_line_ids.filtered('is_posted'))
+            record.write({'state': 'posting_failed' if has_posted_lines else 'approved', 'posting_error': error})
+            record.message_post(body=_("Posting failed, the lines already posted are kept: %s", error)
+                                if has_posted_lines else _("Posting failed: %s", error))
+
+    def _finish_posting(self):
+        """
+        Completes a background posting and notifies the user who queued it.
+        """
+        today = fields.Date.today()
+        for record in self:
+            duration = sum(batch['duration'] for batch in record.posting_batch_log)
+            record.write({'state': 'done', 'posted_date': today})
+            record.location_id.write({'last_inventory_date': today})
+            record.message_post(
+                body=_("Posting finished: %(batches)s batches in %(duration)s seconds.",
+                       batches=len(record.posting_batch_log), duration=round(duration, 1)),
+                partner_ids=record.posting_user_id.partner_id.ids,
+            )
 
     def action_refresh_stock(self):
         """
         Refreshes the stock information for the adjustment lines.
+        The differences are refreshed at the same time with the scanned totals read from the scanned rows.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
         self.inv_adjustment_line_ids._compute_product_qty()
+        self.inv_adjustment_line_ids._refresh_difference_qty()
+
+    def _get_stock_date(self):
+        """
+        Returns the date of the stock the lines are compared with, False for the current stock.
+        """
+        return self.stock_at_date and self.inventory_date or False
 
+    @profiled('recompute_lots')
     def action_recompute_lots(self):
-        quant_obj = self.env['stock.quant']
-
-        for line in self.inv_adjustment_line_ids:
-            lot_qty = sum(line.adjustment_line_lot_ids.mapped('current_qty'))
-            vals = {'on_hand_qty': lot_qty}
-            difference = line.total_scanned_qty - lot_qty
-            quants = quant_obj._gather(line.product_id, line.inv_adjustment_id.location_id)
-            quant_quantity = sum(quants.mapped('quantity'))
-            if difference < 0 and (quant_quantity < 0 or abs(difference) > abs(quant_quantity)):
-                vals.update({'is_editable': True})
-            else:
-                line.set_lot_on_adjustment_line_ids_difference(difference, quants)
-                vals.update({'is_editable': False})
+        """
+        Recomputes the lot lines of every adjustment line from the quants of the location.
+        The quants of all products are read in one query and distributed over the lots in memory,
+        then the lot lines are replaced with a single unlink and a single create.
+        The lines already posted by an interrupted background posting are left as they are.
+        """
+        line_obj = self.env['stock.adjustment.barcode.line']
+        lot_line_obj = self.env['stock.adjustment.barcode.lot.line']
+
+        for record in self:
+            lines = record.inv_adjustment_line_ids.filtered(lambda l: not l.is_posted)
+            quant_rows_by_product = record._get_location_quant_rows(lines.product_id.ids)
+            fallback_lot_by_product = lines.filtered(
+                lambda l: l.product_id.id not in quant_rows_by_product)._get_fallback_lot_ids()
+
+            on_hand_by_line = {}
+            error_line_ids = []
+            valid_line_ids = []
+            lot_line_ids_to_unlink = []
+            lot_line_vals_list = []
+            for line in lines:
+                lot_qty = sum(line.adjustment_line_lot_ids.mapped('current_qty'))
+                on_hand_by_line[line.id] = lot_qty
+                difference = line.total_scanned_qty - lot_qty
+                quant_rows = quant_rows_by_product.get(line.product_id.id, [])
+                quant_quantity = sum(quant_row[2] for quant_row in quant_rows)
+                if difference < 0 and (quant_quantity < 0 or abs(difference) > abs(quant_quantity)):
+                    error_line_ids.append(line.id)
+                    continue
+
+                valid_line_ids.append(line.id)
+                lot_vals = line._prepare_lot_lines_difference(
+                    difference, quant_rows, fallback_lot_by_product.get((line.company_id.id, line.product_id.id)))
+                if lot_vals is False:
+                    continue
+                lot_line_ids_to_unlink += line.adjustment_line_lot_ids.ids
+                lot_line_vals_list += [dict(vals, inv_adjustment_line_id=line.id) for vals in lot_vals]
+
+            lot_line_obj.browse(lot_line_ids_to_unlink).unlink()
+            lot_line_obj.create(lot_line_vals_list)
+
+            line_obj._bulk_update_column('on_hand_qty', {
+                line.id: on_hand_by_line[line.id] for line in lines if line.on_hand_qty != on_hand_by_line[line.id]
+            })
+            line_obj.browse(error_line_ids).write({'is_editable': True})
+            line_obj.browse(valid_line_ids).write({'is_editable': False})
 
-            line.write(vals)
+            if not record.is_recompute:
+                record.is_recompute = True
 
-        if not self.is_recompute:
-            self.is_recompute = True
+    def _get_location_quant_rows(self, product_ids):
+        """
+        Returns the quants of the products in the adjustment location and its children
+        as {product_id: [(row_id, lot_id, quantity, in_date), ...]} in gather order (lots first, then FIFO).
+        row_id only identifies the quant within the result.
+        """
+        self.ensure_one()
+        quant_rows_by_product = {}
+        quant_rows = self.env['stock.quant']._read_adjustment_quant_rows(
+            self.location_id, company_id=self.company_id.id, product_ids=product_ids,
+            include_children=True, group_by_lot=False)
+        for row_id, quant_row in enumerate(quant_rows, start=1):
+            quant_rows_by_product.setdefault(quant_row.product_id, []).append(
+                (row_id, quant_row.lot_id, quant_row.qty, quant_row.in_date))
+        return quant_rows_by_product
 
     def action_cancel(self):
         """
         Cancels the stock adjustment if it's in a cancellable state.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
-        if self.filtered(lambda s: s.state in ('cancel', 'done')):
+        if self.filtered(lambda s: s.state in ('cancel', 'posting', 'posting_failed', 'done')):
             raise ValidationError(_("You are not allowed to cancel this record."))
         self._cleanup_bom_transfer_consolidation()
         self.write({'state': 'cancel'})
@@ -401,73 +903,85 @@ class StockAdjustmentBarcode(models.Model):
     def _cleanup_bom_transfer_consolidation(self):
         """
         Clean up BOM transfer consolidation data when resetting to draft.
-        Remove parent product references, copied line info records, and clean up disallowed products list.
+        Remove parent product references, the parent lines without scans of their own, and clean up disallowed
+        products list. Copies of the child scans on the parent lines, made by earlier versions of the
+        consolidation, are removed as well.
+        The consolidation artifacts of all the adjustments are found and removed with a few statements, whatever
+        the number of parent and child lines.
         """
-        # Find parent lines that were created during consolidation
-        parent_lines = self.inv_adjustment_line_ids.filtered(lambda l: l.is_parent_line)
-        
-        # Remove copied line info records from parent lines
-        # Keep only line info records that belong to child lines
-        for parent_line in parent_lines:
-            # Get all child lines for this parent
-            child_lines = self.inv_adjustment_line_ids.filtered(
-                lambda l: l.parent_product_id == parent_line.product_id
-            )
-            
-            # Collect all child line info IDs
-            child_line_info_ids = set()
-            for child_line in child_lines:
-                child_line_info_ids.update(child_line.adjustment_line_info_ids.ids)
-            
-            # Remove parent line info records that are copies from children
-            # (these are the records that were copied to parent during consolidation)
-            parent_info_to_remove = parent_line.adjustment_line_info_ids.filtered(
-                lambda info: info.product_id != parent_line.product_id
-            )
-            parent_info_to_remove.unlink()
-        
+        if not self.ids:
+            return
+        line_obj = self.env['stock.adjustment.barcode.line']
+        line_info_obj = self.env['stock.adjustment.barcode.line.info']
+        line_obj.flush_model(['inv_adjustment_id', 'product_id', 'parent_product_id', 'is_parent_line'])
+        line_info_obj.flush_model(['inv_adjustment_line_id', 'product_id'])
+        former_parent_lines = line_obj.search([('inv_adjustment_id', 'in', self.ids), ('is_parent_line', '=', True)])
+
+        # Copies of the child scans left on the parent lines by earlier versions, their product is the one of the child
+        self.env.cr.execute("""
+            DELETE FROM
+                stock_adjustment_barcode_line_info AS info
+            USING
+                stock_adjustment_barcode_line AS line
+            WHERE
+                line.id = info.inv_adjustment_line_id
+                AND line.inv_adjustment_id = ANY(%s)
+                AND line.is_parent_line
+                AND info.product_id != line.product_id
+            RETURNING
+                info.inv_adjustment_line_id
+        """, [self.ids])
+        cleaned_lines = line_obj.browse({line_id for line_id, in self.env.cr.fetchall()})
+        if cleaned_lines:
+            # The rows were deleted without the ORM, drop them from the cache and notify their lines
+            line_info_obj.invalidate_model()
+            cleaned_lines.invalidate_recordset(['adjustment_line_info_ids'])
+            self.invalidate_recordset(['inv_adjustment_line_info_ids'])
+            cleaned_lines.modified(['adjustment_line_info_ids'])
+
+        # Parent lines left without any scan were created by the consolidation
+        self.env.cr.execute("""
+            SELECT
+                line.id
+            FROM
+                stock_adjustment_barcode_line AS line
+            WHERE
+                line.inv_adjustment_id = ANY(%s)
+                AND line.is_parent_line
+                AND NOT EXISTS (
+                    SELECT 1 FROM stock_adjustment_barcode_line_info AS info WHERE info.inv_adjustment_line_id = line.id
+                )
+        """, [self.ids])
+        parent_lines = line_obj.browse([line_id for line_id, in self.env.cr.fetchall()])
+
         # Reset parent_product_id for all child lines
-        child_lines = self.inv_adjustment_line_ids.filtered(lambda l: l.parent_product_id)
-        child_lines.write({'parent_product_id': False})
-        
-        # Remove parent lines that were auto-created during consolidation
-        # (parent lines that have no original line info or were created by consolidation)
-        parent_lines_to_remove = self.inv_adjustment_line_ids.filtered(
-            lambda l: l.is_parent_line
-        )
-        
-        # Check if parent line was manually created or auto-created
-        # Auto-created parent lines typically have only copied info records
-        for parent_line in parent_lines_to_remove:
-            # If parent line has no line info after cleanup, it was auto-created
-            if not parent_line.adjustment_line_info_ids:
-                parent_line.unlink()
-        
-        # Clear disallowed products list
-        self.disallowed_products_json = []
+        self.env.cr.execute("""
+            SELECT
+                id
+            FROM
+                stock_adjustment_barcode_line
+            WHERE
+                inv_adjustment_id = ANY(%s)
+                AND parent_product_id IS NOT NULL
+        """, [self.ids])
+        line_obj._bulk_update_column('parent_product_id', dict.fromkeys([line_id for line_id, in self.env.cr.fetchall()], False))
+
+        parent_lines.unlink()
+
+        # The parent lines keeping scans of their own are regular lines again, with their own total
+        kept_lines = former_parent_lines - parent_lines
+        if kept_lines:
+            self.env.add_to_compute(line_obj._fields['is_parent_line'], kept_lines)
+            kept_lines._refresh_difference_qty()
+        self.write({'disallowed_products_json': []})
 
     def action_initialize_disallowed_products(self):
         """
         Initialize disallowed products list with parent products from BOM transfers.
         Find all products that are parent products in BOM transfer type.
         """
-        # Find all BOMs of type 'transfer' that are applicable to this warehouse/location
-        warehouse = self.location_id.warehouse_id or self.location_id.get_warehouse()
-        
-        domain = [('type', '=', 'transfer')]
-        if warehouse:
-            domain = ['|', ('warehouse_ids', '=', False), ('warehouse_ids', 'in', [warehouse.id])] + domain
-        
-        transfer_boms = self.env['mrp.bom'].search(domain)
-        
-        # Get all parent products from these BOMs (products that have components in BOM lines)
-        parent_products = set()
-        for bom in transfer_boms:
-            if bom.bom_line_ids:
-                # Get the parent product from bom_line_ids (first component is the parent)
-                parent_product = bom.bom_line_ids[0].product_id
-                parent_products.add(parent_product.id)
-        
+        parent_products = self._get_transfer_parent_product_ids()
+
         if parent_products:
             self.disallowed_products_json = list(parent_products)
             parent_product_names = self.env['product.product'].browse(list(parent_products)).mapped('name')
@@ -494,132 +1008,294 @@ class StockAdjustmentBarcode(models.Model):
     def _auto_initialize_disallowed_products(self):
         """
         Automatically initialize disallowed products list with parent products from BOM transfers.
-        This is called during barcode scanning if the list is empty.
+        This is called when the scan screen is opened, the list is only written when it changes.
         """
-        # Find all BOMs of type 'transfer' that are applicable to this warehouse/location
-        warehouse = self.location_id.warehouse_id or self.location_id.get_warehouse()
-        
-        domain = [('type', '=', 'transfer')]
-        if warehouse:
-            domain = ['|', ('warehouse_ids', '=', False), ('warehouse_ids', 'in', [warehouse.id])] + domain
-        
-        transfer_boms = self.env['mrp.bom'].search(domain)
-        
-        # Get all parent products from these BOMs (products that have components in BOM lines)
-        parent_products = set()
-        for bom in transfer_boms:
-            if bom.bom_line_ids:
-                # Get the parent product from bom_line_ids (first component is the parent)
-                parent_product = bom.bom_line_ids[0].product_id
-                parent_products.add(parent_product.id)
-        
-        if parent_products:
+        parent_products = self._get_transfer_parent_product_ids()
+
+        if parent_products and set(parent_products) != set(self.disallowed_products_json or []):
             self.disallowed_products_json = list(parent_products)
 
+    def _get_transfer_parent_product_ids(self):
+        """
+        Returns the ids of the parent products of the transfer BOMs applicable to the adjustment warehouse,
+        read from the cached transfer BOM index.
+        """
+        self.ensure_one()
+        return sorted({transfer_bom.parent_product_id for transfer_bom in self._get_transfer_bom_index().values()})
+
+    @profiled('create_stock_move')
     def create_stock_move(self):
         """
         Creates stock moves for each inventory adjustment line in 'approved' state.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
-        stock_move_lst = list()
         today = fields.Date.today()
-        stock_quant = self.env['stock.quant']
-        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+        stock_move_lst = self.filtered(lambda s: s.state == 'approved')._prepare_stock_move_vals()
+
+        if not stock_move_lst:
+            raise UserError(_("Something is wrong !!! Stock moves not created."))
 
-        for record in self.filtered(lambda s: s.state == 'approved'):
-            company = record.company_id
+        self._post_stock_moves(stock_move_lst)
+        self.write({'posted_date': today})
+        self.location_id.write({'last_inventory_date': today})
+
+    def _prepare_stock_move_vals(self):
+        """
+        Prepares the stock moves of the adjustment lines that are not posted yet.
+        """
+        stock_move_lst = list()
+        for record in self:
             # Only process parent lines and lines without parent (ignore child lines)
+            # Lines already posted by an interrupted background posting are skipped
             lines_to_process = record.inv_adjustment_line_ids.filtered(
-                lambda l: not l.is_child_line
+                lambda l: not l.is_child_line and not l.is_posted
             )
-            for line in lines_to_process:
-                inventory_location = line.product_id.with_company(company).property_stock_inventory
-
-                for lot_line in line.adjustment_line_lot_ids.filtered(lambda l: l.difference_qty != 0):
-
-                    if lot_line.difference_qty < 0:
-                        ### Check if the quant of the lot will not become -ve
-                        quants = stock_quant.search([
-                            ('lot_id', '=', lot_line.lot_id.id),
-                            ('product_id', '=', lot_line.product_id.id),
-                            ('location_id', '=', record.location_id.id)])
-                        available_qty = sum(quants.mapped('quantity'))  ### It will consider qty on hand and not available_qty.
-
-                        if float_compare(available_qty, abs(lot_line.difference_qty), precision_digits=precision) < 0:
-                            raise ValidationError(
-                                _(
-                                    "You cannot validate this stock operation because the "
-                                    "stock level of the product '{name}' would "
-                                    "become negative "
-                                    "({q_quantity}) on the stock location '{complete_name}' "
-                                    "and negative stock is "
-                                    "not allowed for this product and/or location."
-                                ).format(
-                                    name=lot_line.product_id.display_name,
-                                    q_quantity=available_qty,
-                                    complete_name=record.location_id.complete_name,
-                                )
-                            )
-                        location_id = record.location_id.id
-                        location_dest_id = inventory_location.id
-                    else:
-                        location_id = inventory_location.id
-                        location_dest_id = record.location_id.id
+            stock_move_lst += record._prepare_line_stock_move_vals(lines_to_process)
+        return stock_move_lst
 
-                    move_vals = {
+    def _prepare_line_stock_move_vals(self, lines_to_process):
+        """
+        Prepares one stock move per line and direction, with one move line per lot line.
+        The stock of all (product, lot) pairs is read in one query to make sure no quant becomes negative.
+        """
+        self.ensure_one()
+        company = self.company_id
+        stock_move_lst = list()
+        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+
+        lot_lines = lines_to_process.adjustment_line_lot_ids.filtered(lambda l: l.difference_qty != 0)
+        available_qty_by_lot = self._get_lot_quant_quantities(lot_lines.product_id.ids)
+
+        for line in lines_to_process:
+            inventory_location = line.product_id.with_company(company).property_stock_inventory
+            move_vals_by_direction = {}
+
+            for lot_line in line.adjustment_line_lot_ids.filtered(lambda l: l.difference_qty != 0):
+
+                if lot_line.difference_qty < 0:
+                    ### Check if the quant of the lot will not become -ve
+                    ### It will consider qty on hand and not available_qty.
+                    available_qty = available_qty_by_lot.get((lot_line.product_id.id, lot_line.lot_id.id or None), 0.0)
+
+                    if float_compare(available_qty, abs(lot_line.difference_qty), precision_digits=precision) < 0:
+                        raise ValidationError(
+                            _(
+                                "You cannot validate this stock operation because the "
+                                "stock level of the product '{name}' would "
+                                "become negative "
+                                "({q_quantity}) on the stock location '{complete_name}' "
+                                "and negative stock is "
+                                "not allowed for this product and/or location."
+                            ).format(
+                                name=lot_line.product_id.display_name,
+                                q_quantity=available_qty,
+                                complete_name=self.location_id.complete_name,
+                            )
+                        )
+                    location_id = self.location_id.id
+                    location_dest_id = inventory_location.id
+                else:
+                    location_id = inventory_location.id
+                    location_dest_id = self.location_id.id
+
+                move_vals = move_vals_by_direction.get(location_id)
+                if not move_vals:
+                    move_vals = move_vals_by_direction[location_id] = {
                         'company_id': company.id,
                         'inv_adjustment_line_id': line.id,
                         'is_inventory': True,
                         'location_dest_id': location_dest_id,
                         'location_id': location_id,
-                        # 'move_line_ids': list(),
-                        'origin': record.name,
+                        'origin': self.name,
                         'product_id': line.product_id.id,
                         'product_uom': line.product_uom_id.id,
-                        'product_uom_qty': abs(lot_line.difference_qty),
+                        'product_uom_qty': 0.0,
                         'state': 'confirmed',
-                        'name': f"{record.name}-[{line.product_id.default_code}]-{line.product_id.name}",
-                        'move_line_ids': [(0, 0, {
-                            'company_id': company.id,
-                            'location_dest_id': location_dest_id,
-                            'location_id': location_id,
-                            'lot_id': lot_line.lot_id.id,
-                            'product_id': lot_line.product_id.id,
-                            'product_uom_id': line.product_uom_id.id,
-                            'qty_done': abs(lot_line.difference_qty)
-                        })]
+                        'name': f"{self.name}-[{line.product_id.default_code}]-{line.product_id.name}",
+                        'move_line_ids': list(),
                     }
+                move_vals['product_uom_qty'] += abs(lot_line.difference_qty)
+                move_vals['move_line_ids'].append((0, 0, {
+                    'company_id': company.id,
+                    'location_dest_id': location_dest_id,
+                    'location_id': location_id,
+                    'lot_id': lot_line.lot_id.id,
+                    'product_id': lot_line.product_id.id,
+                    'product_uom_id': line.product_uom_id.id,
+                    'qty_done': abs(lot_line.difference_qty)
+                }))
+
+            stock_move_lst += move_vals_by_direction.values()
+
+        return stock_move_lst
+
+    def _get_lot_quant_quantities(self, product_ids):
+        """
+        Returns the on hand quantity of the products in the adjustment location (children excluded)
+        as {(product_id, lot_id or None): quantity}.
+        """
+        self.ensure_one()
+        return {
+            (quant_row.product_id, quant_row.lot_id): quant_row.qty
+            for quant_row in self.env['stock.quant']._read_adjustment_quant_rows(self.location_id, product_ids=product_ids)
+        }
 
-                    # for lot_line in line.adjustment_line_lot_ids:
-                    #     move_vals['move_line_ids'].append((0, 0, {
-                    #         'company_id': company.id,
-                    #         'location_dest_id': location_dest_id,
-                    #         'location_id': location_id,
-                    #         'lot_id': lot_line.lot_id.id,
-                    #         'product_id': lot_line.product_id.id,
-                    #         'product_uom_id': line.product_uom_id.id,
-                    #         'qty_done': abs(lot_line.difference_qty)
-                    #     }))
+    def _get_posting_chunk_size(self):
+        """
+        Returns the number of stock moves validated at once, configurable with the system parameter
+        'stock_adjustment_barcode.posting_chunk_size'.
+        """
+        chunk_size = self.env['ir.config_parameter'].sudo().get_param('stock_adjustment_barcode.posting_chunk_size')
+        try:
+            return max(int(chunk_size), 1)
+        except (TypeError, ValueError):
+            return 500
 
-                    stock_move_lst.append(move_vals)
+    def _post_stock_moves(self, stock_move_lst):
+        """
+        Creates and validates the stock moves by chunks.
+        The caches are flushed and cleared between chunks to keep the memory of the worker bounded.
+        Chunking only bounds the memory and the size of each recompute: all the chunks run in the same transaction,
+        so an error rolls the whole posting back, and a posting too long for the request is done by the background
+        posting instead (see action_post_in_background).
+        """
+        stock_move_obj = self.env['stock.move'].sudo().with_context(ignore_transfer_bom=True)
+        chunk_size = self._get_posting_chunk_size()
+        stock_moves = stock_move_obj
+        create_counters = action_done_counters = (0.0, 0, 0.0)
+
+        for index in range(0, len(stock_move_lst), chunk_size):
+            start_counters = self._get_timing_counters()
+            moves = stock_move_obj.create(stock_move_lst[index:index + chunk_size])
+            self.env.flush_all()
+            create_counters = self._add_timing_counters(create_counters, start_counters)
+            start_counters = self._get_timing_counters()
+            moves._action_done()
+            self.env.flush_all()
+            action_done_counters = self._add_timing_counters(action_done_counters, start_counters)
+            stock_moves |= moves
+            self.env.invalidate_all()
+
+        self._record_timing('stock_moves_create', *create_counters, row_count=len(stock_move_lst))
+        self._record_timing('stock_moves_action_done', *action_done_counters, row_count=len(stock_move_lst))
+        return stock_moves
+
+    @contextmanager
+    def _profile_phase(self, phase, flush=True):
+        """
+        Measures the enclosed phase of the adjustments and records it as a timing: wall time, number and duration
+        of the queries and the number of lines of the adjustment, or the rows set on the yielded dict.
+        With flush, the pending recomputes are flushed at the end of the phase and measured apart.
+        Nothing is recorded when the phase fails, its transaction being rolled back.
+        """
+        stats = {'rows': None}
+        start_counters = self._get_timing_counters()
+        yield stats
+        recompute_duration = 0.0
+        if flush:
+            flush_start = time.monotonic()
+            self.env.flush_all()
+            recompute_duration = time.monotonic() - flush_start
+        self._record_timing(phase, *self._add_timing_counters((0.0, 0, 0.0), start_counters),
+                            row_count=stats['rows'], recompute_duration=recompute_duration)
+
+    def _get_timing_counters(self):
+        """
+        Returns the current (monotonic time, query count, query time) of the worker.
+        """
+        return time.monotonic(), self.env.cr.sql_log_count, getattr(threading.current_thread(), 'query_time', 0.0)
 
-        if not stock_move_lst:
-            raise UserError(_("Something is wrong !!! Stock moves not created."))
+    def _add_timing_counters(self, totals, start_counters):
+        """
+        Adds what was spent since start_counters to the (duration, query count, query duration) totals.
+        """
+        return tuple(total + current - start for total, current, start in
+                     zip(totals, self._get_timing_counters(), start_counters))
 
-        stock_moves = self.env['stock.move'].sudo().create(stock_move_lst)
-        stock_moves.with_context(ignore_transfer_bom=True)._action_done()
-        self.write({'posted_date': today})
-        self.location_id.write({'last_inventory_date': today})
+    def _record_timing(self, phase, duration, query_count, query_duration, row_count=None, recompute_duration=0.0):
+        """
+        Creates the timing of the phase for each adjustment. When no row count is given,
+        the number of lines of the adjustment is used. Phases slower than the threshold are also
+        reported in the chatter.
+        """
+        if not self:
+            return
+        line_counts = {}
+        if row_count is None:
+            self.env.cr.execute("""
+                SELECT inv_adjustment_id, COUNT(*)
+                FROM stock_adjustment_barcode_line
+                WHERE inv_adjustment_id = ANY(%s)
+                GROUP BY inv_adjustment_id
+            """, [self.ids])
+            line_counts = dict(self.env.cr.fetchall())
+        self.env['stock.adjustment.barcode.timing'].sudo().create([{
+            'inv_adjustment_id': adjustment.id,
+            'phase': phase,
+            'duration': duration,
+            'recompute_duration': recompute_duration,
+            'query_count': query_count,
+            'query_duration': query_duration,
+            'row_count': line_counts.get(adjustment.id, 0) if row_count is None else row_count,
+        } for adjustment in self])
+        _logger.info("Stock adjustment %s: %s in %.3fs, %s queries (%.3fs)",
+                     ', '.join(self.mapped('name')), phase, duration, query_count, query_duration)
+
+        slow_phase_threshold = float(self.env['ir.config_parameter'].sudo().get_param(
+            'stock_adjustment_barcode.slow_phase_threshold', 60))
+        if duration > slow_phase_threshold:
+            for adjustment in self:
+                adjustment.message_post(body=_(
+                    "Slow %(phase)s: %(duration).1fs, %(query_count)s queries taking %(query_duration).1fs.",
+                    phase=phase, duration=duration, query_count=query_count, query_duration=query_duration))
+
+    def action_view_timings(self):
+        """
+        Opens the timings recorded for the phases of the adjustment.
+        """
+        return self.open_action_view(action_xml_id='stock_adjustment_barcode.stock_adjustment_barcode_timing_action',
+                                     field_name='inv_adjustment_id', record_ids=self.ids)
+
+    def action_export_timings(self):
+        """
+        Downloads the timings of the adjustment as JSON.
+        """
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/stock_adjustment_barcode/%s/timings.json' % self.id,
+            'target': 'self',
+        }
+
+    def _get_timings_export(self):
+        """
+        Returns the timings of the adjustment with its size, so that counts of different sizes can be compared.
+        """
+        self.ensure_one()
+        return {
+            'adjustment': self.name,
+            'location': self.location_id.complete_name,
+            'state': self.state,
+            'line_count': self.inv_adjustment_line_count,
+            'scanned_row_count': self.env['stock.adjustment.barcode.line.info'].search_count(
+                [('inv_adjustment_id', '=', self.id)]),
+            'timings': self.timing_ids._get_export_values(),
+        }
 
     @api.model_create_multi
     def create(self, vals_list):
         """
         Creates a new stock adjustment record with a unique sequence.
+        Only the sub-counts of the same cycle count plan can be active together on a location.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
         ir_sequence_obj = self.env['ir.sequence']
         for vals in vals_list:
-            if self.search([('location_id', '=', vals['location_id']), ('state', 'not in', ('done', 'cancel'))]):
+            domain = [('location_id', '=', vals['location_id']), ('state', 'not in', ('done', 'cancel'))]
+            if vals.get('plan_id'):
+                # The sub-counts of a cycle count plan share the location, each one counting its own products
+                domain.append(('plan_id', '!=', vals['plan_id']))
+            if self.search(domain):
                 raise ValidationError(_("You can only have one active adjustment for a location!"))
             if vals.get('name', _('New')) == _('New'):
                 vals['name'] = ir_sequence_obj.next_by_code('inventory.adjustment.barcode.sequence')
@@ -650,6 +1326,138 @@ class StockAdjustmentBarcode(models.Model):
                                      field_name='stock_move_id',
                                      record_ids=self.inv_adjustment_line_ids.stock_move_ids.ids)
 
+    def _get_variation_report_data(self):
+        """
+        Returns the rows and the total valuation difference of the variation reports of the adjustments.
+        The rows are computed in one query ordered like the lines. Once an adjustment is done the result
+        is kept on the adjustment, so reprinting it does not read the lines again. The kept rows only hold
+        the ids of the products and units of measure, their names are read in the language of the report.
+        """
+        rows = []
+        total = 0.0
+        for adjustment in self:
+            snapshot = adjustment.variation_report_snapshot
+            if not (snapshot and snapshot.get('state') == adjustment.state):
+                snapshot = adjustment._build_variation_report_snapshot()
+                if adjustment.state == 'done':
+                    adjustment.sudo().write({'variation_report_snapshot': snapshot})
+            rows += snapshot['rows']
+            total += snapshot['total']
+
+        products = self.env['product.product'].with_context(active_test=False).browse({row['product_id'] for row in rows})
+        product_names = dict(products.name_get())
+        uom_names = dict(self.env['uom.uom'].browse({row['uom_id'] for row in rows}).name_get())
+        rows = [dict(row, product_name=product_names.get(row['product_id'], ''), uom_name=uom_names.get(row['uom_id'], ''))
+                for row in rows]
+        return {'rows': rows, 'total': total}
+
+    def _build_variation_report_snapshot(self):
+        """
+        Reads the variation report rows of the adjustment. The differences of a draft adjustment are computed
+        in memory from the scanned totals, rendering the report does not write on the lines.
+        """
+        self.ensure_one()
+        line_obj = self.env['stock.adjustment.barcode.line']
+        line_obj.flush_model(['inv_adjustment_id', 'product_id', 'on_hand_qty', 'difference_qty', 'unit_price'])
+        self.env.cr.execute("""
+            SELECT
+                line.id,
+                line.product_id,
+                pt.uom_id,
+                COALESCE(line.on_hand_qty, 0.0),
+                COALESCE(line.difference_qty, 0.0),
+                COALESCE(line.unit_price, 0.0)
+            FROM
+                stock_adjustment_barcode_line AS line
+                    INNER JOIN product_product AS pp
+                        ON pp.id = line.product_id
+                    INNER JOIN product_template AS pt
+                        ON pt.id = pp.product_tmpl_id
+            WHERE
+                line.inv_adjustment_id = %s
+            ORDER BY
+                line.id
+        """, [self.id])
+        result = self.env.cr.fetchall()
+        lines = line_obj.browse([row[0] for row in result])
+        total_scanned_qty_by_line = dict(zip(lines.ids, lines.mapped('total_scanned_qty')))
+        rows = []
+        for line_id, product_id, uom_id, on_hand_qty, difference_qty, unit_price in result:
+            total_scanned_qty = total_scanned_qty_by_line[line_id]
+            if self.state == 'draft':
+                difference_qty = total_scanned_qty - on_hand_qty
+            rows.append({
+                'product_id': product_id,
+                'uom_id': uom_id,
+                'on_hand_qty': on_hand_qty,
+                'total_scanned_qty': total_scanned_qty,
+                'difference_qty': difference_qty,
+                'unit_price': unit_price,
+                'valuation_difference': difference_qty * unit_price,
+            })
+        return {'state': self.state, 'rows': rows, 'total': sum(row['valuation_difference'] for row in rows)}
+
+    def _get_variation_report_columns(self):
+        """
+        Returns the (key, label) columns of the variation export. The cost columns are only exported to
+        the users allowed to see the product costs.
+        """
+        columns = [
+            ('product_name', _('Product')),
+            ('uom_name', _('Unit of Measure')),
+            ('on_hand_qty', _('On Hand Qty')),
+            ('total_scanned_qty', _('Counted Qty')),
+            ('difference_qty', _('Difference')),
+        ]
+        if self.env.user.has_group('base_product_cost_security.group_product_cost_security'):
+            columns += [
+                ('unit_price', _('Unit Cost')),
+                ('valuation_difference', _('Valuation Difference')),
+            ]
+        return columns
+
+    def _get_variation_report_csv(self):
+        """
+        Returns the variation report of the adjustments as a CSV file.
+        """
+        columns = self._get_variation_report_columns()
+        data = self._get_variation_report_data()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([label for __, label in columns])
+        writer.writerows([row[key] for key, __ in columns] for row in data['rows'])
+        return buffer.getvalue().encode('utf-8')
+
+    def _get_variation_report_xlsx(self):
+        """
+        Returns the variation report of the adjustments as an XLSX file. Rows are written in constant memory.
+        """
+        columns = self._get_variation_report_columns()
+        data = self._get_variation_report_data()
+        output = io.BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True, 'constant_memory': True})
+        worksheet = workbook.add_worksheet(_('Stock Variation'))
+        bold = workbook.add_format({'bold': True})
+        worksheet.write_row(0, 0, [label for __, label in columns], bold)
+        for row_index, row in enumerate(data['rows'], start=1):
+            worksheet.write_row(row_index, 0, [row[key] for key, __ in columns])
+        if columns[-1][0] == 'valuation_difference':
+            worksheet.write(len(data['rows']) + 1, len(columns) - 2, _('Total Valuation Difference'), bold)
+            worksheet.write(len(data['rows']) + 1, len(columns) - 1, data['total'], bold)
+        workbook.close()
+        return output.getvalue()
+
+    def action_export_variation_report(self):
+        """
+        Downloads the stock variation of the adjustment as an XLSX file.
+        """
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/stock_adjustment_barcode/%s/variation_report.xlsx' % self.id,
+            'target': 'self',
+        }
+
     def action_open_scan_line(self):
         """
         Opens the scan form view for the stock adjustment record.
@@ -1,8 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import logging
+
+import psycopg2
+
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
 from odoo.tools import float_compare, float_round
+from odoo.tools.misc import groupby
+
+from ..tools.lot_allocation import allocate_lots
+
+_logger = logging.getLogger(__name__)
 
 
 class StockAdjustmentBarcodeLine(models.Model):
@@ -38,8 +47,8 @@ class StockAdjustmentBarcodeLine(models.Model):
     )
 
     total_scanned_qty = fields.Float(
-        compute='_compute_product_qty',
-        store=True
+        compute='_compute_total_scanned_qty',
+        help='Summed from the scanned rows when read, from the child lines for a parent line'
     )
 
     product_id = fields.Many2one(comodel_name='product.product')
@@ -70,6 +79,12 @@ class StockAdjustmentBarcodeLine(models.Model):
         copy=False
     )
 
+    scan_ids = fields.One2many(
+        comodel_name='stock.adjustment.barcode.line.scan',
+        inverse_name='inv_adjustment_line_id',
+        string='Scans'
+    )
+
     adjustment_line_lot_ids = fields.One2many(
         comodel_name='stock.adjustment.barcode.lot.line',
         inverse_name='inv_adjustment_line_id',
@@ -109,6 +124,11 @@ class StockAdjustmentBarcodeLine(models.Model):
         help='Sequence for displaying parent lines before child lines'
     )
 
+    is_posted = fields.Boolean(
+        copy=False,
+        help='Set once the stock moves of the line are done by the background posting'
+    )
+
     display_name_with_relation = fields.Char(
         string='Product Display Name',
         compute='_compute_display_name_with_relation',
@@ -120,17 +140,44 @@ class StockAdjustmentBarcodeLine(models.Model):
         'UNIQUE(product_id, lot_id, inv_adjustment_id)',
         'Product and Lot number should be uniq on lines')]
 
+    def init(self):
+        """
+        The unique constraint on (product_id, lot_id, inv_adjustment_id) does not apply to lines without lot,
+        a partial unique index covers them so that concurrent scans resolve to the same line.
+        """
+        super().init()
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS stock_adjustment_barcode_line_product_no_lot_uniq
+                    ON stock_adjustment_barcode_line (inv_adjustment_id, product_id)
+                    WHERE lot_id IS NULL
+                """)
+        except psycopg2.IntegrityError:
+            _logger.warning("Duplicated adjustment lines without lot, the index "
+                            "stock_adjustment_barcode_line_product_no_lot_uniq could not be created.")
+
     @api.depends('parent_product_id')
     def _compute_is_parent_line(self):
         """Compute if this line is a parent line that consolidates child products."""
+        # Check if there are other lines with this product as parent_product_id, for all lines at once
+        parent_keys = set()
+        adjustment_ids = [adjustment_id for adjustment_id in self.inv_adjustment_id._origin.ids if adjustment_id]
+        if adjustment_ids:
+            self.flush_model(['inv_adjustment_id', 'parent_product_id'])
+            self.env.cr.execute("""
+                SELECT DISTINCT
+                    inv_adjustment_id,
+                    parent_product_id
+                FROM
+                    stock_adjustment_barcode_line
+                WHERE
+                    inv_adjustment_id = ANY(%s)
+                    AND parent_product_id IS NOT NULL
+            """, [adjustment_ids])
+            parent_keys = set(self.env.cr.fetchall())
         for record in self:
-            # Check if there are other lines with this product as parent_product_id
-            child_lines_count = self.search_count([
-                ('inv_adjustment_id', '=', record.inv_adjustment_id.id),
-                ('parent_product_id', '=', record.product_id.id),
-                ('id', '!=', record.id)
-            ])
-            record.is_parent_line = child_lines_count > 0
+            record.is_parent_line = (record.inv_adjustment_id._origin.id, record.product_id.id) in parent_keys
 
     @api.depends('parent_product_id')
     def _compute_is_child_line(self):
@@ -184,32 +231,19 @@ class StockAdjustmentBarcodeLine(models.Model):
     def _find_parent_product_from_bom_transfer(self):
         """
         Find parent product from BOM transfer type.
-        Search for BOM where the scanned product is the main product (product_tmpl_id) 
-        and type is 'transfer', then return the first product from bom_line_ids.
+        Look up the BOM where the scanned product is the main product (product_tmpl_id)
+        and type is 'transfer' in the cached transfer BOM index of the warehouse,
+        then return the first product from bom_line_ids.
         """
         self.ensure_one()
         if not self.product_id:
             return False
-            
-        # Search for BOMs where this product is the main product and BOM type is 'transfer'
-        bom = self.env['mrp.bom'].search([
-            ('product_tmpl_id', '=', self.product_id.product_tmpl_id.id),
-            ('type', '=', 'transfer')
-        ], limit=1)
-        
-        if bom and bom.bom_line_ids:
-            # Check if the BOM is applicable to the current warehouse/location
-            if bom.warehouse_ids:
-                # Get warehouse from location
-                location = self.inv_adjustment_id.location_id
-                warehouse = location.warehouse_id or location.get_warehouse()
-                if warehouse not in bom.warehouse_ids:
-                    return False
-            
-            # Return the first product from bom_line_ids (parent product)
-            return bom.bom_line_ids[0].product_id
-            
-        return False
+
+        transfer_bom = self.inv_adjustment_id._get_transfer_bom_index().get(self.product_id.product_tmpl_id.id)
+        if not transfer_bom:
+            return False
+        # Return the first product from bom_line_ids (parent product)
+        return self.env['product.product'].browse(transfer_bom.parent_product_id)
 
     def _get_bom_transfer_for_child(self):
         """
@@ -219,26 +253,13 @@ class StockAdjustmentBarcodeLine(models.Model):
         self.ensure_one()
         if not self.product_id:
             return False
-            
-        # Search for BOMs where this product is the main product and BOM type is 'transfer'
-        bom = self.env['mrp.bom'].search([
-            ('product_tmpl_id', '=', self.product_id.product_tmpl_id.id),
-            ('type', '=', 'transfer')
-        ], limit=1)
-        
-        if bom and bom.bom_line_ids:
-            # Check if the BOM is applicable to the current warehouse/location
-            if bom.warehouse_ids:
-                # Get warehouse from location
-                location = self.inv_adjustment_id.location_id
-                warehouse = location.warehouse_id or location.get_warehouse()
-                if warehouse not in bom.warehouse_ids:
-                    return False
-            return bom
-            
-        return False
 
-    def _compute_parent_qty_from_children(self, child_lines):
+        transfer_bom = self.inv_adjustment_id._get_transfer_bom_index().get(self.product_id.product_tmpl_id.id)
+        if not transfer_bom:
+            return False
+        return self.env['mrp.bom'].browse(transfer_bom.bom_id)
+
+    def _compute_parent_qty_from_children(self, child_lines, scanned_qty_by_line=None):
         """
         Compute parent quantity from child lines using BOM conversion ratios.
         For each child product, find its BOM and convert the scanned quantity
@@ -266,104 +287,298 @@ class StockAdjustmentBarcodeLine(models.Model):
         ------------
         If products use different UoMs (e.g., Units vs Grams), the conversion
         handles UoM conversion automatically using Odoo's UoM conversion system.
+
+        scanned_qty_by_line optionally provides the scanned quantity of child lines
+        that are being computed in the same batch.
         """
         self.ensure_one()
         total_parent_qty = 0.0
-        
+        bom_index = self.inv_adjustment_id._get_transfer_bom_index()
+        uom_obj = self.env['uom.uom']
+
+        scanned_qty_by_line = scanned_qty_by_line or {}
         for child_line in child_lines:
-            child_scanned_qty = child_line.total_scanned_qty
-            
+            child_scanned_qty = scanned_qty_by_line.get(child_line, child_line.total_scanned_qty)
+
             # Get the BOM for this child product
-            bom = child_line._get_bom_transfer_for_child()
-            
-            if not bom:
-                # If no BOM found, use child qty as-is (shouldn't happen in normal flow)
-                total_parent_qty += child_scanned_qty
-                continue
-            
-            # Find the BOM line that points to the parent product (this line's product)
-            parent_bom_line = bom.bom_line_ids.filtered(
-                lambda l: l.product_id == self.product_id
-            )
-            
-            if not parent_bom_line:
-                # If no matching BOM line found, use child qty as-is
+            transfer_bom = bom_index.get(child_line.product_id.product_tmpl_id.id)
+
+            # If no BOM found or the BOM doesn't point to this parent product, use child qty as-is
+            # (shouldn't happen in normal flow)
+            if not transfer_bom or transfer_bom.parent_product_id != self.product_id.id:
                 total_parent_qty += child_scanned_qty
                 continue
-            
-            parent_bom_line = parent_bom_line[0]  # Take first match
-            
-            # Calculate conversion ratio from BOM
-            # BOM structure: bom.product_qty of child -> parent_bom_line.product_qty of parent
-            bom_product_qty = bom.product_qty or 1.0  # Child quantity in BOM
-            parent_line_qty = parent_bom_line.product_qty or 1.0  # Parent quantity in BOM
-            
+
             # Convert scanned child quantity to parent quantity using BOM ratio
             # Formula: (scanned_child_qty / bom_product_qty) * parent_line_qty
             # Example: (5 scanned / 1 BOM child) * 3 BOM parent = 15 parent units
-            converted_qty = (child_scanned_qty / bom_product_qty) * parent_line_qty
-            
+            converted_qty = child_scanned_qty * transfer_bom.ratio
+
             # Handle Unit of Measure conversions
             child_uom = child_line.product_uom_id  # Child product's UoM
-            bom_uom = bom.product_uom_id  # BOM's base UoM
-            parent_line_uom = parent_bom_line.product_uom_id  # Parent BOM line's UoM
+            bom_uom = uom_obj.browse(transfer_bom.bom_uom_id)  # BOM's base UoM
+            parent_line_uom = uom_obj.browse(transfer_bom.parent_uom_id)  # Parent BOM line's UoM
             parent_uom = self.product_uom_id  # Parent product's UoM
-            
+
             # Step 1: Convert from child UoM to BOM UoM if they differ
             # (e.g., if child is in grams but BOM is in kg)
             if child_uom != bom_uom:
                 converted_qty = child_uom._compute_quantity(
                     converted_qty, bom_uom, rounding_method='HALF-UP'
                 )
-            
+
             # Step 2: Convert from parent BOM line UoM to actual parent product UoM
             # (e.g., if BOM line is in kg but parent product is in units)
             if parent_line_uom != parent_uom:
                 converted_qty = parent_line_uom._compute_quantity(
                     converted_qty, parent_uom, rounding_method='HALF-UP'
                 )
-            
+
             total_parent_qty += converted_qty
-        
+
         return total_parent_qty
 
-    @api.depends('lot_id', 'inv_adjustment_id.location_id', 'adjustment_line_info_ids',
-                 'adjustment_line_info_ids.product_id', 'adjustment_line_info_ids.scanned_qty',
-                 'parent_product_id', 'is_parent_line')
+    @api.depends('product_id', 'lot_id', 'inv_adjustment_id.location_id',
+                 'inv_adjustment_id.stock_at_date', 'inv_adjustment_id.inventory_date')
     def _compute_product_qty(self):
         """
-        Compute the product quantities based on the stock quants and adjustment details.
-        For parent lines, compute total from child lines by converting using BOM ratios.
+        Compute the product quantities based on the stock quants.
+        Scans do not trigger it, the stock is refreshed explicitly on refresh and confirmation.
+        Quantities and valuation of all lines are fetched with one grouped query each, at the inventory date
+        for the adjustments counting the stock at date.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
-        quant_obj = self.env['stock.quant'].sudo()
-        for record in self:
-            product = record.product_id
-            domain = [('product_id', '=', product.id), ('location_id', '=', record.inv_adjustment_id.location_id.id)]
-            if record.lot_id:
-                domain += [('lot_id', '=', record.lot_id.id)]
+        for at_date, lines in groupby(self, key=lambda l: l.inv_adjustment_id._get_stock_date()):
+            lines = self.concat(*lines)
+            quantities = lines._get_quant_quantities(at_date)
+            unit_prices = lines._get_valuation_unit_prices(at_date)
+
+            for record in lines:
+                location_id = record.inv_adjustment_id.location_id.id
+                on_hand_qty, available_qty = quantities.get(
+                    (location_id, record.product_id.id, record.lot_id.id or None), (0.0, 0.0))
+
+                record.on_hand_qty = on_hand_qty
+                record.forecast_qty = available_qty
+                record.unit_price = unit_prices.get((record.company_id.id or self.env.company.id, record.product_id.id), 0.0)
+
+    @api.model
+    def _get_or_create_line_ids(self, adjustment, keys):
+        """
+        Returns the lines of the adjustment for the given (product_id, lot_id) keys as {(product_id, lot_id): line_id},
+        inserting the missing ones with INSERT ... ON CONFLICT DO NOTHING. Counters scanning the same new product
+        at the same time then share one line instead of failing on the unique constraint.
+        SQL only picks the line that wins the insert: the rows get the default values of the ORM, then the new lines
+        are notified and their stored computed fields are recomputed as create() would.
+
+        Args:
+            adjustment: stock.adjustment.barcode record
+            keys: Iterable of (product_id, lot_id or False)
+        """
+        keys = sorted({(product_id, lot_id or False) for product_id, lot_id in keys}, key=lambda k: (k[0], k[1] or 0))
+        if not keys:
+            return {}
+
+        key_columns = ['inv_adjustment_id', 'product_id', 'lot_id']
+        default_values = {
+            fname: self._fields[fname].convert_to_column(value, self)
+            for fname, value in self.default_get([
+                fname for fname, field in self._fields.items()
+                if field.store and field.column_type and not field.compute
+                and fname not in key_columns and fname not in models.MAGIC_COLUMNS
+            ]).items()
+        }
+        default_columns = ''.join(f', "{fname}"' for fname in default_values)
+        default_placeholders = ', %s' * len(default_values)
+
+        self.flush_model(key_columns)
+        self.env.cr.execute(f"""
+            INSERT INTO stock_adjustment_barcode_line (
+                inv_adjustment_id, product_id, lot_id, create_uid, create_date, write_uid, write_date{default_columns}
+            )
+            SELECT
+                %s, new_line.product_id, new_line.lot_id,
+                %s, (now() at time zone 'UTC'), %s, (now() at time zone 'UTC'){default_placeholders}
+            FROM
+                unnest(%s::int[], %s::int[]) AS new_line(product_id, lot_id)
+            ON CONFLICT DO NOTHING
+            RETURNING id
+        """, [
+            adjustment.id, self.env.uid, self.env.uid, *default_values.values(),
+            [key[0] for key in keys], [key[1] or None for key in keys],
+        ])
+        new_lines = self.browse([line_id for line_id, in self.env.cr.fetchall()])
+        if new_lines:
+            adjustment.invalidate_recordset(['inv_adjustment_line_ids'])
+            for field in self._fields.values():
+                if field.store and field.compute:
+                    self.env.add_to_compute(field, new_lines)
+            new_lines.modified(self._fields, create=True)
+            new_lines._recompute_recordset()
+
+        self.env.cr.execute("""
+            SELECT
+                product_id,
+                lot_id,
+                id
+            FROM
+                stock_adjustment_barcode_line
+            WHERE
+                inv_adjustment_id = %s
+                AND product_id = ANY(%s)
+        """, [adjustment.id, list({key[0] for key in keys})])
+        wanted_keys = set(keys)
+        return {
+            (product_id, lot_id or False): line_id
+            for product_id, lot_id, line_id in self.env.cr.fetchall()
+            if (product_id, lot_id or False) in wanted_keys
+        }
+
+    def _compute_total_scanned_qty(self):
+        """
+        Sums the scanned rows of the lines with one grouped read. The totals are not stored, scans only append
+        or update their own rows and refresh the difference of the lines they count.
+        For parent lines, compute total from child lines by converting using BOM ratios.
+        """
+        child_lines_by_parent = self._get_child_lines_by_parent()
 
-            product_quants = quant_obj.search(domain)
-            on_hand_qty = sum(product_quants.mapped('quantity'))
-            
+        # Own scanned quantities first, parent lines are computed from them
+        all_child_lines = self.browse().concat(*child_lines_by_parent.values())
+        scanned_qty_by_line = (self | all_child_lines)._get_scanned_qty_totals()
+
+        for record in self:
             # Check if this is a parent line (has children)
-            child_lines = record.inv_adjustment_id.inv_adjustment_line_ids.filtered(
-                lambda l: l.parent_product_id == record.product_id
-            )
-            
+            child_lines = child_lines_by_parent.get((record.inv_adjustment_id, record.product_id))
             if child_lines:
                 # Parent line - sum up converted quantities from all child lines using BOM ratios
-                total_scanned_qty = record._compute_parent_qty_from_children(child_lines)
+                record.total_scanned_qty = record._compute_parent_qty_from_children(child_lines, scanned_qty_by_line)
             else:
                 # Regular line or child line - use its own scanned qty
-                total_scanned_qty = record.get_total_qty()
+                record.total_scanned_qty = scanned_qty_by_line[record]
 
-            record.on_hand_qty = on_hand_qty
-            record.total_scanned_qty = total_scanned_qty
-            record.forecast_qty = sum(product_quants.mapped('available_quantity'))
-            record.unit_price = product.quantity_svl > 0 and product.value_svl / product.quantity_svl or 0.0
+    def _refresh_difference_qty(self):
+        """
+        Stores the difference of the lines, and of the parent lines of the child lines, with their scanned totals
+        read from the scanned rows. The scans refresh the lines they count, the stock refresh, consolidation and
+        confirmation refresh all the lines.
+        """
+        lines = self.filtered('id').exists()
+        child_lines = lines.filtered('parent_product_id')
+        if child_lines:
+            lines |= self.search([
+                ('inv_adjustment_id', 'in', child_lines.inv_adjustment_id.ids),
+                ('product_id', 'in', child_lines.parent_product_id.ids),
+                ('parent_product_id', '=', False),
+            ])
+        lines.invalidate_recordset(['total_scanned_qty'])
+        lines._bulk_update_column('difference_qty', {
+            record.id: record.total_scanned_qty - record.on_hand_qty for record in lines
+            if record.difference_qty != record.total_scanned_qty - record.on_hand_qty
+        })
 
-    @api.depends('total_scanned_qty', 'on_hand_qty')
+    def _get_scanned_qty_totals(self):
+        """
+        Returns the scanned quantity of each line in its UoM, summed with one grouped read of the scanned rows.
+        """
+        totals = dict.fromkeys(self, 0.0)
+        lines = self.filtered('id')
+        if not lines:
+            return totals
+
+        factors = {}
+        groups = self.env['stock.adjustment.barcode.line.info'].read_group(
+            [('inv_adjustment_line_id', 'in', lines.ids)],
+            ['scanned_qty:sum'], ['inv_adjustment_line_id', 'product_uom_id'], lazy=False)
+        for group in groups:
+            line = self.browse(group['inv_adjustment_line_id'][0])
+            uom_id = group['product_uom_id'] and group['product_uom_id'][0]
+            totals[line] += line._convert_scanned_qty(group['scanned_qty'], uom_id, factors)
+        return totals
+
+    def _convert_scanned_qty(self, qty, uom_id, factors):
+        """
+        Converts a quantity scanned in the given UoM into the UoM of the line.
+        The conversion factor of each pair of UoM is computed once and kept in factors.
+        """
+        self.ensure_one()
+        line_uom = self.product_uom_id
+        if not uom_id or uom_id == line_uom.id:
+            return qty
+        key = (uom_id, line_uom.id)
+        if key not in factors:
+            factors[key] = self.env['uom.uom'].browse(uom_id)._compute_quantity(1.0, line_uom, round=False)
+        return float_round(qty * factors[key], precision_rounding=line_uom.rounding, rounding_method='HALF-UP')
+
+    def _get_quant_quantities(self, at_date=None):
+        """
+        Returns the on hand and available quantities of the lines' products in their adjustment location,
+        keyed by (location_id, product_id, lot_id) and by (location_id, product_id, None) for all lots of the product.
+        When at_date is given, the quantities are the ones of the location at that date, nothing being reserved.
+        """
+        quant_obj = self.env['stock.quant']
+        quantities = {}
+        for location, lines in groupby(self, key=lambda l: l.inv_adjustment_id.location_id):
+            if not location:
+                continue
+            product_ids = list({line.product_id.id for line in lines if line.product_id})
+            if at_date:
+                quant_rows = quant_obj._read_adjustment_quant_rows_at_date(location, at_date, product_ids=product_ids)
+            else:
+                quant_rows = quant_obj._read_adjustment_quant_rows(location, product_ids=product_ids)
+            for quant_row in quant_rows:
+                for key in {(location.id, quant_row.product_id, quant_row.lot_id), (location.id, quant_row.product_id, None)}:
+                    on_hand_qty, available_qty = quantities.get(key, (0.0, 0.0))
+                    quantities[key] = (on_hand_qty + quant_row.qty, available_qty + quant_row.qty - quant_row.reserved)
+        return quantities
+
+    def _get_valuation_unit_prices(self, at_date=None):
+        """
+        Returns the average valuation layer unit price of the lines' products keyed by (company_id, product_id),
+        aggregated in one query instead of reading value_svl/quantity_svl per product.
+        When at_date is given, only the layers created until that date are taken into account.
+        """
+        company_ids = list(set(self.company_id.ids) | {self.env.company.id})
+        product_ids = list(set(self.product_id.ids))
+        if not product_ids:
+            return {}
+
+        self.env['stock.valuation.layer'].flush_model(['company_id', 'product_id', 'quantity', 'value'])
+        self.env.cr.execute("""
+            SELECT
+                svl.company_id,
+                svl.product_id,
+                SUM(svl.quantity),
+                SUM(svl.value)
+            FROM
+                stock_valuation_layer AS svl
+            WHERE
+                svl.company_id = ANY(%s)
+                AND svl.product_id = ANY(%s)
+                AND (%s::timestamp IS NULL OR svl.create_date <= %s)
+            GROUP BY
+                svl.company_id, svl.product_id
+        """, [company_ids, product_ids, at_date or None, at_date or None])
+
+        companies = self.env['res.company'].browse(company_ids)
+        currency_by_company = {company.id: company.currency_id for company in companies}
+        unit_prices = {}
+        for company_id, product_id, quantity, value in self.env.cr.fetchall():
+            value = currency_by_company[company_id].round(value or 0.0)
+            unit_prices[(company_id, product_id)] = quantity > 0 and value / quantity or 0.0
+        return unit_prices
+
+    def _get_child_lines_by_parent(self):
+        """
+        Returns the child lines of the adjustments of the lines keyed by (adjustment, parent product).
+        """
+        child_lines_by_parent = {}
+        for line in self.inv_adjustment_id.inv_adjustment_line_ids:
+            if line.parent_product_id:
+                key = (line.inv_adjustment_id, line.parent_product_id)
+                child_lines_by_parent[key] = child_lines_by_parent.get(key, self.browse()) | line
+        return child_lines_by_parent
+
+    @api.depends('on_hand_qty')
     def _compute_difference_qty(self):
         for record in self:
             record.difference_qty = record.total_scanned_qty - record.on_hand_qty
@@ -373,20 +588,28 @@ class StockAdjustmentBarcodeLine(models.Model):
         Calculate the total scanned quantity across all adjustment line info.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
-        total_qty = 0
-        product_uom = self.product_uom_id
-        for line in self.adjustment_line_info_ids:
-            total_qty += line.product_uom_id._compute_quantity(
-                line.scanned_qty, product_uom, rounding_method='HALF-UP') if line.product_uom_id != product_uom else line.scanned_qty
-        return total_qty
+        self.ensure_one()
+        return self._get_scanned_qty_totals()[self]
 
     def action_open_stock_adjustment_barcode_line_info(self):
         """
-        Open the stock adjustment barcode line info action view.
+        Open the stock adjustment barcode line info action view, with the rows of the child lines of a parent line.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
+        lines = self
+        child_lines_by_parent = self._get_child_lines_by_parent()
+        for line in self:
+            lines |= child_lines_by_parent.get((line.inv_adjustment_id, line.product_id), self.browse())
         return self.inv_adjustment_id.open_action_view(
             action_xml_id='stock_adjustment_barcode.stock_adjustment_barcode_line_info_action',
+            field_name='inv_adjustment_line_id', record_ids=lines.ids)
+
+    def action_view_scans(self):
+        """
+        Opens the scans of the lines per user, those of the child lines included for a parent line.
+        """
+        return self.inv_adjustment_id.open_action_view(
+            action_xml_id='stock_adjustment_barcode.stock_adjustment_barcode_line_scan_action',
             field_name='inv_adjustment_line_id', record_ids=self.ids)
 
     def action_show_details(self):
@@ -401,195 +624,114 @@ class StockAdjustmentBarcodeLine(models.Model):
     def set_lot_on_adjustment_line_ids(self):
         """
         Set the lot details for the adjustment lines based on stock availability and quantity.
+        The quants of the products of each adjustment are read once and distributed over the lots in memory,
+        then the lot lines of all the lines are replaced with a single unlink and a single create.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
-        product = self.product_id
-        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
-        new_scanned_qty = self.total_scanned_qty
-        location = self.inv_adjustment_id.location_id
-        lot_details_lst = [(2, line_details.id) for line_details in self.adjustment_line_lot_ids]
-
-        quants = self.env['stock.quant']._gather(product, location)
-        quant_found_in_location = True
-        if not quants:
+        lot_line_ids_to_unlink = []
+        lot_line_vals_list = []
+        for adjustment, lines in groupby(self, key=lambda l: l.inv_adjustment_id):
+            lines = self.browse([line.id for line in lines])
+            quant_rows_by_product = adjustment._get_location_quant_rows(lines.product_id.ids)
             ### Look for quant in the entire company in customer, internal or transit locations. Here current qty of quant will be zero
-            lots = self.env['stock.lot'].search([
-                ('product_id', '=', product.id),
-                ('company_id', '=', self.company_id.id)
-            ])
-            quants = lots.quant_ids.filtered(lambda q: q.location_id.usage in ['customer', 'internal', 'transit'])
-            quants = quants and quants[0] or False
-            quant_found_in_location = False
-            if not quants:
-                raise ValidationError(_(
-                    f"You cannot validate this stock operation because there are no quants available for the product "
-                    f"'{product.display_name}'. "))
-
-        if not quant_found_in_location:
-            lot_details_lst.append((0, 0, {
-                'lot_id': quants[0].lot_id.id,
-                'new_qty': new_scanned_qty,
-                'current_qty': 0,
-            }))
-
-        else:
-            positive_quants = quants.filtered(lambda q: q.quantity > 0).sorted(lambda x: x.in_date)
-            negative_quants = quants.filtered(lambda q: q.quantity < 0).sorted(lambda x: x.in_date)
-            applied_quants = self.env['stock.quant']
-
-            all_negative_quants = negative_quants and not positive_quants
-
-            index = 1
-            for quant in negative_quants:
-                ### Mark all -ve quants 0
-                ### Assign new_qty to first quant if all_negative_quants
-                new_qty = new_scanned_qty if all_negative_quants and index == 1 else 0
-                lot_details_lst.append((0, 0, {
-                    'lot_id': quant.lot_id.id,
-                    'new_qty': new_qty,
-                    'current_qty': quant.quantity,
-                }))
-                applied_quants |= quant
-                index += 1
-
-            if positive_quants:
-                difference = new_scanned_qty - sum(positive_quants.mapped('quantity'))
-                if difference > 0:
-                    ### Apply on the first
-                    first_positive_quant = positive_quants[0]
-                    lot_details_lst.append((0, 0, {
-                        'lot_id': first_positive_quant.lot_id.id,
-                        'new_qty': first_positive_quant.quantity + difference,
-                        'current_qty': first_positive_quant.quantity,
-                    }))
-                    applied_quants |= first_positive_quant
-
-                else:
-                    ### Keep applying from the first until difference is 0
-                    quant_index = 0
-                    taken_quantity = abs(difference)
-                    while (int(taken_quantity) > 0):
-                        quant = positive_quants[quant_index]
-                        lot_details_lst.append((0, 0, {
-                            'lot_id': quant.lot_id.id,
-                            'new_qty': max(0, quant.quantity - taken_quantity),
-                            'current_qty': quant.quantity,
-                        }))
-                        taken_quantity -= float_round(quant.quantity, precision_digits=precision)
-                        applied_quants |= quant
-                        quant_index += 1
-
-            pending_quants = quants - applied_quants
-            for quant in pending_quants:
-                lot_details_lst.append((0, 0, {
-                    'lot_id': quant.lot_id.id,
-                    'new_qty': quant.quantity,
-                    'current_qty': quant.quantity,
-                }))
-
-            # for index, quant in enumerate(quants.sorted(key=lambda q: q.quantity), start=1):
-            #     lot_details_lst.append((0, 0, {
-            #         'lot_id': quant.lot_id.id,
-            #         'new_qty': difference_qty if index == 1 else 0,
-            #         'current_qty': quant_found_in_location and quant.quantity or 0.0,
-            #     }))
-
-        self.write({'adjustment_line_lot_ids': lot_details_lst})
+            fallback_lot_by_product = lines.filtered(
+                lambda l: l.product_id.id not in quant_rows_by_product)._get_fallback_lot_ids()
+
+            for line in lines:
+                quant_rows = quant_rows_by_product.get(line.product_id.id, [])
+                difference = line.total_scanned_qty - sum(quant_row[2] for quant_row in quant_rows if quant_row[2] > 0)
+                lot_vals = line._prepare_lot_lines_difference(
+                    difference, quant_rows, fallback_lot_by_product.get((line.company_id.id, line.product_id.id)))
+                if lot_vals is False:
+                    raise ValidationError(_(
+                        f"You cannot validate this stock operation because there are no quants available for the product "
+                        f"'{line.product_id.display_name}'. "))
+                lot_line_ids_to_unlink += line.adjustment_line_lot_ids.ids
+                lot_line_vals_list += [dict(vals, inv_adjustment_line_id=line.id) for vals in lot_vals]
+
+        lot_line_obj = self.env['stock.adjustment.barcode.lot.line']
+        lot_line_obj.browse(lot_line_ids_to_unlink).unlink()
+        lot_line_obj.create(lot_line_vals_list)
 
     def set_lot_on_adjustment_line_ids_difference(self, difference, quants):
         """
         Set the lot details for the adjustment lines based on stock availability and quantity.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
-        product = self.product_id
-        new_scanned_qty = self.total_scanned_qty
-        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
-        lot_details_lst = [(2, line_details.id) for line_details in self.adjustment_line_lot_ids]
-        quant_found_in_location = True
-        if not quants:
-            ### Look for quant in the entire company in customer, internal or transit locations. Here current qty of quant will be zero
-            lots = self.env['stock.lot'].search([
-                ('product_id', '=', product.id),
-                ('company_id', '=', self.company_id.id)
-            ])
-            quants = lots.quant_ids.filtered(lambda q: q.location_id.usage in ['customer', 'internal', 'transit'])
-            quants = quants and quants[0] or False
-            quant_found_in_location = False
-            if not quants:
-                return False
+        quant_rows = [(quant.id, quant.lot_id.id, quant.quantity, quant.in_date) for quant in quants or []]
+        fallback_lot_id = None
+        if not quant_rows:
+            fallback_lot_id = self._get_fallback_lot_ids().get((self.company_id.id, self.product_id.id))
 
-        if not quant_found_in_location:
-            lot_details_lst.append((0, 0, {
-                'lot_id': quants[0].lot_id.id,
-                'new_qty': new_scanned_qty,
-                'current_qty': 0,
-            }))
-
-        else:
-            positive_quants = quants.filtered(lambda q: q.quantity > 0).sorted(lambda x: x.in_date)
-            negative_quants = quants.filtered(lambda q: q.quantity < 0).sorted(lambda x: x.in_date)
-            applied_quants = self.env['stock.quant']
-
-            all_negative_quants = negative_quants and not positive_quants
-
-            index = 1
-            for quant in negative_quants:
-                ### Mark all -ve quants 0
-                ### Assign new_qty to first quant if all_negative_quants
-                new_qty = new_scanned_qty if all_negative_quants and index == 1 else 0
-                lot_details_lst.append((0, 0, {
-                    'lot_id': quant.lot_id.id,
-                    'new_qty': new_qty,
-                    'current_qty': quant.quantity,
-                }))
-                applied_quants |= quant
-                index += 1
-
-            if positive_quants:
-                # difference = new_scanned_qty - sum(positive_quants.mapped('quantity'))
-                if difference > 0:
-                    ### Apply on the first
-                    first_positive_quant = positive_quants[0]
-                    lot_details_lst.append((0, 0, {
-                        'lot_id': first_positive_quant.lot_id.id,
-                        'new_qty': first_positive_quant.quantity + difference,
-                        'current_qty': first_positive_quant.quantity,
-                    }))
-                    applied_quants |= first_positive_quant
-
-                else:
-                    ### Keep applying from the first until difference is 0
-                    quant_index = 0
-                    taken_quantity = abs(difference)
-                    while (int(taken_quantity) > 0):
-                        quant = positive_quants[quant_index]
-                        lot_details_lst.append((0, 0, {
-                            'lot_id': quant.lot_id.id,
-                            'new_qty': max(0, quant.quantity - taken_quantity),
-                            'current_qty': quant.quantity,
-                        }))
-                        taken_quantity -= float_round(quant.quantity, precision_digits=precision)
-                        applied_quants |= quant
-                        quant_index += 1
-
-            pending_quants = quants - applied_quants
-            for quant in pending_quants:
-                lot_details_lst.append((0, 0, {
-                    'lot_id': quant.lot_id.id,
-                    'new_qty': quant.quantity,
-                    'current_qty': quant.quantity,
-                }))
-
-            # for index, quant in enumerate(quants.sorted(key=lambda q: q.quantity), start=1):
-            #     lot_details_lst.append((0, 0, {
-            #         'lot_id': quant.lot_id.id,
-            #         'new_qty': difference_qty if index == 1 else 0,
-            #         'current_qty': quant_found_in_location and quant.quantity or 0.0,
-            #     }))
+        lot_vals = self._prepare_lot_lines_difference(difference, quant_rows, fallback_lot_id)
+        if lot_vals is False:
+            return False
 
+        lot_details_lst = [(2, line_details.id) for line_details in self.adjustment_line_lot_ids]
+        lot_details_lst += [(0, 0, vals) for vals in lot_vals]
         self.write({'adjustment_line_lot_ids': lot_details_lst})
         return True
 
+    def _prepare_lot_lines_difference(self, difference, quant_rows, fallback_lot_id=None):
+        """
+        Distributes the difference of the line over its quants and returns the values of the lot lines.
+        Works on plain rows so that many lines can be prepared in memory.
+
+        Args:
+            difference: Quantity to add (positive) or remove (negative) on the positive quants
+            quant_rows: List of (quant_id, lot_id, quantity, in_date) in gather order
+            fallback_lot_id: Lot used with a current quantity of zero when there is no quant in the location
+        Returns:
+            List of lot line values, or False when there is neither a quant nor a fallback lot
+        """
+        self.ensure_one()
+        if not quant_rows:
+            if not fallback_lot_id:
+                return False
+            return [{
+                'lot_id': fallback_lot_id,
+                'new_qty': self.total_scanned_qty,
+                'current_qty': 0,
+            }]
+
+        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+        return [
+            allocation._asdict()
+            for allocation in allocate_lots(quant_rows, self.total_scanned_qty, difference, precision_digits=precision)
+        ]
+
+    def _get_fallback_lot_ids(self):
+        """
+        Returns, for the products of the lines, the first lot of the company having a quant in a customer,
+        internal or transit location, as {(company_id, product_id): lot_id}, read in one query.
+        """
+        product_ids = list(set(self.product_id.ids))
+        company_ids = list(set(self.company_id.ids))
+        if not product_ids or not company_ids:
+            return {}
+
+        self.env['stock.quant'].flush_model(['lot_id', 'location_id'])
+        self.env['stock.lot'].flush_model(['name', 'product_id', 'company_id'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (lot.company_id, lot.product_id)
+                lot.company_id,
+                lot.product_id,
+                lot.id
+            FROM
+                stock_lot AS lot
+                    INNER JOIN stock_quant AS sq
+                        ON sq.lot_id = lot.id
+                    INNER JOIN stock_location AS sl
+                        ON sl.id = sq.location_id
+            WHERE
+                lot.product_id = ANY(%s)
+                AND lot.company_id = ANY(%s)
+                AND sl.usage IN ('customer', 'internal', 'transit')
+            ORDER BY
+                lot.company_id, lot.product_id, lot.name, lot.id, sq.id
+        """, [product_ids, company_ids])
+        return {(company_id, product_id): lot_id for company_id, product_id, lot_id in self.env.cr.fetchall()}
+
     # def set_lot_on_adjustment_line_ids_old(self):
     #     """
     #     Set the lot details for the adjustment lines based on stock availability and quantity.
@@ -640,6 +782,36 @@ class StockAdjustmentBarcodeLine(models.Model):
 
     #     self.write({'adjustment_line_lot_ids': lot_details_lst})
 
+    def _bulk_update_column(self, fname, value_by_id):
+        """
+        Writes a different value of a stored column on many lines with a single UPDATE statement,
+        then notifies the ORM so that the depending computed fields are recomputed.
+
+        Args:
+            fname: Name of the stored field to update
+            value_by_id: Dictionary line id -> new value
+        """
+        if not value_by_id:
+            return
+        field = self._fields[fname]
+        records = self.browse(list(value_by_id))
+        records.flush_recordset([fname])
+        values = list(value_by_id.values())
+        if field.type == 'many2one':
+            values = [value or None for value in values]
+        self.env.cr.execute(f"""
+            UPDATE
+                {self._table} AS line
+            SET
+                "{fname}" = new_values.value
+            FROM
+                unnest(%s::int[], %s::{field.column_type[1]}[]) AS new_values(id, value)
+            WHERE
+                line.id = new_values.id
+        """, [list(value_by_id), values])
+        records.invalidate_recordset([fname])
+        records.modified([fname])
+
     def unlink(self):
         """
         Unlink the stock adjustment barcode line after checking state restrictions.
@@ -145,52 +145,80 @@ class StockAdjustmentBarcodeLineInfo(models.Model):
             records_without_line.create_adjustment_lines()
         if not result.scanned_user_id:
             result.scanned_user_id = self.env.user.id
+        result._refresh_scanned_totals()
         return result
 
+    def write(self, vals):
+        """
+        Refreshes the scanned totals of the lines, the former ones included, when the counted quantity of the rows
+        changes.
+        """
+        refresh = bool({'scanned_qty', 'product_uom_id', 'inv_adjustment_line_id'} & set(vals))
+        former_lines = self.inv_adjustment_line_id if refresh else None
+        res = super().write(vals)
+        if refresh and not self.env.context.get('skip_scanned_totals_refresh'):
+            self._refresh_scanned_totals(former_lines)
+        return res
+
+    def _refresh_scanned_totals(self, lines=None):
+        """
+        Drops the scanned totals of the lines from the cache, they are summed again from the rows when read,
+        and stores the difference of the lines of the rows and of the given lines.
+        """
+        line_obj = self.env['stock.adjustment.barcode.line']
+        line_obj.invalidate_model(['total_scanned_qty'])
+        (self.inv_adjustment_line_id | (lines or line_obj))._refresh_difference_qty()
+
+    def _increment_scanned_qty(self, qty_by_id):
+        """
+        Adds the given quantities to the counted quantity of the rows in a single UPDATE statement.
+        The increment is applied on the stored value so concurrent increments are not lost.
+        """
+        if not qty_by_id:
+            return
+        self.flush_model(['scanned_qty'])
+        self.env.cr.execute("""
+            UPDATE
+                stock_adjustment_barcode_line_info AS info
+            SET
+                scanned_qty = info.scanned_qty + increment.qty,
+                write_uid = %s,
+                write_date = (now() at time zone 'UTC')
+            FROM
+                unnest(%s::int[], %s::float8[]) AS increment(id, qty)
+            WHERE
+                info.id = increment.id
+        """, [self.env.uid, list(qty_by_id), list(qty_by_id.values())])
+        records = self.browse(list(qty_by_id))
+        records.invalidate_recordset(['scanned_qty', 'write_uid', 'write_date'])
+        records.modified(['scanned_qty'])
+        records._refresh_scanned_totals()
+
     def create_adjustment_lines(self):
         """
         Creates stock adjustment lines for products with or without a lot number.
+        The lines are looked up or inserted at once with INSERT ... ON CONFLICT, so that several counters
+        scanning the same product do not conflict on the unique constraint of the lines.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
-        line_lst = list()
-        inv_adjustment_id = self.inv_adjustment_id.id
-        lot_adjustment_lines = self.filtered(lambda l: l.lot_id)
-        without_lot_lines = self - lot_adjustment_lines
         adjustment_line_obj = self.env['stock.adjustment.barcode.line']
 
-        for lot, record_ids in groupby(lot_adjustment_lines, key=lambda l: l.lot_id):
-            existing_line = adjustment_line_obj.search([
-                ('product_id', '=', lot.product_id.id), ('inv_adjustment_id', '=', inv_adjustment_id),
-                ('lot_id', '=', lot.id)])
-            if existing_line:
-                existing_line.write({'adjustment_line_info_ids': [(4, r.id) for r in record_ids]})
-            else:
-                line_lst.append({
-                    'lot_id': lot.id,
-                    'product_id': lot.product_id.id,
-                    'inv_adjustment_id': inv_adjustment_id,
-                    'adjustment_line_info_ids': [(4, r.id) for r in record_ids],
-                })
-
-        for product, record_ids in groupby(without_lot_lines, key=lambda l: l.product_id):
-            existing_line = adjustment_line_obj.search([
-                ('product_id', '=', product.id), ('inv_adjustment_id', '=', inv_adjustment_id), ('lot_id', '=', False)])
-            if existing_line:
-                existing_line.write({'adjustment_line_info_ids': [(4, r.id) for r in record_ids]})
-            else:
-                line_lst.append({
-                    'product_id': product.id,
-                    'inv_adjustment_id': inv_adjustment_id,
-                    'adjustment_line_info_ids': [(4, r.id) for r in record_ids],
-                })
-
-        self.env['stock.adjustment.barcode.line'].create(line_lst)
+        # The totals are refreshed once by the caller, not for each line
+        records_to_link = self.with_context(skip_scanned_totals_refresh=True)
+        for adjustment, records in groupby(self, key=lambda l: l.inv_adjustment_id):
+            line_by_key = adjustment_line_obj._get_or_create_line_ids(
+                adjustment, [(record.product_id.id, record.lot_id.id) for record in records])
+            for line_id, line_records in groupby(records, key=lambda r: line_by_key[(r.product_id.id, r.lot_id.id or False)]):
+                records_to_link.browse([record.id for record in line_records]).write({'inv_adjustment_line_id': line_id})
 
     def unlink(self):
         """
         Unlinks the record and adjusts related adjustment lines if necessary.
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
+        lines = self.inv_adjustment_line_id
         if len(self.inv_adjustment_line_id.adjustment_line_info_ids) == 1:
             self.inv_adjustment_line_id.sudo().unlink()
-        return super().unlink()
+        res = super().unlink()
+        self.browse()._refresh_scanned_totals(lines)
+        return res
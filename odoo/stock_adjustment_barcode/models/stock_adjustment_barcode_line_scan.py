@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models, tools
+
+
+class StockAdjustmentBarcodeLineScan(models.Model):
+    _name = 'stock.adjustment.barcode.line.scan'
+    _description = 'Stock Adjustment Barcode Line Scans'
+    _auto = False
+    _order = 'inv_adjustment_line_id, source_line_id, user_id'
+
+    inv_adjustment_line_id = fields.Many2one(
+        comodel_name='stock.adjustment.barcode.line',
+        readonly=True
+    )
+
+    inv_adjustment_id = fields.Many2one(
+        comodel_name='stock.adjustment.barcode',
+        readonly=True
+    )
+
+    source_line_id = fields.Many2one(
+        comodel_name='stock.adjustment.barcode.line',
+        string='Scanned Line',
+        readonly=True,
+        help='Line the scans were made on, a child line for the scans shown on a parent line'
+    )
+
+    product_id = fields.Many2one(
+        comodel_name='product.product',
+        readonly=True
+    )
+
+    lot_id = fields.Many2one(
+        comodel_name='stock.lot',
+        string='Lot/Serial Number',
+        readonly=True
+    )
+
+    user_id = fields.Many2one(
+        comodel_name='res.users',
+        string='Scanned By',
+        readonly=True
+    )
+
+    scanned_qty = fields.Float(
+        string='Counted Quantity',
+        readonly=True,
+        digits='Product Unit of Measure'
+    )
+
+    scanned_row_count = fields.Integer(
+        string='Scanned Rows',
+        readonly=True
+    )
+
+    first_scan_date = fields.Datetime(
+        readonly=True
+    )
+
+    last_scan_date = fields.Datetime(
+        readonly=True
+    )
+
+    def init(self):
+        """
+        Scans of each line per user, summed from the scanned rows in the UoM of the product. A parent line gets
+        the scans of its child lines through a join, rows of another product than their line are left out.
+        The id is derived from the first row of the group, doubled to tell the parent rows from the child ones.
+        """
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT
+                    MIN(info.id) * 2 + CASE WHEN line.id = source.id THEN 0 ELSE 1 END AS id,
+                    line.id AS inv_adjustment_line_id,
+                    line.inv_adjustment_id,
+                    source.id AS source_line_id,
+                    info.product_id,
+                    info.lot_id,
+                    info.scanned_user_id AS user_id,
+                    SUM(info.scanned_qty / COALESCE(info_uom.factor, 1) * COALESCE(product_uom.factor, 1)) AS scanned_qty,
+                    COUNT(*) AS scanned_row_count,
+                    MIN(info.create_date) AS first_scan_date,
+                    MAX(COALESCE(info.write_date, info.create_date)) AS last_scan_date
+                FROM
+                    stock_adjustment_barcode_line AS line
+                        INNER JOIN stock_adjustment_barcode_line AS source
+                            ON source.id = line.id
+                            OR (
+                                line.is_parent_line
+                                AND source.inv_adjustment_id = line.inv_adjustment_id
+                                AND source.parent_product_id = line.product_id
+                                AND source.id != line.id
+                            )
+                        INNER JOIN stock_adjustment_barcode_line_info AS info
+                            ON info.inv_adjustment_line_id = source.id
+                            AND info.product_id = source.product_id
+                        INNER JOIN product_product AS pp
+                            ON pp.id = info.product_id
+                        INNER JOIN product_template AS pt
+                            ON pt.id = pp.product_tmpl_id
+                        LEFT JOIN uom_uom AS info_uom
+                            ON info_uom.id = info.product_uom_id
+                        LEFT JOIN uom_uom AS product_uom
+                            ON product_uom.id = pt.uom_id
+                WHERE
+                    info.scanned_qty != 0
+                GROUP BY
+                    line.id, line.inv_adjustment_id, source.id, info.product_id, info.lot_id, info.scanned_user_id
+            )
+        """)
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from markupsafe import Markup
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+
+_logger = logging.getLogger(__name__)
+
+
+class StockAdjustmentBarcodePlan(models.Model):
+    _name = 'stock.adjustment.barcode.plan'
+    _description = 'Stock Adjustment Barcode Cycle Count Plan'
+    _inherit = ['mail.thread']
+    _order = 'inventory_date desc, id desc'
+
+    name = fields.Char(
+        required=True,
+        tracking=True,
+        default=lambda self: _('Cycle Count %s', fields.Date.to_string(fields.Date.today()))
+    )
+
+    location_id = fields.Many2one(
+        comodel_name='stock.location',
+        required=True,
+        domain="[('usage', '=', 'internal')]",
+        tracking=True
+    )
+
+    company_id = fields.Many2one(
+        comodel_name='res.company',
+        required=True,
+        default=lambda self: self.env.company
+    )
+
+    inventory_date = fields.Datetime(
+        default=lambda self: fields.Datetime.now(),
+        required=True
+    )
+
+    split_by = fields.Selection([
+        ('category', 'Product Category'),
+        ('abc', 'ABC Class'),
+        ('bin', 'Bin')
+    ], default='category', required=True, tracking=True,
+        help='Product Category: one count per category of the products in stock.\n'
+             'ABC Class: one count per class of the products in stock, ranked by stock value.\n'
+             'Bin: one count per internal location holding stock under the location.')
+
+    abc_a_percent = fields.Float(
+        string='Class A (%)',
+        default=80.0,
+        help='Products making up this share of the stock value of the location are in class A'
+    )
+
+    abc_b_percent = fields.Float(
+        string='Class A+B (%)',
+        default=95.0,
+        help='Products making up this share of the stock value of the location are in class A or B, the others in C'
+    )
+
+    adjustment_ids = fields.One2many(
+        comodel_name='stock.adjustment.barcode',
+        inverse_name='plan_id',
+        string='Sub-Counts'
+    )
+
+    adjustment_count = fields.Integer(
+        compute='_compute_adjustment_stats'
+    )
+
+    done_count = fields.Integer(
+        compute='_compute_adjustment_stats'
+    )
+
+    progress = fields.Float(
+        compute='_compute_adjustment_stats'
+    )
+
+    valuation_difference = fields.Monetary(
+        compute='_compute_adjustment_stats',
+        currency_field='currency_id'
+    )
+
+    currency_id = fields.Many2one('res.currency', 'Currency', related='company_id.currency_id', readonly=True)
+
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('in_progress', 'In Progress'),
+        ('done', 'Done')
+    ], compute='_compute_state', store=True)
+
+    _sql_constraints = [
+        ('abc_percent_check', 'CHECK(abc_a_percent > 0 AND abc_a_percent <= abc_b_percent AND abc_b_percent <= 100)',
+         'The class A share must be positive and not greater than the class A+B share, itself at most 100%.'),
+    ]
+
+    @api.depends('adjustment_ids.state')
+    def _compute_state(self):
+        for plan in self:
+            states = set(plan.adjustment_ids.mapped('state'))
+            if not states:
+                plan.state = 'draft'
+            elif states <= {'done', 'cancel'}:
+                plan.state = 'done'
+            else:
+                plan.state = 'in_progress'
+
+    def _compute_adjustment_stats(self):
+        """
+        Aggregates the sub-counts of the plans: their number, the share already done and the total valuation
+        difference of their lines, read with one query per figure.
+        """
+        adjustment_obj = self.env['stock.adjustment.barcode']
+        counts = {}
+        for group in adjustment_obj.read_group([('plan_id', 'in', self.ids)], ['plan_id', 'state'],
+                                               ['plan_id', 'state'], lazy=False):
+            plan_id = group['plan_id'][0]
+            total, done = counts.get(plan_id, (0, 0))
+            counts[plan_id] = (total + group['__count'], done + (group['__count'] if group['state'] == 'done' else 0))
+
+        differences = {}
+        if self.ids:
+            self.env['stock.adjustment.barcode.line'].flush_model(['inv_adjustment_id', 'difference_qty', 'unit_price'])
+            adjustment_obj.flush_model(['plan_id', 'state'])
+            self.env.cr.execute("""
+                SELECT
+                    sab.plan_id,
+                    SUM(line.difference_qty * line.unit_price)
+                FROM
+                    stock_adjustment_barcode_line AS line
+                        INNER JOIN stock_adjustment_barcode AS sab
+                            ON sab.id = line.inv_adjustment_id
+                WHERE
+                    sab.plan_id = ANY(%s)
+                    AND sab.state != 'cancel'
+                GROUP BY
+                    sab.plan_id
+            """, [self.ids])
+            differences = dict(self.env.cr.fetchall())
+
+        for plan in self:
+            total, done = counts.get(plan.id, (0, 0))
+            plan.adjustment_count = total
+            plan.done_count = done
+            plan.progress = total and 100.0 * done / total or 0.0
+            plan.valuation_difference = differences.get(plan.id) or 0.0
+
+    def action_generate_adjustments(self):
+        """
+        Splits the location of the plan into sub-counts, one stock adjustment per shard. Each sub-count is
+        scanned, confirmed and posted on its own, only the products of its shard can be counted in it.
+        """
+        self.ensure_one()
+        if self.adjustment_ids:
+            raise UserError(_("The sub-counts of this plan are already generated."))
+
+        shards = self._get_shards()
+        if not shards:
+            raise UserError(_("There is no stock to count in %s.", self.location_id.display_name))
+
+        self.env['stock.adjustment.barcode'].create([dict(shard_vals, **{
+            'name': '%s - %s' % (self.name, label),
+            'plan_id': self.id,
+            'company_id': self.company_id.id,
+            'inventory_date': self.inventory_date,
+            'location_id': shard_vals.get('location_id', self.location_id.id),
+        }) for label, shard_vals in shards])
+        self.message_post(body=_("%s sub-counts generated by %s.",
+                                 len(shards), dict(self._fields['split_by']._description_selection(self.env))[self.split_by]))
+
+    def _get_shards(self):
+        """
+        Returns the shards of the plan as a list of (label, adjustment vals).
+        """
+        self.ensure_one()
+        if self.split_by == 'bin':
+            return self._get_bin_shards()
+
+        qty_by_product = {}
+        for quant_row in self.env['stock.quant']._read_adjustment_quant_rows(self.location_id, company_id=self.company_id.id):
+            qty_by_product[quant_row.product_id] = qty_by_product.get(quant_row.product_id, 0.0) + quant_row.qty
+        products = self.env['product.product'].with_context(active_test=False).browse(list(qty_by_product))
+
+        if self.split_by == 'category':
+            return [(categ.display_name, {'scope_categ_ids': [(6, 0, categ.ids)]})
+                    for categ in products.categ_id.sorted('complete_name')]
+
+        classes = self._get_abc_classes(products, qty_by_product)
+        return [(_('Class %s', abc_class), {'scope_product_ids': [(6, 0, classes[abc_class])]})
+                for abc_class in ('A', 'B', 'C') if classes[abc_class]]
+
+    def _get_bin_shards(self):
+        """
+        One shard per internal location under the location of the plan, the location included, holding stock.
+        """
+        self.env['stock.quant'].flush_model(['location_id', 'company_id', 'quantity'])
+        self.env['stock.location'].flush_model(['parent_path', 'usage'])
+        self.env.cr.execute("""
+            SELECT DISTINCT
+                sq.location_id
+            FROM
+                stock_quant AS sq
+                    INNER JOIN stock_location AS sl
+                        ON sl.id = sq.location_id
+            WHERE
+                sl.parent_path LIKE %s
+                AND sl.usage = 'internal'
+                AND sq.company_id = %s
+                AND sq.quantity != 0
+        """, [f'{self.location_id.parent_path}%', self.company_id.id])
+        locations = self.env['stock.location'].browse([location_id for location_id, in self.env.cr.fetchall()])
+        return [(location.name, {'location_id': location.id}) for location in locations.sorted('complete_name')]
+
+    def _get_abc_classes(self, products, qty_by_product):
+        """
+        Ranks the products by stock value and returns {'A': product ids, 'B': product ids, 'C': product ids},
+        the A and B classes covering the configured shares of the total value.
+        """
+        products = products.with_company(self.company_id)
+        value_by_product = {product.id: max(qty_by_product[product.id], 0.0) * product.standard_price for product in products}
+        total_value = sum(value_by_product.values())
+        classes = {'A': [], 'B': [], 'C': []}
+        cumulated_value = 0.0
+        for product_id in sorted(value_by_product, key=lambda p: (-value_by_product[p], p)):
+            share = total_value and 100.0 * cumulated_value / total_value or 100.0
+            if share < self.abc_a_percent:
+                classes['A'].append(product_id)
+            elif share < self.abc_b_percent:
+                classes['B'].append(product_id)
+            else:
+                classes['C'].append(product_id)
+            cumulated_value += value_by_product[product_id]
+        return classes
+
+    def action_confirm_adjustments(self):
+        """
+        Confirms the scanned draft sub-counts, each one in its own savepoint so that a failing sub-count
+        does not prevent the others from moving on.
+        """
+        self.ensure_one()
+        errors = []
+        for adjustment in self.adjustment_ids.filtered(lambda a: a.state == 'draft' and a.inv_adjustment_line_ids):
+            try:
+                with self.env.cr.savepoint():
+                    adjustment.action_confirm()
+            except (UserError, ValidationError) as e:
+                errors.append('%s: %s' % (adjustment.name, e.args[0]))
+        if errors:
+            self.message_post(body=Markup('<br/>').join([_("Some sub-counts could not be confirmed:")] + errors))
+
+    def action_post_adjustments(self):
+        """
+        Queues the approved sub-counts for the background posting, each one is posted in its own transactions.
+        """
+        self.ensure_one()
+        adjustments = self.adjustment_ids.filtered(lambda a: a.state == 'approved')
+        if not adjustments:
+            raise UserError(_("There is no approved sub-count to post."))
+        for adjustment in adjustments:
+            adjustment.action_post_in_background()
+
+    def action_view_adjustments(self):
+        self.ensure_one()
+        action = self.env.ref('stock_adjustment_barcode.stock_adjustment_barcode_action').sudo().read()[0]
+        action['domain'] = [('plan_id', '=', self.id)]
+        action['context'] = {'default_plan_id': self.id}
+        return action
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, fields, models
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+
+class StockAdjustmentBarcodeQuantSnapshot(models.Model):
+    _name = 'stock.adjustment.barcode.quant.snapshot'
+    _description = 'Stock Adjustment Barcode Quant Snapshot'
+    _order = 'snapshot_date desc, location_id, product_id, lot_id'
+    _log_access = False
+
+    snapshot_date = fields.Datetime(
+        required=True,
+        readonly=True
+    )
+
+    location_id = fields.Many2one(
+        comodel_name='stock.location',
+        required=True,
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    product_id = fields.Many2one(
+        comodel_name='product.product',
+        required=True,
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    lot_id = fields.Many2one(
+        comodel_name='stock.lot',
+        string='Lot/Serial Number',
+        readonly=True,
+        ondelete='cascade'
+    )
+
+    company_id = fields.Many2one(
+        comodel_name='res.company',
+        readonly=True
+    )
+
+    quantity = fields.Float(
+        readonly=True,
+        digits='Product Unit of Measure'
+    )
+
+    def init(self):
+        create_index(self._cr, 'stock_adjustment_barcode_quant_snapshot_location_date_index',
+                     self._table, ['location_id', 'snapshot_date', 'product_id'])
+
+    @api.model
+    def _cron_take_snapshot(self):
+        """
+        Copies the quantities of the internal locations, one row per location/product/lot, once a day.
+        The snapshots older than the retention period are removed.
+        """
+        self.flush_model(['snapshot_date'])
+        self.env.cr.execute("""
+            SELECT 1 FROM stock_adjustment_barcode_quant_snapshot
+            WHERE snapshot_date >= date_trunc('day', NOW() AT TIME ZONE 'UTC')
+            LIMIT 1
+        """)
+        if not self.env.cr.fetchone():
+            self._take_snapshot()
+
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'stock_adjustment_barcode.quant_snapshot_retention_days', 400))
+        self.env.cr.execute("""
+            DELETE FROM stock_adjustment_barcode_quant_snapshot
+            WHERE snapshot_date < (NOW() AT TIME ZONE 'UTC') - make_interval(days => %s)
+        """, [retention_days])
+        if self.env.cr.rowcount:
+            _logger.info("Removed %s quant snapshot rows older than %s days", self.env.cr.rowcount, retention_days)
+        self.invalidate_model()
+
+    @api.model
+    def _take_snapshot(self):
+        """
+        Inserts the current quantities of the internal locations with the current date and returns that date.
+        """
+        snapshot_date = fields.Datetime.now()
+        self.env['stock.quant'].flush_model(['product_id', 'location_id', 'lot_id', 'company_id', 'quantity'])
+        self.env['stock.location'].flush_model(['usage'])
+        self.env.cr.execute("""
+            INSERT INTO stock_adjustment_barcode_quant_snapshot (
+                snapshot_date, location_id, product_id, lot_id, company_id, quantity
+            )
+            SELECT
+                %s,
+                sq.location_id,
+                sq.product_id,
+                sq.lot_id,
+                sq.company_id,
+                SUM(sq.quantity)
+            FROM
+                stock_quant AS sq
+                    INNER JOIN stock_location AS sl
+                        ON sl.id = sq.location_id
+            WHERE
+                sl.usage = 'internal'
+            GROUP BY
+                sq.location_id, sq.product_id, sq.lot_id, sq.company_id
+            HAVING
+                SUM(sq.quantity) != 0
+        """, [snapshot_date])
+        _logger.info("Quant snapshot of %s: %s rows", snapshot_date, self.env.cr.rowcount)
+        self.invalidate_model()
+        return snapshot_date
+
+    @api.model
+    def _get_nearest_snapshot_date(self, location, at_date):
+        """
+        Returns the date of the snapshot of the location closest to at_date, None if there is none.
+        """
+        self.flush_model(['location_id', 'snapshot_date'])
+        self.env.cr.execute("""
+            SELECT snapshot_date
+            FROM (
+                (SELECT snapshot_date FROM stock_adjustment_barcode_quant_snapshot
+                 WHERE location_id = %(location_id)s AND snapshot_date <= %(at_date)s
+                 ORDER BY snapshot_date DESC LIMIT 1)
+                UNION ALL
+                (SELECT snapshot_date FROM stock_adjustment_barcode_quant_snapshot
+                 WHERE location_id = %(location_id)s AND snapshot_date > %(at_date)s
+                 ORDER BY snapshot_date LIMIT 1)
+            ) AS snapshot
+            ORDER BY ABS(EXTRACT(EPOCH FROM snapshot_date - %(at_date)s))
+            LIMIT 1
+        """, {'location_id': location.id, 'at_date': at_date})
+        row = self.env.cr.fetchone()
+        return row and row[0]
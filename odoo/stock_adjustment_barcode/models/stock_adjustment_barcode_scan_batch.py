@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+import psycopg2
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+
+_logger = logging.getLogger(__name__)
+
+
+class StockAdjustmentBarcodeScanBatch(models.Model):
+    _name = 'stock.adjustment.barcode.scan.batch'
+    _description = 'Stock Adjustment Barcode Scan Batch'
+    _order = 'inv_adjustment_id, device_id, sequence, id'
+
+    inv_adjustment_id = fields.Many2one(
+        comodel_name='stock.adjustment.barcode',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    client_batch_id = fields.Char(
+        string='Client Batch ID',
+        required=True,
+        help='Identifier generated by the device for the batch, a batch sent again with the same identifier is ignored'
+    )
+
+    device_id = fields.Char(
+        string='Device'
+    )
+
+    sequence = fields.Integer(
+        help='Order of the batch on its device, batches are replayed in this order'
+    )
+
+    user_id = fields.Many2one(
+        comodel_name='res.users',
+        string='Synchronized By',
+        default=lambda self: self.env.user
+    )
+
+    scans = fields.Json(
+        help='Scans buffered by the device, see stock.adjustment.barcode.ingest_scans for their format'
+    )
+
+    scan_count = fields.Integer()
+
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Replayed'),
+        ('error', 'Error')
+    ], default='pending', required=True)
+
+    result = fields.Json(
+        copy=False
+    )
+
+    error = fields.Text(
+        copy=False
+    )
+
+    replayed_date = fields.Datetime(
+        copy=False
+    )
+
+    _sql_constraints = [(
+        'unique_client_batch',
+        'UNIQUE(inv_adjustment_id, client_batch_id)',
+        'A scan batch can only be synchronized once per adjustment.')]
+
+    @api.model
+    def submit_batches(self, adjustment, batches):
+        """
+        Journals the scan batches buffered by a device and replays them into the adjustment, in order.
+        Batches already replayed are skipped, so a device can safely send them again after a lost answer.
+
+        Args:
+            adjustment: stock.adjustment.barcode record
+            batches: List of dict with the keys client_batch_id, scans, device_id (optional) and sequence (optional)
+        Returns:
+            List of dict with the keys client_batch_id, status ('done', 'duplicate' or 'error') and result or error
+        """
+        if any(not batch.get('client_batch_id') for batch in batches):
+            raise ValidationError(_("Every scan batch needs a client batch ID."))
+
+        existing_batches = {
+            batch.client_batch_id: batch
+            for batch in self.search([
+                ('inv_adjustment_id', '=', adjustment.id),
+                ('client_batch_id', 'in', [batch['client_batch_id'] for batch in batches]),
+            ])
+        }
+
+        to_replay = self.browse()
+        statuses = {}
+        for batch_vals in batches:
+            client_batch_id = batch_vals['client_batch_id']
+            batch = existing_batches.get(client_batch_id)
+            if batch and batch.state == 'done':
+                statuses[client_batch_id] = {'status': 'duplicate', 'result': batch.result}
+                continue
+            if not batch:
+                batch = self._journal_batch(adjustment, batch_vals)
+                if not batch:
+                    # Journaled at the same time by a concurrent request
+                    statuses[client_batch_id] = {'status': 'duplicate', 'result': False}
+                    continue
+                existing_batches[client_batch_id] = batch
+            to_replay |= batch
+
+        for batch in to_replay.sorted(lambda b: (b.device_id or '', b.sequence, b.id)):
+            batch._replay()
+            if batch.state == 'done':
+                statuses[batch.client_batch_id] = {'status': 'done', 'result': batch.result}
+            else:
+                statuses[batch.client_batch_id] = {'status': 'error', 'error': batch.error}
+
+        return [dict(statuses[batch['client_batch_id']], client_batch_id=batch['client_batch_id']) for batch in batches]
+
+    @api.model
+    def _journal_batch(self, adjustment, batch_vals):
+        """
+        Stores a scan batch, returns False when the same batch was stored by a concurrent request.
+        """
+        try:
+            with self.env.cr.savepoint():
+                return self.create({
+                    'inv_adjustment_id': adjustment.id,
+                    'client_batch_id': batch_vals['client_batch_id'],
+                    'device_id': batch_vals.get('device_id'),
+                    'sequence': batch_vals.get('sequence', 0),
+                    'scans': batch_vals.get('scans') or [],
+                    'scan_count': len(batch_vals.get('scans') or []),
+                })
+        except psycopg2.IntegrityError:
+            return self.browse()
+
+    def _replay(self):
+        """
+        Replays the scans of the batch into the adjustment. A batch in error keeps its scans and is replayed
+        again when the device sends it again.
+        """
+        for batch in self:
+            try:
+                with self.env.cr.savepoint():
+                    result = batch.inv_adjustment_id.ingest_scans(batch.scans or [])
+            except (UserError, ValidationError) as e:
+                _logger.info("Scan batch %s of adjustment %s could not be replayed: %s",
+                             batch.client_batch_id, batch.inv_adjustment_id.name, e)
+                batch.write({'state': 'error', 'error': str(e)})
+                continue
+            batch.write({
+                'state': 'done',
+                'result': result,
+                'error': False,
+                'replayed_date': fields.Datetime.now(),
+            })
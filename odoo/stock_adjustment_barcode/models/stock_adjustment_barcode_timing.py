@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+
+
+class StockAdjustmentBarcodeTiming(models.Model):
+    _name = 'stock.adjustment.barcode.timing'
+    _description = 'Stock Adjustment Barcode Timing'
+    _order = 'id desc'
+
+    inv_adjustment_id = fields.Many2one(
+        comodel_name='stock.adjustment.barcode',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    phase = fields.Char(
+        required=True,
+        help='Step of the adjustment lifecycle that was measured, e.g. confirm, recompute_lots or stock_moves_action_done'
+    )
+
+    user_id = fields.Many2one(
+        comodel_name='res.users',
+        default=lambda self: self.env.user
+    )
+
+    duration = fields.Float(
+        string='Duration (s)',
+        digits=(16, 3),
+        help='Wall time of the phase, pending ORM recomputes included'
+    )
+
+    recompute_duration = fields.Float(
+        string='Recompute (s)',
+        digits=(16, 3),
+        help='Part of the duration spent flushing the pending ORM recomputes and writes at the end of the phase'
+    )
+
+    query_count = fields.Integer(
+        string='Queries'
+    )
+
+    query_duration = fields.Float(
+        string='SQL (s)',
+        digits=(16, 3),
+        help='Part of the duration spent in the database'
+    )
+
+    row_count = fields.Integer(
+        string='Rows',
+        help='Number of records processed by the phase: adjustment lines, stock moves or valuation layers'
+    )
+
+    def _get_export_values(self):
+        return [{
+            'phase': timing.phase,
+            'date': fields.Datetime.to_string(timing.create_date),
+            'user': timing.user_id.login,
+            'duration': timing.duration,
+            'recompute_duration': timing.recompute_duration,
+            'query_count': timing.query_count,
+            'query_duration': timing.query_duration,
+            'row_count': timing.row_count,
+        } for timing in self.sorted('id')]
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models
+from odoo.tools.sql import create_index
+
+
+class StockMoveLine(models.Model):
+    _inherit = 'stock.move.line'
+
+    def init(self):
+        """
+        Indexes used by the inventory adjustment to read the moves of a location over a period.
+        """
+        super().init()
+        create_index(self._cr, 'stock_move_line_location_date_index', self._table, ['location_id', 'date'])
+        create_index(self._cr, 'stock_move_line_location_dest_date_index', self._table, ['location_dest_id', 'date'])
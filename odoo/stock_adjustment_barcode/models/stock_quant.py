@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+from odoo import api, fields, models
+from odoo.tools.sql import create_index
+
+# Compact quant row read by the inventory adjustment
+AdjustmentQuantRow = namedtuple('AdjustmentQuantRow', ['product_id', 'lot_id', 'qty', 'reserved', 'in_date'])
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    def init(self):
+        """
+        Index used by the inventory adjustment to read the quants of a location.
+        """
+        super().init()
+        create_index(self._cr, 'stock_quant_location_company_product_index',
+                     self._table, ['location_id', 'company_id', 'product_id'])
+
+    @api.model
+    def _read_adjustment_quant_rows(self, location, company_id=None, product_ids=None, include_children=False,
+                                    group_by_lot=True, batch_size=2000):
+        """
+        Reads the quants of a location in pages of products and yields compact
+        AdjustmentQuantRow(product_id, lot_id, qty, reserved, in_date) rows, ordered by product, lots first,
+        then incoming date. The pages are read through the cursor of the transaction, keyed on the last product
+        read, so that only one page of rows is loaded at once.
+
+        Args:
+            location: stock.location record
+            company_id: Only read the quants of this company
+            product_ids: Only read the quants of these products
+            include_children: Also read the quants of the child locations
+            group_by_lot: Sum the quants of each (product, lot), in_date being the oldest one.
+                Otherwise one row is yielded per quant.
+            batch_size: Number of products read per page
+        Note:
+            The quants are flushed before the first page, the generator must be consumed before changing them.
+        """
+        if product_ids is not None and not product_ids:
+            return
+
+        self.flush_model(['product_id', 'location_id', 'company_id', 'lot_id', 'quantity', 'reserved_quantity', 'in_date'])
+        conditions = []
+        params = []
+        if include_children:
+            self.env['stock.location'].flush_model(['parent_path'])
+            conditions.append("sq.location_id IN (SELECT id FROM stock_location WHERE parent_path LIKE %s)")
+            params.append(f'{location.parent_path}%')
+        else:
+            conditions.append("sq.location_id = %s")
+            params.append(location.id)
+        if company_id:
+            conditions.append("sq.company_id = %s")
+            params.append(company_id)
+        if product_ids is not None:
+            conditions.append("sq.product_id = ANY(%s)")
+            params.append(list(product_ids))
+
+        # Products of the page, after the last product of the previous page
+        page_query = f"""
+            SELECT DISTINCT
+                sq.product_id
+            FROM
+                stock_quant AS sq
+            WHERE
+                {' AND '.join(conditions)}
+                AND sq.product_id > %s
+            ORDER BY
+                sq.product_id
+            LIMIT %s
+        """
+        if group_by_lot:
+            query = f"""
+                SELECT
+                    sq.product_id,
+                    sq.lot_id,
+                    SUM(sq.quantity),
+                    SUM(sq.reserved_quantity),
+                    MIN(sq.in_date)
+                FROM
+                    stock_quant AS sq
+                WHERE
+                    {' AND '.join(conditions)}
+                    AND sq.product_id IN ({page_query})
+                GROUP BY
+                    sq.product_id, sq.lot_id
+                ORDER BY
+                    sq.product_id, sq.lot_id IS NULL, MIN(sq.in_date), sq.lot_id
+            """
+        else:
+            query = f"""
+                SELECT
+                    sq.product_id,
+                    sq.lot_id,
+                    sq.quantity,
+                    sq.reserved_quantity,
+                    sq.in_date
+                FROM
+                    stock_quant AS sq
+                WHERE
+                    {' AND '.join(conditions)}
+                    AND sq.product_id IN ({page_query})
+                ORDER BY
+                    sq.product_id, sq.lot_id IS NULL, sq.in_date, sq.id
+            """
+
+        last_product_id = 0
+        while True:
+            self.env.cr.execute(query, params + params + [last_product_id, batch_size])
+            rows = self.env.cr.fetchall()
+            for row in rows:
+                yield AdjustmentQuantRow(*row)
+            page_product_ids = {row[0] for row in rows}
+            if len(page_product_ids) < batch_size:
+                break
+            last_product_id = rows[-1][0]
+
+    @api.model
+    def _read_adjustment_quant_rows_at_date(self, location, at_date, product_ids=None):
+        """
+        Returns the quantities of a location at a past date as AdjustmentQuantRow rows, one per (product, lot).
+        The stock starts from the nearest known state of the location, the daily snapshot closest to at_date or
+        the current quants when they are closer, and the done move lines between that state and at_date are
+        applied in the same aggregated query. Only the moves of less than half the snapshot period are read,
+        whatever the length of the history.
+        Reserved quantities and incoming dates have no meaning in the past and are left empty.
+
+        Args:
+            location: stock.location record, its child locations are not included
+            at_date: Datetime of the stock to compute
+            product_ids: Only read the stock of these products
+        """
+        if product_ids is not None and not product_ids:
+            return []
+
+        now = fields.Datetime.now()
+        snapshot_date = self.env['stock.adjustment.barcode.quant.snapshot']._get_nearest_snapshot_date(location, at_date)
+        if snapshot_date and abs(snapshot_date - at_date) < now - at_date:
+            self.env['stock.adjustment.barcode.quant.snapshot'].flush_model()
+            base_query = """
+                SELECT
+                    snapshot.product_id,
+                    snapshot.lot_id,
+                    snapshot.quantity AS qty
+                FROM
+                    stock_adjustment_barcode_quant_snapshot AS snapshot
+                WHERE
+                    snapshot.location_id = %(location_id)s
+                    AND snapshot.snapshot_date = %(base_date)s
+                    {product_condition}
+            """
+            base_date, base_alias = snapshot_date, 'snapshot'
+            if snapshot_date <= at_date:
+                date_condition = "sml.date > %(base_date)s AND sml.date <= %(at_date)s"
+            else:
+                date_condition = "sml.date > %(at_date)s AND sml.date <= %(base_date)s"
+        else:
+            self.flush_model(['product_id', 'location_id', 'lot_id', 'quantity'])
+            base_query = """
+                SELECT
+                    sq.product_id,
+                    sq.lot_id,
+                    sq.quantity AS qty
+                FROM
+                    stock_quant AS sq
+                WHERE
+                    sq.location_id = %(location_id)s
+                    {product_condition}
+            """
+            base_date, base_alias = now, 'sq'
+            date_condition = "sml.date > %(at_date)s"
+        # Moves done after at_date are rolled back from a later state, the ones before it are applied on an earlier one
+        sign = 1 if base_date <= at_date else -1
+
+        self.env['stock.move.line'].flush_model(
+            ['product_id', 'lot_id', 'location_id', 'location_dest_id', 'state', 'date', 'qty_done', 'product_uom_id'])
+        product_condition = "AND {alias}.product_id = ANY(%(product_ids)s)" if product_ids is not None else ""
+        self.env.cr.execute(f"""
+            SELECT
+                stock.product_id,
+                stock.lot_id,
+                SUM(stock.qty)
+            FROM (
+                {base_query.format(product_condition=product_condition.format(alias=base_alias))}
+                UNION ALL
+                SELECT
+                    sml.product_id,
+                    sml.lot_id,
+                    CASE WHEN sml.location_dest_id = %(location_id)s THEN 1 ELSE -1 END * %(sign)s
+                        * sml.qty_done / line_uom.factor * product_uom.factor
+                FROM
+                    stock_move_line AS sml
+                        INNER JOIN uom_uom AS line_uom
+                            ON line_uom.id = sml.product_uom_id
+                        INNER JOIN product_product AS pp
+                            ON pp.id = sml.product_id
+                        INNER JOIN product_template AS pt
+                            ON pt.id = pp.product_tmpl_id
+                        INNER JOIN uom_uom AS product_uom
+                            ON product_uom.id = pt.uom_id
+                WHERE
+                    sml.state = 'done'
+                    AND {date_condition}
+                    AND (sml.location_id = %(location_id)s OR sml.location_dest_id = %(location_id)s)
+                    AND sml.location_id != sml.location_dest_id
+                    {product_condition.format(alias='sml')}
+            ) AS stock
+            GROUP BY
+                stock.product_id, stock.lot_id
+            ORDER BY
+                stock.product_id, stock.lot_id IS NULL, stock.lot_id
+        """, {
+            'location_id': location.id,
+            'at_date': at_date,
+            'base_date': base_date,
+            'sign': sign,
+            'product_ids': list(product_ids or []),
+        })
+        return [AdjustmentQuantRow(product_id, lot_id, qty or 0.0, 0.0, None)
+                for product_id, lot_id, qty in self.env.cr.fetchall()]
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import logging
+import time
+
 from odoo import models, fields, api, _
 
+_logger = logging.getLogger(__name__)
+
 
 class StockValuationLayer(models.Model):
     _inherit = 'stock.valuation.layer'
@@ -10,12 +15,30 @@ class StockValuationLayer(models.Model):
         """
         Validates and creates accounting entries for inventory adjustments.
         Override to set accounting date from Inventory Adjustment Barcode.
+        The layers of other operations are left to the standard method. The accounting date is taken from
+        the adjustment of each layer and the anglo-saxon reconciliation runs once per company.
 
         TASK: https://app.asana.com/0/1208684301479826/1208633382193060/f
         """
-        if not self.stock_move_id.inv_adjustment_line_id:
-            return super()._validate_accounting_entries()
+        adjustment_svls = self.filtered(
+            lambda svl: (svl.stock_move_id or svl.stock_valuation_layer_id.stock_move_id).inv_adjustment_line_id)
+        other_svls = self - adjustment_svls
+        if other_svls:
+            super(StockValuationLayer, other_svls)._validate_accounting_entries()
+        if not adjustment_svls:
+            return
+
+        adjustments = adjustment_svls.stock_move_id.inv_adjustment_line_id.inv_adjustment_id | \
+            adjustment_svls.stock_valuation_layer_id.stock_move_id.inv_adjustment_line_id.inv_adjustment_id
+        with adjustments._profile_phase('accounting', flush=False) as stats:
+            stats['rows'] = len(adjustment_svls)
+            adjustment_svls._create_adjustment_accounting_entries()
 
+    def _create_adjustment_accounting_entries(self):
+        """
+        Creates the accounting entries of the valuation layers of inventory adjustments.
+        """
+        start = time.monotonic()
         am_vals = []
         for svl in self:
             if not svl.with_company(svl.company_id).product_id.valuation == 'real_time':
@@ -25,14 +48,26 @@ class StockValuationLayer(models.Model):
             move = svl.stock_move_id
             if not move:
                 move = svl.stock_valuation_layer_id.stock_move_id
-            am_vals += move.with_company(svl.company_id)._account_entry_move(svl.quantity, svl.description, svl.id, svl.value)
-        if am_vals:
-            if move.inv_adjustment_line_id.inv_adjustment_id:
-                force_accounting_date = move.inv_adjustment_line_id.inv_adjustment_id.force_accounting_date
-                for entry in am_vals:
+            svl_am_vals = move.with_company(svl.company_id)._account_entry_move(svl.quantity, svl.description, svl.id, svl.value)
+            force_accounting_date = move.inv_adjustment_line_id.inv_adjustment_id.force_accounting_date
+            if force_accounting_date:
+                for entry in svl_am_vals:
                     entry['date'] = force_accounting_date
-            account_moves = self.env['account.move'].sudo().create(am_vals)
+            am_vals += svl_am_vals
+
+        account_moves = self.env['account.move']
+        if am_vals:
+            account_moves = account_moves.sudo().create(am_vals)
             account_moves._post()
-        for svl in self:
-            if svl.company_id.anglo_saxon_accounting:
-                svl.stock_move_id._get_related_invoices()._stock_account_anglo_saxon_reconcile_valuation(product=svl.product_id)
+        entries_time = time.monotonic() - start
+
+        # Eventually reconcile together the invoice and valuation accounting entries on the stock interim accounts
+        for company in self.company_id.filtered('anglo_saxon_accounting'):
+            svls = self.filtered(lambda svl: svl.company_id == company)
+            invoices = svls.stock_move_id._get_related_invoices()
+            if invoices:
+                invoices._stock_account_anglo_saxon_reconcile_valuation(product=svls.product_id)
+
+        _logger.info(
+            "Inventory adjustment valuation: %s entries created for %s layers in %.2fs, reconciliation in %.2fs",
+            len(account_moves), len(self), entries_time, time.monotonic() - start - entries_time)
@@ -10,7 +10,8 @@ class MrpCostStructure(models.AbstractModel):
     @api.model
     def _get_report_values(self, docids, data=None):
         docs = self.env['stock.adjustment.barcode'].browse(docids)
-        return {'lines': docs.inv_adjustment_line_ids, 'currency': docs.currency_id}
+        data = docs._get_variation_report_data()
+        return {'rows': data['rows'], 'total': data['total'], 'currency': docs.currency_id}
 
 class StockVariationReport(models.AbstractModel):
     _name = 'report.stock_adjustment_barcode.stock_variation_report'
@@ -19,4 +20,5 @@ class StockVariationReport(models.AbstractModel):
     @api.model
     def _get_report_values(self, docids, data=None):
         docs = self.env['stock.adjustment.barcode'].browse(docids)
-        return {'lines': docs.inv_adjustment_line_ids, 'currency': docs.currency_id}
\ No newline at end of file
+        data = docs._get_variation_report_data()
+        return {'rows': data['rows'], 'total': data['total'], 'currency': docs.currency_id}
\ No newline at end of file
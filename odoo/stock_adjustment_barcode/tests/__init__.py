@@ -3,4 +3,7 @@
 from . import test_stock_adjustment_barcode
 from . import test_stock_adjustment_barcode_line
 from . import test_stock_adjustment_barcode_line_info
-from . import test_bom_consolidation
\ No newline at end of file
+from . import test_bom_consolidation
+from . import test_lot_allocation
+from . import test_concurrent_scanning
+from . import test_variation_report_download
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from unittest.mock import patch
+
 from odoo.tests.common import TransactionCase
 from datetime import datetime
 
@@ -117,3 +119,280 @@ class TestBOMConsolidation(TransactionCase):
         
         self.assertTrue(adjustment)
         self.assertEqual(adjustment.state, 'draft')
+
+    def test_02_transfer_bom_consolidation(self):
+        """Test that child lines are consolidated to their transfer BOM parent"""
+        # Transfer BOM: 1 unit of a child produces 3 units of the assorted pack
+        for child_product in [self.child_product_1, self.child_product_2]:
+            self.env['mrp.bom'].create({
+                'product_tmpl_id': child_product.product_tmpl_id.id,
+                'type': 'transfer',
+                'product_qty': 1.0,
+                'bom_line_ids': [(0, 0, {
+                    'product_id': self.parent_product.id,
+                    'product_qty': 3.0,
+                })],
+            })
+
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/BOM/002',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        child_infos = self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.child_product_1.id,
+            'scanned_qty': 5.0,
+            'scanned_user_id': self.user_a.id,
+        }, {
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.child_product_2.id,
+            'scanned_qty': 2.0,
+            'scanned_user_id': self.user_a.id,
+        }])
+
+        adjustment._handle_bom_transfer_consolidation()
+
+        lines = adjustment.inv_adjustment_line_ids
+        parent_line = lines.filtered(lambda l: l.product_id == self.parent_product)
+        child_lines = lines - parent_line
+        self.assertEqual(len(parent_line), 1)
+        self.assertTrue(parent_line.is_parent_line)
+        self.assertFalse(parent_line.is_child_line)
+        self.assertTrue(all(child_lines.mapped('is_child_line')))
+        self.assertEqual(child_lines.parent_product_id, self.parent_product)
+        self.assertEqual(parent_line.total_scanned_qty, 21.0)
+        self.assertEqual(parent_line.difference_qty, 21.0 - parent_line.on_hand_qty)
+        self.assertIn(self.parent_product.id, adjustment.disallowed_products_json)
+
+        # Parent line comes first, children follow in scan order
+        parent_sequence = 1000 + self.parent_product.id * 10
+        self.assertEqual(parent_line.display_sequence, parent_sequence)
+        self.assertEqual(sorted(child_lines.mapped('display_sequence')), [parent_sequence + 1, parent_sequence + 2])
+
+        # Running the consolidation again doesn't duplicate parent lines
+        adjustment._handle_bom_transfer_consolidation()
+        self.assertEqual(len(adjustment.inv_adjustment_line_ids), 3)
+        self.assertFalse(parent_line.adjustment_line_info_ids)
+        self.assertEqual(parent_line.total_scanned_qty, 21.0)
+
+        # A scan of a child refreshes the difference of its parent line
+        child_infos[0]._increment_scanned_qty({child_infos[0].id: 1.0})
+        self.assertEqual(parent_line.difference_qty, 24.0 - parent_line.on_hand_qty)
+
+    def test_03_transfer_bom_index_invalidation(self):
+        """Test that the cached transfer BOM index follows BOM and BOM line changes"""
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/BOM/003',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        child_template_id = self.child_product_1.product_tmpl_id.id
+        self.assertNotIn(child_template_id, adjustment._get_transfer_bom_index())
+
+        bom = self.env['mrp.bom'].create({
+            'product_tmpl_id': child_template_id,
+            'type': 'transfer',
+            'product_qty': 2.0,
+            'bom_line_ids': [(0, 0, {
+                'product_id': self.parent_product.id,
+                'product_qty': 3.0,
+            })],
+        })
+        transfer_bom = adjustment._get_transfer_bom_index()[child_template_id]
+        self.assertEqual(transfer_bom.bom_id, bom.id)
+        self.assertEqual(transfer_bom.parent_product_id, self.parent_product.id)
+        self.assertEqual(transfer_bom.ratio, 1.5)
+
+        # BOM line change
+        bom.bom_line_ids.product_qty = 4.0
+        self.assertEqual(adjustment._get_transfer_bom_index()[child_template_id].ratio, 2.0)
+
+        # Opening the scan screen initializes the disallowed products from the index
+        adjustment.action_open_scan_line()
+        self.assertEqual(adjustment.disallowed_products_json, [self.parent_product.id])
+
+        # Edits the index does not read, and edits of other BOM types, keep the caches
+        with patch('odoo.models.BaseModel.clear_caches') as clear_caches:
+            bom.write({'code': 'TRANSFER-REF'})
+            bom.bom_line_ids.write({'operation_id': False})
+            self.bom.write({'product_qty': 2.0})
+            self.bom.bom_line_ids.write({'product_qty': 4.0})
+        clear_caches.assert_not_called()
+
+        # Removing the BOM removes the child from the index
+        bom.unlink()
+        self.assertNotIn(child_template_id, adjustment._get_transfer_bom_index())
+
+    def test_04_line_scans(self):
+        """Test that the scans of a line are read from its rows and that a parent line reads those of its children"""
+        self.env['mrp.bom'].create({
+            'product_tmpl_id': self.child_product_1.product_tmpl_id.id,
+            'type': 'transfer',
+            'product_qty': 1.0,
+            'bom_line_ids': [(0, 0, {
+                'product_id': self.parent_product.id,
+                'product_qty': 3.0,
+            })],
+        })
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/BOM/004',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        info_obj = self.env['stock.adjustment.barcode.line.info']
+        info_a = info_obj.create({
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.child_product_1.id,
+            'scanned_qty': 5.0,
+            'scanned_user_id': self.user_a.id,
+        })
+        info_obj.create({
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.child_product_1.id,
+            'scanned_qty': 2.0,
+            'scanned_user_id': self.user_b.id,
+        })
+        info_a.scanned_qty = 4.0
+        info_a._increment_scanned_qty({info_a.id: 3.0})
+
+        adjustment._handle_bom_transfer_consolidation()
+
+        child_line = adjustment.inv_adjustment_line_ids.filtered(lambda l: l.product_id == self.child_product_1)
+        parent_line = adjustment.inv_adjustment_line_ids.filtered(lambda l: l.product_id == self.parent_product)
+        self.assertFalse(parent_line.adjustment_line_info_ids)
+
+        self.env.flush_all()
+        self.assertEqual(child_line.scan_ids.user_id, self.user_a | self.user_b)
+        self.assertEqual(sum(child_line.scan_ids.mapped('scanned_qty')), 9.0)
+        self.assertEqual(sum(child_line.scan_ids.mapped('scanned_qty')), child_line.total_scanned_qty)
+        # The parent line reads the rows of its child line
+        self.assertEqual(parent_line.scan_ids.source_line_id, child_line)
+        self.assertEqual(sum(parent_line.scan_ids.mapped('scanned_qty')), 9.0)
+        self.assertEqual(sum(parent_line.scan_ids.mapped('scanned_row_count')), 2)
+
+        # Removing a row removes its scans
+        info_a.unlink()
+        self.env.flush_all()
+        child_line.invalidate_recordset(['scan_ids'])
+        self.assertEqual(sum(child_line.scan_ids.mapped('scanned_qty')), 2.0)
+
+    def test_05_no_scan_rows_on_parent_lines(self):
+        """Test that the consolidation writes no scanned rows for the parent lines"""
+        self.env['mrp.bom'].create({
+            'product_tmpl_id': self.child_product_1.product_tmpl_id.id,
+            'type': 'transfer',
+            'product_qty': 1.0,
+            'bom_line_ids': [(0, 0, {
+                'product_id': self.parent_product.id,
+                'product_qty': 3.0,
+            })],
+        })
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/BOM/005',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        line_info_obj = self.env['stock.adjustment.barcode.line.info']
+        child_infos = line_info_obj.create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.child_product_1.id,
+            'scanned_qty': qty,
+            'scanned_user_id': self.user_a.id,
+        } for qty in (1.0, 2.0, 3.0, 2.0)])
+
+        with patch.object(type(line_info_obj), 'create') as info_create:
+            adjustment._handle_bom_transfer_consolidation()
+            adjustment._handle_bom_transfer_consolidation()
+        info_create.assert_not_called()
+
+        parent_line = adjustment.inv_adjustment_line_ids.filtered(lambda l: l.product_id == self.parent_product)
+        self.assertTrue(parent_line.is_parent_line)
+        self.assertFalse(parent_line.adjustment_line_info_ids)
+        self.assertEqual(line_info_obj.search([('inv_adjustment_id', '=', adjustment.id)]), child_infos)
+        self.assertEqual(parent_line.total_scanned_qty, 24.0)
+
+        # The line details of the parent line list the rows of its child lines
+        action = parent_line.action_open_stock_adjustment_barcode_line_info()
+        self.assertEqual(line_info_obj.search(action['domain']), child_infos)
+
+    def test_06_cleanup_bom_transfer_consolidation(self):
+        """Test that cancelling removes the consolidation artifacts of all the parents at once"""
+        second_parent = self.env['product.product'].create({
+            'name': 'Assorted Pack 2-in-1',
+            'type': 'product',
+            'categ_id': self.env.ref('product.product_category_all').id,
+        })
+        for child_product, parent_product in [(self.child_product_1, self.parent_product),
+                                              (self.child_product_2, self.parent_product),
+                                              (self.child_product_3, second_parent)]:
+            self.env['mrp.bom'].create({
+                'product_tmpl_id': child_product.product_tmpl_id.id,
+                'type': 'transfer',
+                'product_qty': 1.0,
+                'bom_line_ids': [(0, 0, {
+                    'product_id': parent_product.id,
+                    'product_qty': 3.0,
+                })],
+            })
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/BOM/006',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        child_infos = self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': product.id,
+            'scanned_qty': 2.0,
+            'scanned_user_id': self.user_a.id,
+        } for product in (self.child_product_1, self.child_product_2, self.child_product_3)])
+        # The second parent was also counted on its own, its line is kept
+        parent_info = self.env['stock.adjustment.barcode.line.info'].create({
+            'inv_adjustment_id': adjustment.id,
+            'product_id': second_parent.id,
+            'scanned_qty': 1.0,
+            'scanned_user_id': self.user_a.id,
+        })
+        adjustment._handle_bom_transfer_consolidation()
+        adjustment.disallowed_products_json = [self.parent_product.id, second_parent.id]
+        self.assertEqual(len(adjustment.inv_adjustment_line_ids), 5)
+        second_parent_line = adjustment.inv_adjustment_line_ids.filtered(lambda l: l.product_id == second_parent)
+        self.assertTrue(second_parent_line.is_parent_line)
+        self.assertEqual(second_parent_line.total_scanned_qty, 6.0)
+
+        adjustment.action_cancel()
+
+        lines = adjustment.inv_adjustment_line_ids.sorted('id')
+        self.assertEqual(lines.product_id,
+                         self.child_product_1 | self.child_product_2 | self.child_product_3 | second_parent)
+        self.assertFalse(lines.parent_product_id)
+        self.assertFalse(any(lines.mapped('is_parent_line')))
+        self.assertFalse(any(lines.mapped('is_child_line')))
+        self.assertEqual(adjustment.inv_adjustment_line_info_ids, child_infos | parent_info)
+        self.assertEqual(lines.mapped('total_scanned_qty'), [2.0, 2.0, 2.0, 1.0])
+        self.assertEqual(second_parent_line.difference_qty, 1.0 - second_parent_line.on_hand_qty)
+        self.assertEqual(adjustment.disallowed_products_json, [])
+        self.assertEqual(adjustment.state, 'cancel')
+
+    def test_07_transfer_bom_index_warehouses(self):
+        """Test that the index of a warehouse skips the BOMs of other warehouses and that without warehouse all are loaded"""
+        other_warehouse = self.env['stock.warehouse'].create({
+            'name': 'Test Other Warehouse BOM',
+            'code': 'TOWB',
+            'company_id': self.company.id,
+        })
+        child_template_id = self.child_product_1.product_tmpl_id.id
+        self.env['mrp.bom'].create({
+            'product_tmpl_id': child_template_id,
+            'type': 'transfer',
+            'product_qty': 1.0,
+            'warehouse_ids': [(6, 0, other_warehouse.ids)],
+            'bom_line_ids': [(0, 0, {
+                'product_id': self.parent_product.id,
+                'product_qty': 1.0,
+            })],
+        })
+        bom_obj = self.env['mrp.bom']
+        self.assertNotIn(child_template_id, bom_obj._get_transfer_bom_index(self.warehouse.id))
+        self.assertIn(child_template_id, bom_obj._get_transfer_bom_index(other_warehouse.id))
+        self.assertIn(child_template_id, bom_obj._get_transfer_bom_index(False))
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from psycopg2 import errorcodes, OperationalError
+
+import odoo
+from odoo import api, SUPERUSER_ID
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase, get_db_name
+
+# Same errors as the ones retried by odoo.service.model.retrying
+RETRY_ERRORS = (errorcodes.SERIALIZATION_FAILURE, errorcodes.LOCK_NOT_AVAILABLE, errorcodes.DEADLOCK_DETECTED)
+
+
+@tagged('-standard', 'stock_adjustment_barcode_stress')
+class TestConcurrentScanning(BaseCase):
+    """Stress test of several counters scanning the same products into one adjustment at once.
+    The data is committed so that each counter works on its own cursor, run it explicitly with
+    --test-tags stock_adjustment_barcode_stress"""
+
+    counters = 6
+    scans_per_counter = 20
+
+    def setUp(self):
+        super().setUp()
+        self.registry = odoo.registry(get_db_name())
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            location = env['stock.location'].create({
+                'name': 'Test Concurrent Scanning Location',
+                'usage': 'internal',
+                'location_id': env.ref('stock.stock_location_locations').id,
+            })
+            products = env['product.product'].create([{
+                'name': f'Test Concurrent Product {index}',
+                'type': 'product',
+                'barcode': f'CONCURRENT-SCAN-{index}',
+            } for index in range(3)])
+            adjustment = env['stock.adjustment.barcode'].create({
+                'location_id': location.id,
+            })
+            self.user_ids = env['res.users'].create([{
+                'name': f'Test Counter {index}',
+                'login': f'test_concurrent_counter_{index}',
+                'groups_id': [(6, 0, [env.ref('stock.group_stock_user').id])],
+            } for index in range(self.counters)]).ids
+            self.location_id = location.id
+            self.product_ids = products.ids
+            self.adjustment_id = adjustment.id
+        self.addCleanup(self._cleanup)
+
+    def _cleanup(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['stock.adjustment.barcode'].browse(self.adjustment_id).unlink()
+            env['product.product'].browse(self.product_ids).unlink()
+            env['stock.location'].browse(self.location_id).unlink()
+            env['res.users'].browse(self.user_ids).unlink()
+
+    def _scan(self, user_id, barrier, errors):
+        barrier.wait()
+        try:
+            for index in range(self.scans_per_counter):
+                barcode = f'CONCURRENT-SCAN-{index % 3}'
+                for attempt in range(10):
+                    try:
+                        with self.registry.cursor() as cr:
+                            env = api.Environment(cr, user_id, {})
+                            env['stock.adjustment.barcode'].browse(self.adjustment_id).ingest_scans([{
+                                'barcode': barcode,
+                                'qty': 1,
+                            }])
+                        break
+                    except OperationalError as e:
+                        if e.pgcode not in RETRY_ERRORS or attempt == 9:
+                            raise
+                        time.sleep(0.01 * (attempt + 1))
+        except Exception as e:
+            errors.append(e)
+
+    def test_01_concurrent_scans_are_not_lost(self):
+        """Test concurrent counters share one line per product and no increment is lost"""
+        barrier = threading.Barrier(self.counters)
+        errors = []
+        threads = [
+            threading.Thread(target=self._scan, args=(user_id, barrier, errors))
+            for user_id in self.user_ids
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(errors)
+
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            adjustment = env['stock.adjustment.barcode'].browse(self.adjustment_id)
+            lines = adjustment.inv_adjustment_line_ids
+            self.assertEqual(len(lines), 3)
+            self.assertEqual(len(lines.adjustment_line_info_ids), 3 * self.counters)
+            total = self.counters * self.scans_per_counter
+            self.assertEqual(sum(lines.mapped('total_scanned_qty')), total)
+            # Nothing is in stock, the stored differences are the counted quantities
+            self.assertEqual(sum(lines.mapped('difference_qty')), total)
+            self.assertEqual(sum(lines.adjustment_line_info_ids.mapped('scanned_qty')), total)
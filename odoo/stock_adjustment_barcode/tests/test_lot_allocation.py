@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import random
+from datetime import datetime, timedelta
+
+from odoo.tests.common import BaseCase
+
+from ..tools.lot_allocation import allocate_lots
+
+
+class TestLotAllocation(BaseCase):
+    """Property tests of the FIFO lot allocator on random quants"""
+
+    def _random_quant_rows(self, rng, count, allow_negative=True):
+        start = datetime(2024, 1, 1)
+        quant_rows = []
+        for quant_id in range(1, count + 1):
+            qty = round(rng.uniform(-5 if allow_negative else 0.01, 50), 2)
+            in_date = start + timedelta(hours=rng.randint(0, 10000)) if rng.random() > 0.1 else None
+            quant_rows.append((quant_id, 1000 + quant_id, qty, in_date))
+        return quant_rows
+
+    def test_01_every_quant_allocated_once(self):
+        """Test each quant gives exactly one lot line"""
+        rng = random.Random(16)
+        for _i in range(200):
+            quant_rows = self._random_quant_rows(rng, rng.randint(1, 30))
+            difference = round(rng.uniform(-100, 100), 2)
+            allocations = allocate_lots(quant_rows, 10.0, difference)
+            self.assertEqual(
+                sorted(allocation.lot_id for allocation in allocations),
+                sorted(quant_row[1] for quant_row in quant_rows))
+
+    def test_02_negative_difference_taken_fifo(self):
+        """Test a negative difference is removed from the oldest positive quants first"""
+        rng = random.Random(42)
+        for _i in range(200):
+            quant_rows = self._random_quant_rows(rng, rng.randint(1, 30), allow_negative=False)
+            positive_total = sum(quant_row[2] for quant_row in quant_rows)
+            difference = -round(rng.uniform(0, positive_total), 2)
+            allocations = {allocation.lot_id: allocation for allocation in allocate_lots(quant_rows, 0.0, difference)}
+
+            new_total = sum(allocation.new_qty for allocation in allocations.values())
+            self.assertAlmostEqual(new_total, positive_total + difference, places=2)
+
+            # Once a quant keeps some stock, all newer quants are untouched
+            partially_taken = False
+            for quant_row in sorted(quant_rows, key=lambda q: q[3] or datetime.min):
+                allocation = allocations[quant_row[1]]
+                self.assertGreaterEqual(allocation.new_qty, 0)
+                if partially_taken:
+                    self.assertEqual(allocation.new_qty, quant_row[2])
+                elif allocation.new_qty > 0:
+                    partially_taken = True
+
+    def test_03_positive_difference_on_oldest_quant(self):
+        """Test a positive difference is added to the oldest positive quant and negative quants are reset"""
+        rng = random.Random(7)
+        for _i in range(200):
+            quant_rows = self._random_quant_rows(rng, rng.randint(1, 30))
+            positive_rows = sorted((q for q in quant_rows if q[2] > 0), key=lambda q: q[3] or datetime.min)
+            if not positive_rows:
+                continue
+            difference = round(rng.uniform(0.01, 100), 2)
+            allocations = {allocation.lot_id: allocation for allocation in allocate_lots(quant_rows, 10.0, difference)}
+
+            oldest = positive_rows[0]
+            self.assertAlmostEqual(allocations[oldest[1]].new_qty, oldest[2] + difference, places=2)
+            for quant_row in quant_rows:
+                if quant_row[2] < 0:
+                    self.assertEqual(allocations[quant_row[1]].new_qty, 0)
+                elif quant_row is not oldest:
+                    self.assertEqual(allocations[quant_row[1]].new_qty, quant_row[2])
+
+    def test_04_fractional_and_excess_difference(self):
+        """Test fractional quantities are taken and an excess difference does not overrun the quants"""
+        quant_rows = [(1, 11, 0.4, datetime(2024, 1, 1)), (2, 12, 3.0, datetime(2024, 1, 2))]
+        allocations = allocate_lots(quant_rows, 2.9, -0.5)
+        self.assertEqual([(a.lot_id, a.new_qty) for a in allocations], [(11, 0), (12, 2.9)])
+
+        allocations = allocate_lots(quant_rows, 0.0, -10.0)
+        self.assertEqual([(a.lot_id, a.new_qty) for a in allocations], [(11, 0), (12, 0)])
+
+    def test_05_all_negative_quants(self):
+        """Test the scanned quantity goes to the oldest quant when every quant is negative"""
+        quant_rows = [(1, 11, -2.0, datetime(2024, 2, 1)), (2, 12, -1.0, datetime(2024, 1, 1))]
+        allocations = allocate_lots(quant_rows, 6.0, 9.0)
+        self.assertEqual([(a.lot_id, a.new_qty, a.current_qty) for a in allocations], [(12, 6.0, -1.0), (11, 0, -2.0)])
+
+    def test_06_hundreds_of_lots(self):
+        """Test a line with hundreds of lots is allocated in one pass"""
+        rng = random.Random(500)
+        quant_rows = self._random_quant_rows(rng, 800, allow_negative=False)
+        positive_total = sum(quant_row[2] for quant_row in quant_rows)
+        allocations = allocate_lots(quant_rows, 10.0, 10.0 - positive_total)
+        self.assertEqual(len(allocations), 800)
+        self.assertAlmostEqual(sum(a.new_qty for a in allocations), 10.0, places=2)
@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 
-from odoo.tests.common import TransactionCase
-from odoo.exceptions import ValidationError
+import logging
+import time
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests.common import Form, TransactionCase
+from odoo.exceptions import UserError, ValidationError
 from datetime import datetime
 
+_logger = logging.getLogger(__name__)
+
 
 class TestStockAdjustmentBarcode(TransactionCase):
     """Test cases for stock adjustment barcode functionality"""
@@ -251,4 +258,656 @@ class TestStockAdjustmentBarcode(TransactionCase):
         })
         
         # Check that disallowed products are computed correctly
-        self.assertIn(self.product_1.id, [p.id for p in line_info.disallowed_product_ids])
\ No newline at end of file
+        self.assertIn(self.product_1.id, [p.id for p in line_info.disallowed_product_ids])
+
+    def test_09_scan_resolves_barcode_without_search(self):
+        """Test that a scan resolves the barcode through the cached index"""
+        self.product_1.barcode = 'ADJ-INDEX-001'
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/009',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        # Warm up the index
+        self.env['product.product']._get_adjustment_barcode_index(self.company.id)
+
+        Product = self.registry['product.product']
+        searched_domains = []
+        original_search = Product._search
+
+        def _search(model, domain, *args, **kwargs):
+            searched_domains.append(domain)
+            return original_search(model, domain, *args, **kwargs)
+
+        with patch.object(Product, '_search', _search):
+            adjustment.on_barcode_scanned('ADJ-INDEX-001')
+            adjustment.on_barcode_scanned('ADJ-INDEX-001')
+
+        barcode_searches = [
+            domain for domain in searched_domains
+            if any(isinstance(leaf, (list, tuple)) and leaf[0] == 'barcode' for leaf in domain)
+        ]
+        self.assertFalse(barcode_searches)
+        self.assertEqual(len(adjustment.inv_adjustment_line_info_ids), 1)
+        self.assertEqual(adjustment.inv_adjustment_line_info_ids.scanned_qty, 2.0)
+
+        # A repeated scan of a saved adjustment is an increment of the stored quantity
+        line_info_model = type(self.env['stock.adjustment.barcode.line.info'])
+        with patch.object(line_info_model, '_increment_scanned_qty', autospec=True,
+                          side_effect=line_info_model._increment_scanned_qty) as increment_scanned_qty:
+            adjustment.on_barcode_scanned('ADJ-INDEX-001')
+        increment_scanned_qty.assert_called_once()
+        self.assertEqual(adjustment.inv_adjustment_line_info_ids.scanned_qty, 3.0)
+        self.assertEqual(adjustment.inv_adjustment_line_ids.total_scanned_qty, 3.0)
+
+    def test_10_barcode_index_invalidation(self):
+        """Test that barcode changes, new products and archiving invalidate the index"""
+        Product = self.env['product.product']
+        self.product_1.barcode = 'ADJ-OLD-001'
+        self.assertEqual(Product._get_adjustment_barcode_index(self.company.id).get('ADJ-OLD-001'), self.product_1.id)
+
+        # Barcode change
+        self.product_1.barcode = 'ADJ-NEW-001'
+        index = Product._get_adjustment_barcode_index(self.company.id)
+        self.assertNotIn('ADJ-OLD-001', index)
+        self.assertEqual(index.get('ADJ-NEW-001'), self.product_1.id)
+
+        # New product with a barcode
+        product_3 = Product.create({
+            'name': 'Test Product 3',
+            'type': 'product',
+            'barcode': 'ADJ-NEW-003',
+        })
+        self.assertEqual(Product._get_adjustment_barcode_index(self.company.id).get('ADJ-NEW-003'), product_3.id)
+
+        # Archived product
+        product_3.active = False
+        self.assertNotIn('ADJ-NEW-003', Product._get_adjustment_barcode_index(self.company.id))
+
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/010',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        with self.assertRaises(UserError):
+            adjustment.on_barcode_scanned('ADJ-OLD-001')
+        adjustment.on_barcode_scanned('ADJ-NEW-001')
+        self.assertEqual(adjustment.inv_adjustment_line_info_ids.product_id, self.product_1)
+
+        # Writes leaving the barcode, the archiving and the company unchanged keep the caches
+        with patch('odoo.models.BaseModel.clear_caches') as clear_caches:
+            self.product_1.write({'name': 'Test Product 1 renamed', 'barcode': 'ADJ-NEW-001', 'active': True})
+            self.product_1.product_tmpl_id.company_id = self.product_1.product_tmpl_id.company_id
+            adjustment.disallowed_products_json = [product_3.id]
+        clear_caches.assert_not_called()
+
+    def test_11_disallowed_set_invalidation(self):
+        """Test that the disallowed products follow writes on the adjustment"""
+        self.product_1.barcode = 'ADJ-DISALLOWED-001'
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/011',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.assertFalse(adjustment._get_disallowed_product_ids())
+
+        adjustment.disallowed_products_json = [self.product_1.id]
+        self.assertEqual(adjustment._get_disallowed_product_ids(), {self.product_1.id})
+        with self.assertRaises(UserError):
+            adjustment.on_barcode_scanned('ADJ-DISALLOWED-001')
+
+        adjustment.disallowed_products_json = []
+        adjustment.on_barcode_scanned('ADJ-DISALLOWED-001')
+        self.assertEqual(adjustment.inv_adjustment_line_info_ids.product_id, self.product_1)
+
+    def test_12_ingest_scans_matches_single_scans(self):
+        """Test that a batch of buffered scans gives the same counts as single scans"""
+        self.product_1.barcode = 'ADJ-BATCH-001'
+        self.product_2.barcode = 'ADJ-BATCH-002'
+        barcodes = ['ADJ-BATCH-001', 'ADJ-BATCH-001', 'ADJ-BATCH-002', 'ADJ-BATCH-001', 'ADJ-BATCH-002']
+
+        single_adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/012/1',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        for barcode in barcodes:
+            single_adjustment.on_barcode_scanned(barcode)
+
+        batch_location = self.env['stock.location'].create({
+            'name': 'Test Batch Location',
+            'usage': 'internal',
+            'company_id': self.company.id,
+        })
+        batch_adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/012/2',
+            'location_id': batch_location.id,
+            'company_id': self.company.id,
+        })
+        result = batch_adjustment.ingest_scans([
+            {'barcode': barcode, 'ts': f'2025-01-01T10:00:{index:02d}'} for index, barcode in enumerate(barcodes)
+        ])
+        self.assertEqual(result['scans'], 5)
+        self.assertEqual(result['created'], 2)
+
+        # A second sync increments the existing rows
+        result = batch_adjustment.ingest_scans([{'barcode': 'ADJ-BATCH-002', 'qty': 3}])
+        self.assertEqual(result['updated'], 1)
+        single_adjustment.on_barcode_scanned('ADJ-BATCH-002')
+        single_adjustment.inv_adjustment_line_info_ids[-1].scanned_qty += 2
+
+        def totals(adjustment):
+            return {line.product_id: line.total_scanned_qty for line in adjustment.inv_adjustment_line_ids}
+
+        self.assertEqual(totals(batch_adjustment), totals(single_adjustment))
+        self.assertEqual(totals(batch_adjustment)[self.product_1], 3.0)
+        self.assertEqual(totals(batch_adjustment)[self.product_2], 5.0)
+
+        with self.assertRaises(UserError):
+            batch_adjustment.ingest_scans([{'barcode': 'ADJ-BATCH-UNKNOWN'}])
+
+        # Quantities must be numbers, lots must belong to the scanned product
+        with self.assertRaises(UserError):
+            batch_adjustment.ingest_scans([{'barcode': 'ADJ-BATCH-001', 'qty': 'two'}])
+        lot = self.env['stock.lot'].create({
+            'name': 'ADJ-BATCH-LOT',
+            'product_id': self.product_1.id,
+            'company_id': self.company.id,
+        })
+        with self.assertRaises(UserError):
+            batch_adjustment.ingest_scans([{'barcode': 'ADJ-BATCH-002', 'lot': lot.id}])
+
+        # Only stock managers can count on behalf of another user
+        counter = self.env['res.users'].create({
+            'name': 'Test Batch Counter',
+            'login': 'test_batch_counter',
+            'groups_id': [(6, 0, [self.env.ref('stock.group_stock_user').id])],
+        })
+        with self.assertRaises(UserError):
+            batch_adjustment.with_user(counter).ingest_scans([{'barcode': 'ADJ-BATCH-001', 'user': self.test_user.id}])
+        batch_adjustment.with_user(counter).ingest_scans([{'barcode': 'ADJ-BATCH-001', 'user': counter.id}])
+        batch_adjustment.ingest_scans([{'barcode': 'ADJ-BATCH-001', 'user': counter.id}])
+        counter_rows = batch_adjustment.inv_adjustment_line_info_ids.filtered(lambda i: i.scanned_user_id == counter)
+        self.assertEqual(sum(counter_rows.mapped('scanned_qty')), 2.0)
+
+    def test_13_post_stock_moves_by_chunks(self):
+        """Test posting creates one move per line and validates it by chunks"""
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/013',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_1.id,
+            'scanned_qty': 8.0,
+            'scanned_user_id': self.test_user.id,
+        }, {
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_2.id,
+            'scanned_qty': 25.0,
+            'scanned_user_id': self.test_user.id,
+        }])
+        adjustment.action_confirm()
+        adjustment.action_approved()
+
+        self.env['ir.config_parameter'].sudo().set_param('stock_adjustment_barcode.posting_chunk_size', '1')
+        adjustment.action_done()
+
+        self.assertEqual(adjustment.state, 'done')
+        moves = adjustment.inv_adjustment_line_ids.stock_move_ids
+        self.assertEqual(len(moves), 2)
+        self.assertTrue(all(move.state == 'done' for move in moves))
+        move_1 = moves.filtered(lambda m: m.product_id == self.product_1)
+        self.assertEqual(move_1.location_id, self.stock_location)
+        self.assertEqual(move_1.quantity_done, 2.0)
+        move_2 = moves.filtered(lambda m: m.product_id == self.product_2)
+        self.assertEqual(move_2.location_dest_id, self.stock_location)
+        self.assertEqual(move_2.quantity_done, 5.0)
+        self.assertEqual(self.product_1.with_context(location=self.stock_location.id).qty_available, 8.0)
+
+    def test_14_background_posting(self):
+        """Test queued posting processes the lines by batches and resumes from unposted lines"""
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/014',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_1.id,
+            'scanned_qty': 8.0,
+            'scanned_user_id': self.test_user.id,
+        }, {
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_2.id,
+            'scanned_qty': 25.0,
+            'scanned_user_id': self.test_user.id,
+        }])
+        adjustment.action_confirm()
+        adjustment.action_approved()
+        self.env['ir.config_parameter'].sudo().set_param('stock_adjustment_barcode.posting_chunk_size', '1')
+
+        adjustment.action_post_in_background()
+        self.assertEqual(adjustment.state, 'posting')
+        self.assertEqual(adjustment.posting_user_id, self.env.user)
+        self.assertFalse(adjustment.posting_lots_checked)
+
+        # The lots are checked by the first batch, not when queuing
+        adjustment._process_posting_batch()
+        self.assertTrue(adjustment.posting_lots_checked)
+        self.assertFalse(adjustment.inv_adjustment_line_ids.filtered('is_posted'))
+
+        # Second batch only, as if the worker was killed afterwards
+        adjustment._process_posting_batch()
+        self.assertEqual(adjustment.posting_progress, 50.0)
+        posted_line = adjustment.inv_adjustment_line_ids.filtered('is_posted')
+        self.assertEqual(len(posted_line), 1)
+
+        self.env['stock.adjustment.barcode']._cron_post_stock_adjustment()
+        self.assertEqual(adjustment.state, 'done')
+        self.assertTrue(all(adjustment.inv_adjustment_line_ids.mapped('is_posted')))
+        self.assertEqual(len(posted_line.stock_move_ids), 1)
+        self.assertEqual(len(adjustment.inv_adjustment_line_ids.stock_move_ids), 2)
+        self.assertEqual([batch['lines'] for batch in adjustment.posting_batch_log], [1, 1])
+        self.assertIn('Posting finished', adjustment.message_ids[0].body)
+
+    def test_14_background_posting_failure(self):
+        """Test a failed background posting keeps the posted lines and resumes from the unposted ones"""
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/014B',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': product.id,
+            'scanned_qty': 5.0,
+            'scanned_user_id': self.test_user.id,
+        } for product in self.product_1 | self.product_2])
+        adjustment.action_confirm()
+        adjustment.action_approved()
+        self.env['ir.config_parameter'].sudo().set_param('stock_adjustment_barcode.posting_chunk_size', '1')
+
+        # Failure before any line is posted goes back to approved
+        adjustment.action_post_in_background()
+        adjustment._fail_posting('Boom')
+        self.assertEqual(adjustment.state, 'approved')
+        self.assertEqual(adjustment.posting_error, 'Boom')
+
+        # Failure after a posted line keeps it and blocks the cancellation
+        adjustment.action_post_in_background()
+        adjustment._process_posting_batch()
+        adjustment._process_posting_batch()
+        posted_line = adjustment.inv_adjustment_line_ids.filtered('is_posted')
+        adjustment._fail_posting('Boom')
+        self.assertEqual(adjustment.state, 'posting_failed')
+        with self.assertRaises(ValidationError):
+            adjustment.action_cancel()
+
+        adjustment_model = type(self.env['stock.adjustment.barcode'])
+        with patch.object(adjustment_model, '_get_location_quant_rows', autospec=True,
+                          side_effect=adjustment_model._get_location_quant_rows) as get_location_quant_rows:
+            adjustment.action_recompute_lots()
+        self.assertNotIn(posted_line.product_id.id, get_location_quant_rows.call_args[0][1])
+
+        adjustment.action_post_in_background()
+        self.assertFalse(adjustment.posting_error)
+        self.env['stock.adjustment.barcode']._cron_post_stock_adjustment()
+        self.assertEqual(adjustment.state, 'done')
+        self.assertEqual(len(posted_line.stock_move_ids), 1)
+        self.assertEqual(len(adjustment.inv_adjustment_line_ids.stock_move_ids), 2)
+        self.assertEqual([batch['lines'] for batch in adjustment.posting_batch_log], [1, 1])
+
+    def test_15_zero_stock_lines_one_per_product(self):
+        """Test unscanned products get a single zero line even with several lots"""
+        product_lot = self.env['product.product'].create({
+            'name': 'Test Product Lots',
+            'type': 'product',
+            'categ_id': self.env.ref('product.product_category_all').id,
+            'tracking': 'lot',
+        })
+        for lot_name in ('ZERO-LOT-1', 'ZERO-LOT-2'):
+            self.env['stock.quant'].create({
+                'product_id': product_lot.id,
+                'location_id': self.stock_location.id,
+                'lot_id': self.env['stock.lot'].create({
+                    'name': lot_name,
+                    'product_id': product_lot.id,
+                    'company_id': self.company.id,
+                }).id,
+                'quantity': 3.0,
+                'company_id': self.company.id,
+            })
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/015',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.env['stock.adjustment.barcode.line.info'].create({
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_1.id,
+            'scanned_qty': 10.0,
+            'scanned_user_id': self.test_user.id,
+        })
+
+        adjustment.prepare_and_create_zero_stock_lines()
+
+        lines = adjustment.inv_adjustment_line_ids
+        self.assertEqual(len(lines.filtered(lambda l: l.product_id == self.product_1)), 1)
+        self.assertEqual(len(lines.filtered(lambda l: l.product_id == self.product_2)), 1)
+        zero_line = lines.filtered(lambda l: l.product_id == product_lot)
+        self.assertEqual(len(zero_line), 1)
+        self.assertEqual(zero_line.total_scanned_qty, 0.0)
+        self.assertEqual(len(zero_line.adjustment_line_info_ids), 1)
+
+        # Running it again does not duplicate the lines
+        adjustment.prepare_and_create_zero_stock_lines()
+        self.assertEqual(adjustment.inv_adjustment_line_ids, lines)
+
+        # Only the products whose lots sum up to zero are selected when setting zero values
+        self.env['stock.quant'].create({
+            'product_id': product_lot.id,
+            'location_id': self.stock_location.id,
+            'lot_id': self.env['stock.lot'].create({
+                'name': 'ZERO-LOT-3',
+                'product_id': product_lot.id,
+                'company_id': self.company.id,
+            }).id,
+            'quantity': -6.0,
+            'company_id': self.company.id,
+        })
+        other_adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/015B',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.assertEqual(
+            other_adjustment.with_context(avoid_zero_lines=True)._get_zero_stock_product_ids(), [product_lot.id])
+
+    def test_16_scan_batches_replayed_once(self):
+        """Test offline scan batches are replayed in order and ignored when sent again"""
+        self.product_1.barcode = 'ADJ-SYNC-001'
+        self.product_2.barcode = 'ADJ-SYNC-002'
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/016',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        batches = [
+            {'client_batch_id': 'device-1/2', 'device_id': 'device-1', 'sequence': 2,
+             'scans': [{'barcode': 'ADJ-SYNC-002', 'qty': 2}]},
+            {'client_batch_id': 'device-1/1', 'device_id': 'device-1', 'sequence': 1,
+             'scans': [{'barcode': 'ADJ-SYNC-001'}, {'barcode': 'ADJ-SYNC-001'}]},
+            {'client_batch_id': 'device-1/3', 'device_id': 'device-1', 'sequence': 3,
+             'scans': [{'barcode': 'UNKNOWN-BARCODE'}]},
+        ]
+        statuses = adjustment.sync_scan_batches(batches)
+        self.assertEqual([status['status'] for status in statuses], ['done', 'done', 'error'])
+
+        # The device did not get the answer and sends everything again
+        statuses = adjustment.sync_scan_batches(batches)
+        self.assertEqual([status['status'] for status in statuses], ['duplicate', 'duplicate', 'error'])
+
+        lines = adjustment.inv_adjustment_line_ids
+        self.assertEqual(lines.filtered(lambda l: l.product_id == self.product_1).total_scanned_qty, 2.0)
+        self.assertEqual(lines.filtered(lambda l: l.product_id == self.product_2).total_scanned_qty, 2.0)
+        self.assertEqual(adjustment.scan_batch_count, 3)
+        self.assertEqual(len(adjustment.scan_batch_ids.filtered(lambda b: b.state == 'error')), 1)
+
+        # Replay throughput of a large buffered batch
+        scans = [{'barcode': 'ADJ-SYNC-001' if index % 2 else 'ADJ-SYNC-002'} for index in range(5000)]
+        start = time.perf_counter()
+        statuses = adjustment.sync_scan_batches([{'client_batch_id': 'device-2/1', 'device_id': 'device-2', 'scans': scans}])
+        duration = time.perf_counter() - start
+        _logger.info("Replayed %s scans in %.3fs (%.0f scans/s)", len(scans), duration, len(scans) / duration)
+        self.assertEqual(statuses[0]['status'], 'done')
+        self.assertEqual(sum(adjustment.inv_adjustment_line_ids.mapped('total_scanned_qty')), 5004.0)
+
+    def test_17_variation_report_snapshot(self):
+        """Test the variation report rows and total are computed in SQL and kept once the adjustment is done"""
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/017',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_1.id,
+            'scanned_qty': 8.0,
+            'scanned_user_id': self.test_user.id,
+        }, {
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_2.id,
+            'scanned_qty': 25.0,
+            'scanned_user_id': self.test_user.id,
+        }])
+
+        # The report of a draft adjustment computes the differences from the counts without writing them
+        lines = adjustment.inv_adjustment_line_ids.sorted('id')
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE stock_adjustment_barcode_line SET difference_qty = 0 WHERE inv_adjustment_id = %s",
+                            [adjustment.id])
+        lines.invalidate_recordset(['difference_qty'])
+        data = adjustment._get_variation_report_data()
+        self.assertEqual([row['difference_qty'] for row in data['rows']],
+                         [8.0 - lines[0].on_hand_qty, 25.0 - lines[1].on_hand_qty])
+        self.assertEqual(lines.mapped('difference_qty'), [0.0, 0.0])
+
+        adjustment.action_confirm()
+        adjustment.action_approved()
+
+        data = adjustment._get_variation_report_data()
+        self.assertEqual([row['product_id'] for row in data['rows']], lines.product_id.ids)
+        self.assertEqual(data['rows'][0]['product_name'], self.product_1.display_name)
+        self.assertEqual([row['difference_qty'] for row in data['rows']], [-2.0, 5.0])
+        self.assertAlmostEqual(data['total'], sum(line.difference_qty * line.unit_price for line in lines))
+        self.assertFalse(adjustment.variation_report_snapshot)
+
+        csv_content = adjustment._get_variation_report_csv().decode()
+        self.assertEqual(len(csv_content.splitlines()), 3)
+        self.assertIn(self.product_2.display_name, csv_content)
+        self.assertTrue(adjustment._get_variation_report_xlsx())
+
+        adjustment.action_done()
+        data = adjustment._get_variation_report_data()
+        self.assertEqual(adjustment.variation_report_snapshot['state'], 'done')
+
+        # Reprinting a done adjustment does not read the lines again
+        self.env.cr.execute("UPDATE stock_adjustment_barcode_line SET difference_qty = 0 WHERE inv_adjustment_id = %s",
+                            [adjustment.id])
+        self.assertEqual(adjustment._get_variation_report_data(), data)
+        report = self.env['report.stock_adjustment_barcode.stock_variation_report']._get_report_values(adjustment.ids)
+        self.assertEqual(report['rows'], data['rows'])
+
+        # The kept rows are named in the language of each reader
+        self.env['res.lang']._activate_lang('fr_FR')
+        self.product_1.with_context(lang='fr_FR').name = 'Produit de test 1'
+        rows_fr = adjustment.with_context(lang='fr_FR')._get_variation_report_data()['rows']
+        self.assertEqual(rows_fr[0]['product_name'], self.product_1.with_context(lang='fr_FR').display_name)
+        rows_en = adjustment.with_context(lang='en_US')._get_variation_report_data()['rows']
+        self.assertEqual(rows_en[0]['product_name'], self.product_1.with_context(lang='en_US').display_name)
+        self.assertNotIn('product_name', adjustment.variation_report_snapshot['rows'][0])
+
+    def test_18_cycle_count_plan(self):
+        """Test a cycle count plan splits the location into sub-counts restricted to their shard"""
+        category = self.env['product.category'].create({'name': 'Cycle Count Category'})
+        self.product_2.categ_id = category
+        self.product_1.barcode = 'ADJ-PLAN-001'
+        self.product_2.barcode = 'ADJ-PLAN-002'
+        plan = self.env['stock.adjustment.barcode.plan'].create({
+            'name': 'TEST/PLAN/018',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+            'split_by': 'category',
+        })
+        plan.action_generate_adjustments()
+        self.assertEqual(plan.state, 'in_progress')
+        self.assertEqual(plan.adjustment_count, 2)
+        self.assertEqual(plan.adjustment_ids.location_id, self.stock_location)
+        sub_count_1 = plan.adjustment_ids.filtered(lambda a: a.scope_categ_ids == self.product_1.categ_id)
+        sub_count_2 = plan.adjustment_ids - sub_count_1
+
+        with self.assertRaises(ValidationError):
+            self.env['stock.adjustment.barcode'].create({
+                'name': 'TEST/ADJ/018',
+                'location_id': self.stock_location.id,
+                'company_id': self.company.id,
+            })
+        with self.assertRaises(UserError):
+            sub_count_1.ingest_scans([{'barcode': 'ADJ-PLAN-002'}])
+
+        sub_count_1.ingest_scans([{'barcode': 'ADJ-PLAN-001', 'qty': 8}])
+        plan.action_confirm_adjustments()
+        self.assertEqual(sub_count_1.state, 'to_approve')
+        self.assertEqual(sub_count_1.inv_adjustment_line_ids.product_id, self.product_1)
+        self.assertEqual(sub_count_2.state, 'draft')
+
+        sub_count_2.with_context(avoid_zero_lines=True).action_confirm()
+        self.assertFalse(sub_count_2.inv_adjustment_line_ids.product_id - self.product_2)
+
+        abc_plan = self.env['stock.adjustment.barcode.plan'].new({
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+            'split_by': 'abc',
+        })
+        classes = abc_plan._get_abc_classes(self.product_1 | self.product_2, {self.product_1.id: 10.0, self.product_2.id: 20.0})
+        self.assertEqual(classes, {'A': self.product_2.ids, 'B': self.product_1.ids, 'C': []})
+
+    def test_19_phase_timings(self):
+        """Test the phases of the adjustment lifecycle are timed and exported"""
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/019',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_1.id,
+            'scanned_qty': 8.0,
+            'scanned_user_id': self.test_user.id,
+        }, {
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_2.id,
+            'scanned_qty': 25.0,
+            'scanned_user_id': self.test_user.id,
+        }])
+        adjustment.action_confirm()
+        adjustment.action_approved()
+        self.env['ir.config_parameter'].sudo().set_param('stock_adjustment_barcode.slow_phase_threshold', '-1')
+        adjustment.action_done()
+
+        phases = adjustment.timing_ids.mapped('phase')
+        for phase in ('confirm', 'done', 'create_stock_move', 'stock_moves_create', 'stock_moves_action_done'):
+            self.assertIn(phase, phases)
+        confirm = adjustment.timing_ids.filtered(lambda t: t.phase == 'confirm')
+        self.assertEqual(confirm.row_count, 2)
+        self.assertGreater(confirm.query_count, 0)
+        self.assertEqual(adjustment.timing_count, len(adjustment.timing_ids))
+        self.assertTrue(any('Slow done' in body for body in adjustment.message_ids.mapped('body')))
+
+        export = adjustment._get_timings_export()
+        self.assertEqual(export['line_count'], 2)
+        self.assertEqual(len(export['timings']), len(adjustment.timing_ids))
+        self.assertEqual(export['timings'][0]['phase'], 'confirm')
+
+    def test_20_valuation_accounting_dates(self):
+        """Test one batch of valuation layers gets the accounting date of the adjustment of each layer"""
+        category_all = self.env.ref('product.product_category_all')
+        if not category_all.property_stock_valuation_account_id or not category_all.property_stock_journal:
+            self.skipTest("No chart of accounts installed")
+        category = self.env['product.category'].create({
+            'name': 'Test Real Time Valuation',
+            'property_cost_method': 'standard',
+            'property_valuation': 'manual_periodic',
+            'property_stock_valuation_account_id': category_all.property_stock_valuation_account_id.id,
+            'property_stock_account_input_categ_id': category_all.property_stock_account_input_categ_id.id,
+            'property_stock_account_output_categ_id': category_all.property_stock_account_output_categ_id.id,
+            'property_stock_journal': category_all.property_stock_journal.id,
+        })
+        product = self.env['product.product'].create({
+            'name': 'Test Valued Product',
+            'type': 'product',
+            'categ_id': category.id,
+            'standard_price': 10.0,
+        })
+
+        adjustments = self.env['stock.adjustment.barcode']
+        for name, scanned_qty, accounting_date in (('TEST/ADJ/020A', 3.0, '2026-01-15'),
+                                                   ('TEST/ADJ/020B', 4.0, '2026-02-20')):
+            adjustment = self.env['stock.adjustment.barcode'].create({
+                'name': name,
+                'location_id': self.stock_location.id,
+                'company_id': self.company.id,
+                'force_accounting_date': accounting_date,
+            })
+            self.env['stock.adjustment.barcode.line.info'].create({
+                'inv_adjustment_id': adjustment.id,
+                'product_id': product.id,
+                'scanned_qty': scanned_qty,
+                'scanned_user_id': self.test_user.id,
+            })
+            adjustment.action_confirm()
+            adjustment.action_approved()
+            adjustment.action_done()
+            adjustments |= adjustment
+
+        other_move = self.env['stock.move'].create({
+            'name': 'Test Receipt',
+            'product_id': product.id,
+            'product_uom': product.uom_id.id,
+            'product_uom_qty': 2.0,
+            'location_id': self.env.ref('stock.stock_location_suppliers').id,
+            'location_dest_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        other_move._action_confirm()
+        other_move.quantity_done = 2.0
+        other_move._action_done()
+
+        # Layers are valued without entries, then validated together in one batch
+        adjustment_moves = adjustments.inv_adjustment_line_ids.stock_move_ids
+        svls = (adjustment_moves | other_move).stock_valuation_layer_ids
+        self.assertEqual(len(svls), 3)
+        self.assertFalse(svls.account_move_id)
+        category.property_valuation = 'real_time'
+        svls._validate_accounting_entries()
+
+        for adjustment in adjustments:
+            account_move = adjustment.inv_adjustment_line_ids.stock_move_ids.account_move_ids
+            self.assertEqual(len(account_move), 1)
+            self.assertEqual(account_move.date, adjustment.force_accounting_date)
+        self.assertEqual(len(other_move.account_move_ids), 1)
+        self.assertEqual(other_move.account_move_ids.date, fields.Date.context_today(other_move))
+
+    def test_21_scan_screen_onchange(self):
+        """Test the scans of the scan screen, an onchange of the saved adjustment, increment the stored rows"""
+        self.product_1.barcode = 'ADJ-FORM-001'
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/ADJ/021',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        line_info_obj = self.env['stock.adjustment.barcode.line.info']
+
+        with Form(adjustment, view='stock_adjustment_barcode.stock_adjustment_barcode_scan_form_view') as form:
+            form._barcode_scanned = 'ADJ-FORM-001'
+            line_info = line_info_obj.search([('inv_adjustment_id', '=', adjustment.id)])
+            self.assertEqual(line_info.scanned_qty, 1.0)
+
+            # Another scan of the same row is stored while the form is open
+            line_info._increment_scanned_qty({line_info.id: 5.0})
+
+            line_info_model = type(line_info_obj)
+            with patch.object(line_info_model, '_increment_scanned_qty', autospec=True,
+                              side_effect=line_info_model._increment_scanned_qty) as increment_scanned_qty:
+                form._barcode_scanned = 'ADJ-FORM-001'
+            increment_scanned_qty.assert_called_once()
+            line_info.invalidate_recordset(['scanned_qty'])
+            self.assertEqual(line_info.scanned_qty, 7.0)
+
+        # Saving the form does not write back the quantity it was opened with
+        self.assertEqual(adjustment.inv_adjustment_line_info_ids, line_info)
+        self.assertEqual(line_info.scanned_qty, 7.0)
+        line = line_info.inv_adjustment_line_id
+        self.assertEqual(line.difference_qty, 7.0 - line.on_hand_qty)
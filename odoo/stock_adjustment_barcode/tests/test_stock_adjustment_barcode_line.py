@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 
+from unittest.mock import patch
+
 from odoo.tests.common import TransactionCase
 from odoo.exceptions import ValidationError
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 class TestStockAdjustmentBarcodeLine(TransactionCase):
@@ -156,3 +158,247 @@ class TestStockAdjustmentBarcodeLine(TransactionCase):
         self.assertLess(child_line_1.display_sequence, child_line_2.display_sequence)
 
     # Removed test_06 and test_07 - Complex BOM tests that need more setup
+
+    def test_08_batched_product_qty(self):
+        """Test on hand quantities computed for several lines at once"""
+        line_no_lot, line_lot = self.env['stock.adjustment.barcode.line'].create([{
+            'inv_adjustment_id': self.adjustment.id,
+            'product_id': self.product_1.id,
+        }, {
+            'inv_adjustment_id': self.adjustment.id,
+            'product_id': self.product_with_lot.id,
+            'lot_id': self.lot_1.id,
+        }])
+        self.assertEqual(line_no_lot.on_hand_qty, 10.0)
+        self.assertEqual(line_lot.on_hand_qty, 15.0)
+        self.assertEqual(line_lot.forecast_qty, 15.0)
+
+        # Refresh picks up new stock for all lines
+        self.env['stock.quant'].create({
+            'product_id': self.product_1.id,
+            'location_id': self.stock_location.id,
+            'quantity': 5.0,
+            'company_id': self.company.id,
+        })
+        self.adjustment.action_refresh_stock()
+        self.assertEqual(line_no_lot.on_hand_qty, 15.0)
+        self.assertEqual(line_no_lot.difference_qty, -15.0)
+        self.assertEqual(line_lot.on_hand_qty, 15.0)
+
+    def test_09_recompute_lots(self):
+        """Test lot lines recomputed for all lines from one quant read"""
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/LINE/RECOMPUTE',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_1.id,
+            'scanned_qty': 4.0,
+            'scanned_user_id': self.test_user.id,
+        }, {
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_with_lot.id,
+            'lot_id': self.lot_1.id,
+            'scanned_qty': 15.0,
+            'scanned_user_id': self.test_user.id,
+        }])
+        line_no_lot = adjustment.inv_adjustment_line_ids.filtered(lambda l: l.product_id == self.product_1)
+        line_lot = adjustment.inv_adjustment_line_ids.filtered(lambda l: l.product_id == self.product_with_lot)
+
+        adjustment.action_recompute_lots()
+        self.assertTrue(adjustment.is_recompute)
+        self.assertEqual(line_lot.adjustment_line_lot_ids.lot_id, self.lot_1)
+        self.assertEqual(line_lot.adjustment_line_lot_ids.current_qty, 15.0)
+
+        # Second pass takes the missing quantity from the quant of the location
+        adjustment.action_recompute_lots()
+        self.assertEqual(len(line_no_lot.adjustment_line_lot_ids), 1)
+        self.assertEqual(line_no_lot.adjustment_line_lot_ids.current_qty, 10.0)
+        self.assertEqual(line_no_lot.adjustment_line_lot_ids.new_qty, 4.0)
+        self.assertEqual(line_no_lot.on_hand_qty, 10.0)
+        self.assertFalse(line_no_lot.is_editable)
+
+    def test_10_adjustment_quant_rows(self):
+        """Test quant rows read for the adjustment in pages of products, grouped by lot or per quant"""
+        child_location = self.env['stock.location'].create({
+            'name': 'Test Child Location',
+            'usage': 'internal',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.env['stock.quant'].create({
+            'product_id': self.product_with_lot.id,
+            'location_id': child_location.id,
+            'lot_id': self.lot_1.id,
+            'quantity': 5.0,
+            'company_id': self.company.id,
+        })
+        quant_obj = self.env['stock.quant']
+
+        rows = list(quant_obj._read_adjustment_quant_rows(self.stock_location, product_ids=self.product_with_lot.ids))
+        self.assertEqual([(row.product_id, row.lot_id, row.qty) for row in rows], [(self.product_with_lot.id, self.lot_1.id, 15.0)])
+
+        rows = list(quant_obj._read_adjustment_quant_rows(
+            self.stock_location, company_id=self.company.id, product_ids=self.product_with_lot.ids,
+            include_children=True, group_by_lot=False, batch_size=1))
+        self.assertEqual(sorted(row.qty for row in rows), [5.0, 15.0])
+
+        rows = list(quant_obj._read_adjustment_quant_rows(self.stock_location, include_children=True))
+        self.assertEqual({row.product_id: row.qty for row in rows}, {self.product_1.id: 10.0, self.product_with_lot.id: 20.0})
+
+        # Pages of one product are read through the transaction cursor, their queries are counted
+        query_count = self.env.cr.sql_log_count
+        paged_rows = list(quant_obj._read_adjustment_quant_rows(self.stock_location, include_children=True, batch_size=1))
+        self.assertEqual(paged_rows, rows)
+        self.assertGreaterEqual(self.env.cr.sql_log_count - query_count, 3)
+
+        self.assertFalse(list(quant_obj._read_adjustment_quant_rows(self.stock_location, product_ids=[])))
+        self.env.cr.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'stock_quant_location_company_product_index'")
+        self.assertTrue(self.env.cr.fetchone())
+
+    def test_11_lines_list_action(self):
+        """Test the paginated lines list is restricted to the adjustment and searchable by error lines"""
+        line_ok, line_error = self.env['stock.adjustment.barcode.line'].create([{
+            'inv_adjustment_id': self.adjustment.id,
+            'product_id': self.product_1.id,
+        }, {
+            'inv_adjustment_id': self.adjustment.id,
+            'product_id': self.product_with_lot.id,
+            'is_editable': True,
+        }])
+        self.assertEqual(self.adjustment.inv_adjustment_line_count, 2)
+
+        action = self.adjustment.action_view_lines()
+        self.assertEqual(action['res_model'], 'stock.adjustment.barcode.line')
+        lines = self.env['stock.adjustment.barcode.line'].search(action['domain'], order='display_sequence, id')
+        self.assertEqual(lines, line_ok | line_error)
+        self.assertEqual(lines.filtered_domain([('is_editable', '=', True)]), line_error)
+
+    def test_12_stock_at_inventory_date(self):
+        """Test the stock at the inventory date rolls back the moves done since then"""
+        self.adjustment.inventory_date = datetime.now() - timedelta(days=1)
+        line = self.env['stock.adjustment.barcode.line'].create({
+            'inv_adjustment_id': self.adjustment.id,
+            'product_id': self.product_1.id,
+        })
+        move = self.env['stock.move'].create({
+            'name': 'Delivery after the count',
+            'product_id': self.product_1.id,
+            'product_uom': self.product_1.uom_id.id,
+            'product_uom_qty': 4.0,
+            'location_id': self.stock_location.id,
+            'location_dest_id': self.env.ref('stock.stock_location_customers').id,
+        })
+        move._action_confirm()
+        move._action_assign()
+        move.quantity_done = 4.0
+        move._action_done()
+
+        self.adjustment.action_refresh_stock()
+        self.assertEqual(line.on_hand_qty, 6.0)
+
+        self.adjustment.stock_at_date = True
+        self.assertEqual(line.on_hand_qty, 10.0)
+        rows = self.env['stock.quant']._read_adjustment_quant_rows_at_date(
+            self.stock_location, self.adjustment.inventory_date, product_ids=self.product_with_lot.ids)
+        self.assertEqual([(row.product_id, row.lot_id, row.qty) for row in rows], [(self.product_with_lot.id, self.lot_1.id, 15.0)])
+
+    def test_13_stock_at_date_from_snapshot(self):
+        """Test the stock at date starts from the closest daily snapshot"""
+        snapshot_obj = self.env['stock.adjustment.barcode.quant.snapshot']
+        snapshot_obj._cron_take_snapshot()
+        snapshot_obj._cron_take_snapshot()
+        snapshots = snapshot_obj.search([('location_id', '=', self.stock_location.id)])
+        self.assertEqual(len(snapshots), 2)
+        self.assertEqual(snapshots.filtered(lambda s: s.product_id == self.product_1).quantity, 10.0)
+
+        # The snapshot becomes two days old, a delivery is done after it
+        self.env.cr.execute("""
+            UPDATE stock_adjustment_barcode_quant_snapshot
+            SET snapshot_date = snapshot_date - INTERVAL '2 days', quantity = quantity + 2
+            WHERE location_id = %s
+        """, [self.stock_location.id])
+        snapshot_obj.invalidate_model()
+        move = self.env['stock.move'].create({
+            'name': 'Delivery after the snapshot',
+            'product_id': self.product_1.id,
+            'product_uom': self.product_1.uom_id.id,
+            'product_uom_qty': 4.0,
+            'location_id': self.stock_location.id,
+            'location_dest_id': self.env.ref('stock.stock_location_customers').id,
+        })
+        move._action_confirm()
+        move._action_assign()
+        move.quantity_done = 4.0
+        move._action_done()
+
+        quant_obj = self.env['stock.quant']
+        now = datetime.now()
+        rows = quant_obj._read_adjustment_quant_rows_at_date(self.stock_location, now - timedelta(hours=36), self.product_1.ids)
+        self.assertEqual([row.qty for row in rows], [12.0])
+        rows = quant_obj._read_adjustment_quant_rows_at_date(self.stock_location, now - timedelta(hours=1), self.product_1.ids)
+        self.assertEqual([row.qty for row in rows], [10.0])
+
+    def test_14_get_or_create_lines(self):
+        """Test the lines inserted for new keys get the ORM defaults and their computed fields"""
+        line_obj = self.env['stock.adjustment.barcode.line']
+        keys = [(self.product_1.id, False), (self.product_with_lot.id, self.lot_1.id)]
+        line_by_key = line_obj._get_or_create_line_ids(self.adjustment, keys)
+        self.assertEqual(set(line_by_key), set(keys))
+
+        lines = line_obj.browse(line_by_key.values())
+        self.assertEqual(self.adjustment.inv_adjustment_line_ids, lines)
+        self.assertEqual(lines.company_id, self.adjustment.company_id)
+        self.assertEqual(lines.mapped('display_sequence'), [1000000, 1000000])
+        self.assertFalse(any(lines.mapped('is_editable')))
+        line_1 = lines.filtered(lambda l: l.product_id == self.product_1)
+        self.assertEqual(line_1.on_hand_qty, 10.0)
+        self.assertEqual(line_1.difference_qty, -10.0)
+
+        # Existing keys are returned without inserting anything
+        self.assertEqual(line_obj._get_or_create_line_ids(self.adjustment, keys), line_by_key)
+        self.assertEqual(len(self.adjustment.inv_adjustment_line_ids), 2)
+
+    def test_15_confirm_lots_in_one_read(self):
+        """Test the lot lines of all the lines are set on confirmation from one quant read and one create"""
+        adjustment = self.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/LINE/CONFIRM',
+            'location_id': self.stock_location.id,
+            'company_id': self.company.id,
+        })
+        self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_1.id,
+            'scanned_qty': 4.0,
+            'scanned_user_id': self.test_user.id,
+        }, {
+            'inv_adjustment_id': adjustment.id,
+            'product_id': self.product_with_lot.id,
+            'lot_id': self.lot_1.id,
+            'scanned_qty': 12.0,
+            'scanned_user_id': self.test_user.id,
+        }])
+
+        adjustment_model = type(adjustment)
+        lot_line_model = type(self.env['stock.adjustment.barcode.lot.line'])
+        with patch.object(adjustment_model, '_get_location_quant_rows', autospec=True,
+                          side_effect=adjustment_model._get_location_quant_rows) as get_location_quant_rows, \
+                patch.object(lot_line_model, 'create', autospec=True,
+                             side_effect=lot_line_model.create) as lot_line_create:
+            adjustment.action_confirm()
+        get_location_quant_rows.assert_called_once()
+        lot_line_create.assert_called_once()
+
+        line_no_lot = adjustment.inv_adjustment_line_ids.filtered(lambda l: l.product_id == self.product_1)
+        line_lot = adjustment.inv_adjustment_line_ids.filtered(lambda l: l.product_id == self.product_with_lot)
+        self.assertEqual(adjustment.state, 'to_approve')
+        self.assertEqual(line_no_lot.adjustment_line_lot_ids.mapped('difference_qty'), [-6.0])
+        self.assertEqual(line_lot.adjustment_line_lot_ids.lot_id, self.lot_1)
+        self.assertEqual(line_lot.adjustment_line_lot_ids.mapped('difference_qty'), [-3.0])
+
+        # Confirming again replaces the lot lines instead of adding to them
+        adjustment.inv_adjustment_line_ids.set_lot_on_adjustment_line_ids()
+        self.assertEqual(len(line_no_lot.adjustment_line_lot_ids), 1)
+        self.assertEqual(len(line_lot.adjustment_line_lot_ids), 1)
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from unittest.mock import patch
+
 from odoo.tests.common import TransactionCase
 from odoo.exceptions import ValidationError
 from datetime import datetime
@@ -234,4 +236,45 @@ class TestStockAdjustmentBarcodeLineInfo(TransactionCase):
                 'scanned_user_id': self.test_user_2.id,
             })
         
-        self.assertIn('lot number', str(cm.exception))
\ No newline at end of file
+        self.assertIn('lot number', str(cm.exception))
+
+    def test_10_scanned_total_read_from_rows(self):
+        """Test the line total is read from the scanned rows and that scans only refresh the line difference"""
+        line_obj = self.env['stock.adjustment.barcode.line']
+        uom_dozen = self.env.ref('uom.product_uom_dozen')
+        info_1, info_2 = self.env['stock.adjustment.barcode.line.info'].create([{
+            'inv_adjustment_id': self.adjustment.id,
+            'product_id': self.product_1.id,
+            'scanned_qty': 2.0,
+            'scanned_user_id': self.test_user_1.id,
+        }, {
+            'inv_adjustment_id': self.adjustment.id,
+            'product_id': self.product_1.id,
+            'scanned_qty': 3.0,
+            'scanned_user_id': self.test_user_2.id,
+        }])
+        line = info_1.inv_adjustment_line_id
+        self.assertEqual(line.total_scanned_qty, 5.0)
+        self.assertEqual(line.difference_qty, 5.0 - line.on_hand_qty)
+        line.flush_recordset()
+
+        with patch.object(type(line_obj), '_compute_product_qty') as compute_product_qty, \
+                patch.object(type(line_obj), 'write') as line_write:
+            info_1.scanned_qty += 1
+            self.assertEqual(line.difference_qty, 6.0 - line.on_hand_qty)
+            info_2._increment_scanned_qty({info_2.id: 4.0})
+            self.assertEqual(line.difference_qty, 13.0 - line.on_hand_qty)
+            info_2.write({'product_uom_id': uom_dozen.id, 'scanned_qty': 1.0})
+            self.assertEqual(line.total_scanned_qty, 15.0)
+            self.assertEqual(line.difference_qty, 15.0 - line.on_hand_qty)
+            info_1.unlink()
+            self.assertEqual(line.total_scanned_qty, 12.0)
+            self.assertEqual(line.difference_qty, 12.0 - line.on_hand_qty)
+            self.env.flush_all()
+            compute_product_qty.assert_not_called()
+            line_write.assert_not_called()
+
+        # The stored difference is what the filters and the grouped sums read
+        with_difference = line_obj.search([('inv_adjustment_id', '=', self.adjustment.id), ('difference_qty', '!=', 0)])
+        self.assertEqual(with_difference, line)
+        self.assertEqual(line.get_total_qty(), 12.0)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import tagged
+from odoo.tests.common import HttpCase
+
+
+@tagged('post_install', '-at_install')
+class TestVariationReportDownload(HttpCase):
+    """Test the download of the stock variation report through the controller"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env.company
+        warehouse = cls.env['stock.warehouse'].search([('company_id', '=', cls.company.id)], limit=1)
+        cls.stock_location = cls.env['stock.location'].create({
+            'name': 'Test Download Location',
+            'usage': 'internal',
+            'warehouse_id': warehouse.id,
+            'company_id': cls.company.id,
+        })
+        cls.product = cls.env['product.product'].create({
+            'name': 'Test Download Product',
+            'type': 'product',
+            'categ_id': cls.env.ref('product.product_category_all').id,
+        })
+        cls.env['stock.quant'].create({
+            'product_id': cls.product.id,
+            'location_id': cls.stock_location.id,
+            'quantity': 4.0,
+            'company_id': cls.company.id,
+        })
+        cls.adjustment = cls.env['stock.adjustment.barcode'].create({
+            'name': 'TEST/DOWNLOAD/001',
+            'location_id': cls.stock_location.id,
+            'company_id': cls.company.id,
+        })
+        cls.env['stock.adjustment.barcode.line.info'].create({
+            'inv_adjustment_id': cls.adjustment.id,
+            'product_id': cls.product.id,
+            'scanned_qty': 7.0,
+            'scanned_user_id': cls.env.ref('base.user_admin').id,
+        })
+        cls.adjustment.action_confirm()
+
+    def test_01_download_csv(self):
+        """Test the CSV report is downloaded in full with the rows of the adjustment"""
+        self.authenticate('admin', 'admin')
+        response = self.url_open('/stock_adjustment_barcode/%s/variation_report.csv' % self.adjustment.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/csv'))
+        self.assertIn('TEST_DOWNLOAD_001.csv', response.headers['Content-Disposition'])
+        self.assertEqual(response.content, self.adjustment._get_variation_report_csv())
+
+        rows = response.content.decode().splitlines()
+        self.assertEqual(len(rows), 2)
+        self.assertIn(self.product.display_name, rows[1])
+        self.assertIn('3.0', rows[1])
+
+    def test_02_download_unknown_adjustment(self):
+        """Test an unknown adjustment is not found"""
+        self.authenticate('admin', 'admin')
+        response = self.url_open('/stock_adjustment_barcode/0/variation_report.csv')
+        self.assertEqual(response.status_code, 404)
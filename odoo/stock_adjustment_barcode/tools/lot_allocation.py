@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+from datetime import datetime
+
+from odoo.tools import float_compare, float_round
+
+# Quant as read from the location: stock_quant id, lot id, quantity and incoming date
+QuantRow = namedtuple('QuantRow', ['quant_id', 'lot_id', 'qty', 'in_date'])
+
+# Resulting lot line of an adjustment line
+LotAllocation = namedtuple('LotAllocation', ['lot_id', 'new_qty', 'current_qty'])
+
+
+def allocate_lots(quant_rows, scanned_qty, difference, precision_digits=2):
+    """
+    Distributes a scanned quantity over the quants of a location, oldest first.
+    Works on plain (quant_id, lot_id, qty, in_date) tuples so that it can run on hundreds of lots
+    without recordset overhead.
+
+    - Negative quants are reset to 0, the first one receiving the scanned quantity when all quants are negative.
+    - A positive difference is added to the oldest positive quant.
+    - A negative difference is taken from the positive quants in FIFO order until it is consumed.
+    - Quants that are not touched keep their quantity.
+
+    Args:
+        quant_rows: Iterable of (quant_id, lot_id, qty, in_date)
+        scanned_qty: Total scanned quantity of the line
+        difference: Quantity to add (positive) or remove (negative) on the positive quants
+        precision_digits: Precision of the unit of measure
+    Returns:
+        List of LotAllocation: negative quants, then allocated positive quants, then untouched quants,
+        each group in FIFO order except the untouched quants which keep their input order.
+    """
+    quant_rows = [QuantRow(*quant_row) for quant_row in quant_rows]
+
+    positive_quants = []
+    negative_quants = []
+    for quant_row in sorted(quant_rows, key=lambda q: q.in_date or datetime.min):
+        if quant_row.qty > 0:
+            positive_quants.append(quant_row)
+        elif quant_row.qty < 0:
+            negative_quants.append(quant_row)
+
+    allocations = []
+    applied_quant_ids = set()
+
+    all_negative_quants = negative_quants and not positive_quants
+    for index, quant_row in enumerate(negative_quants):
+        new_qty = scanned_qty if all_negative_quants and index == 0 else 0
+        allocations.append(LotAllocation(quant_row.lot_id, new_qty, quant_row.qty))
+        applied_quant_ids.add(quant_row.quant_id)
+
+    if positive_quants:
+        if float_compare(difference, 0, precision_digits=precision_digits) > 0:
+            first_quant = positive_quants[0]
+            allocations.append(LotAllocation(first_quant.lot_id, first_quant.qty + difference, first_quant.qty))
+            applied_quant_ids.add(first_quant.quant_id)
+        else:
+            taken_qty = float_round(abs(difference), precision_digits=precision_digits)
+            for quant_row in positive_quants:
+                if float_compare(taken_qty, 0, precision_digits=precision_digits) <= 0:
+                    break
+                new_qty = float_round(max(0, quant_row.qty - taken_qty), precision_digits=precision_digits)
+                allocations.append(LotAllocation(quant_row.lot_id, new_qty, quant_row.qty))
+                applied_quant_ids.add(quant_row.quant_id)
+                taken_qty = float_round(taken_qty - quant_row.qty, precision_digits=precision_digits)
+
+    for quant_row in quant_rows:
+        if quant_row.quant_id not in applied_quant_ids:
+            allocations.append(LotAllocation(quant_row.lot_id, quant_row.qty, quant_row.qty))
+
+    return allocations
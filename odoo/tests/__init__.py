@@ -5,4 +5,5 @@ from . import test_negative_stock
 from . import test_lot_selection
 from . import test_refresh_stock
 from . import test_workflow
-from . import test_stock_posting
\ No newline at end of file
+from . import test_stock_posting
+from . import test_benchmark
\ No newline at end of file
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.addons.stock_adjustment_barcode.models.stock_adjustment_barcode import StockAdjustmentBarcode
+from odoo.addons.stock_adjustment_barcode.tools.lot_allocation import allocate_lots
+from .test_stock_adjustment_barcode_base import TestStockAdjustmentBarcodeBase
+
+_logger = logging.getLogger(__name__)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+
+
+@tagged('-standard', 'stock_adjustment_barcode_benchmark')
+class TestStockAdjustmentBarcodeBenchmark(TestStockAdjustmentBarcodeBase):
+    """Benchmark of the adjustment lifecycle on generated locations of 1k, 10k and 100k lines.
+
+    Each phase is timed and its queries counted, then compared with benchmark_baseline.json:
+    the test fails when a phase is slower or runs more queries than its baseline allows.
+    The baseline is recorded on the machine running the benchmarks and is not committed.
+    Run it explicitly with --test-tags stock_adjustment_barcode_benchmark. Environment variables:
+    - STOCK_ADJUSTMENT_BENCHMARK_SIZES: sizes to run, default 1000, e.g. 1000,10000,100000
+    - STOCK_ADJUSTMENT_BENCHMARK_UPDATE: set to 1 to store the measures as the new baseline
+    - STOCK_ADJUSTMENT_BENCHMARK_TOLERANCE: allowed slowdown of the durations, default 0.5 (50%)
+    """
+
+    # Shape of the generated locations, relative to the number of SKUs
+    lot_product_every = 10      # One product out of 10 is tracked by lots
+    lots_per_product = 3
+    negative_quant_every = 20   # One quant out of 20 is negative
+    bom_pair_every = 50         # One transfer-BOM child/parent pair per 50 SKUs
+    scan_batch_size = 5000
+    query_tolerance = 0.02     # The query counts are deterministic, only allow a little noise
+
+    def _run_size(self, size):
+        sizes = os.environ.get('STOCK_ADJUSTMENT_BENCHMARK_SIZES', '1000').split(',')
+        if str(size) not in sizes:
+            self.skipTest(f"Size {size} not in STOCK_ADJUSTMENT_BENCHMARK_SIZES")
+
+        measures = {}
+        location, scans = self._generate_location(size, measures)
+        adjustment = self.create_adjustment(location)
+        adjustment.force_accounting_date = datetime.now().date()
+
+        def scan():
+            for index in range(0, len(scans), self.scan_batch_size):
+                adjustment.ingest_scans(scans[index:index + self.scan_batch_size])
+
+        handle_bom_transfer_consolidation = StockAdjustmentBarcode._handle_bom_transfer_consolidation
+
+        def measured_consolidation(record):
+            return self._measure(measures, 'bom_consolidation', handle_bom_transfer_consolidation, record)
+
+        self._measure(measures, 'scan', scan)
+        self._measure(measures, 'refresh_stock', adjustment.action_refresh_stock)
+        with patch.object(StockAdjustmentBarcode, '_handle_bom_transfer_consolidation', measured_consolidation):
+            self._measure(measures, 'confirm', adjustment.action_confirm)
+        adjustment.with_user(self.user_approver).action_approved()
+        self._measure(measures, 'recompute_lots', adjustment.action_recompute_lots)
+        self._measure(measures, 'posting', adjustment.action_done)
+        self.env.invalidate_all()
+        self._measure(measures, 'report', self.env['ir.actions.report']._render_qweb_html,
+                      'stock_adjustment_barcode.stock_variation_report_action', adjustment.ids)
+        self._measure(measures, 'allocate_lots', self._allocate_lots, size)
+
+        for phase, measure in measures.items():
+            _logger.info("Benchmark %s lines, %s: %.3fs, %s queries", size, phase, measure['duration'], measure['queries'])
+        self._check_baseline(str(size), measures)
+
+    def _generate_location(self, size, measures):
+        """
+        Creates a location with size SKUs, some tracked by lots, some quants negative and some SKUs being the
+        children of transfer BOMs, and returns it with the scans counting it.
+        """
+        rng = random.Random(size)
+        start = time.perf_counter()
+        location = self.env['stock.location'].create({
+            'name': f'Benchmark {size}',
+            'usage': 'internal',
+            'location_id': self.location_parent.id,
+            'company_id': self.company.id,
+        })
+        products = self.env['product.product']
+        for index in range(0, size, 1000):
+            products |= self.env['product.product'].create([{
+                'name': f'Benchmark Product {size}-{number}',
+                'type': 'product',
+                'categ_id': self.product_category.id,
+                'barcode': f'BENCH-{size}-{number}',
+                'tracking': 'lot' if number % self.lot_product_every == 0 else 'none',
+                'standard_price': rng.randint(1, 500),
+            } for number in range(index, min(index + 1000, size))])
+
+        lot_products = products.filtered(lambda p: p.tracking == 'lot')
+        lots = self.env['stock.lot'].create([{
+            'name': f'BENCH-LOT-{product.id}-{number}',
+            'product_id': product.id,
+            'company_id': self.company.id,
+        } for product in lot_products for number in range(self.lots_per_product)])
+
+        # Transfer BOMs: one child SKU converts into a parent product, the parents are not scanned
+        bom_children = products.filtered(lambda p: p.tracking == 'none')[::self.bom_pair_every]
+        parents = self.env['product.product'].create([{
+            'name': f'Benchmark Parent {size}-{number}',
+            'type': 'product',
+            'categ_id': self.product_category.id,
+        } for number in range(len(bom_children))])
+        self.env['mrp.bom'].create([{
+            'product_tmpl_id': child.product_tmpl_id.id,
+            'type': 'transfer',
+            'product_qty': 1.0,
+            'bom_line_ids': [(0, 0, {'product_id': parent.id, 'product_qty': 6.0})],
+        } for child, parent in zip(bom_children, parents)])
+
+        quant_vals = []
+        for product in products - lot_products:
+            quant_vals.append({'product_id': product.id, 'quantity': rng.randint(1, 100)})
+        base_date = datetime.now() - timedelta(days=365)
+        for lot in lots:
+            quant_vals.append({'product_id': lot.product_id.id, 'lot_id': lot.id, 'quantity': rng.randint(1, 100),
+                               'in_date': base_date + timedelta(days=rng.randint(0, 364))})
+        for index, vals in enumerate(quant_vals):
+            if index % self.negative_quant_every == 0:
+                vals['quantity'] = -vals['quantity']
+            vals.update({'location_id': location.id, 'company_id': self.company.id})
+        for index in range(0, len(quant_vals), 1000):
+            self.env['stock.quant'].sudo().create(quant_vals[index:index + 1000])
+
+        scans = []
+        for product in products - lot_products:
+            scans.append({'barcode': product.barcode, 'qty': rng.randint(0, 100)})
+        for lot in lots:
+            scans.append({'barcode': lot.product_id.barcode, 'lot': lot.name, 'qty': rng.randint(0, 100)})
+        rng.shuffle(scans)
+
+        self.env.flush_all()
+        measures['generate'] = {'duration': time.perf_counter() - start, 'queries': 0}
+        return location, scans
+
+    def _allocate_lots(self, size):
+        """
+        Distributes quantities over size synthetic quants, by products of 100 lots.
+        """
+        rng = random.Random(size)
+        base_date = datetime.now() - timedelta(days=365)
+        for __ in range(max(size // 100, 1)):
+            quant_rows = [(index, index, rng.randint(-20, 100), base_date + timedelta(days=rng.randint(0, 364)))
+                          for index in range(100)]
+            allocate_lots(quant_rows, rng.randint(0, 5000), rng.randint(-2500, 2500))
+
+    def _measure(self, measures, phase, function, *args):
+        """
+        Runs the function and adds its wall time and query count to the measures of the phase,
+        the pending writes and recomputes included.
+        """
+        self.env.flush_all()
+        queries = self.env.cr.sql_log_count
+        start = time.perf_counter()
+        result = function(*args)
+        self.env.flush_all()
+        measure = measures.setdefault(phase, {'duration': 0.0, 'queries': 0})
+        measure['duration'] += time.perf_counter() - start
+        measure['queries'] += self.env.cr.sql_log_count - queries
+        return result
+
+    def _check_baseline(self, size, measures):
+        baseline = {}
+        if os.path.exists(BASELINE_PATH):
+            with open(BASELINE_PATH) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        if os.environ.get('STOCK_ADJUSTMENT_BENCHMARK_UPDATE'):
+            baseline[size] = {
+                phase: {'duration': round(measure['duration'], 3), 'queries': measure['queries']}
+                for phase, measure in measures.items() if phase != 'generate'
+            }
+            with open(BASELINE_PATH, 'w') as baseline_file:
+                json.dump(baseline, baseline_file, indent=4, sort_keys=True)
+            _logger.info("Benchmark baseline of %s lines stored in %s", size, BASELINE_PATH)
+            return
+
+        if size not in baseline:
+            _logger.warning("No benchmark baseline for %s lines, run with STOCK_ADJUSTMENT_BENCHMARK_UPDATE=1 to store one", size)
+            return
+
+        tolerance = float(os.environ.get('STOCK_ADJUSTMENT_BENCHMARK_TOLERANCE', 0.5))
+        regressions = []
+        for phase, reference in baseline[size].items():
+            measure = measures.get(phase)
+            if not measure:
+                continue
+            if measure['duration'] > reference['duration'] * (1 + tolerance):
+                regressions.append(f"{phase}: {measure['duration']:.3f}s instead of {reference['duration']:.3f}s")
+            if measure['queries'] > int(reference['queries'] * (1 + self.query_tolerance)):
+                regressions.append(f"{phase}: {measure['queries']} queries instead of {reference['queries']}")
+        if regressions:
+            self.fail(f"Benchmark of {size} lines regressed:\n" + '\n'.join(regressions))
+
+    def test_benchmark_1k(self):
+        """Benchmark of a location of 1 000 SKUs"""
+        self._run_size(1000)
+
+    def test_benchmark_10k(self):
+        """Benchmark of a location of 10 000 SKUs"""
+        self._run_size(10000)
+
+    def test_benchmark_100k(self):
+        """Benchmark of a location of 100 000 SKUs"""
+        self._run_size(100000)